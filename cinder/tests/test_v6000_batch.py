@@ -0,0 +1,89 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for V6000 gateway request coalescing
+"""
+
+import threading
+import unittest
+
+from cinder.volume.drivers.violin import v6000_batch
+
+
+class BatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.flushed = []
+        self.batcher = v6000_batch.Batcher(self.flush, 0.2, max_size=3)
+
+    def flush(self, key, items):
+        self.flushed.append((key, items))
+        return ['%s:%s' % (key, x) for x in items]
+
+    def _submit_all(self, requests):
+        """Submits each (key, item) from its own thread at once."""
+        results = [None] * len(requests)
+
+        def submit(i, key, item):
+            results[i] = self.batcher.submit(key, item).result(5)
+
+        threads = [threading.Thread(target=submit, args=(i,) + x)
+                   for i, x in enumerate(requests)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def testCoalesce(self):
+        results = self._submit_all([('a', 1), ('a', 2), ('b', 3)])
+
+        self.assertEqual(results, ['a:1', 'a:2', 'b:3'])
+        self.assertEqual(sorted((k, sorted(x)) for k, x in self.flushed),
+                         [('a', [1, 2]), ('b', [3])])
+        self.assertEqual(self.batcher.stats(),
+                         {'batches': 2, 'requests': 3, 'largest': 2})
+
+    def testMaxSize(self):
+        results = self._submit_all([('a', x) for x in range(5)])
+
+        self.assertEqual(results, ['a:%d' % x for x in range(5)])
+        self.assertEqual(sorted(len(x) for k, x in self.flushed), [2, 3])
+
+    def testFailures(self):
+        error = ValueError('bad item')
+
+        def flush(key, items):
+            if key == 'raise':
+                raise error
+            return [error if x == 'bad' else x for x in items]
+
+        self.batcher = v6000_batch.Batcher(flush, 0)
+        self.assertEqual(self.batcher.submit('a', 'good').result(), 'good')
+        self.assertRaises(ValueError,
+                          self.batcher.submit('a', 'bad').result)
+        request = self.batcher.submit('raise', 'good')
+        self.assertTrue(request.done())
+        self.assertRaises(ValueError, request.result)
+
+    def testMissingResults(self):
+        self.batcher = v6000_batch.Batcher(lambda key, items: [], 0)
+        self.assertRaises(ValueError, self.batcher.submit('a', 1).result)
+
+    def testBadSize(self):
+        self.assertRaises(ValueError, v6000_batch.Batcher, self.flush, 0, 0)
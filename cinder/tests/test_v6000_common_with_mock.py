@@ -24,14 +24,17 @@ Violin Memory
 """
 
 import mock
+import threading
 
 from cinder import context
+from cinder import exception
 from cinder import test
 from cinder.volume import configuration as conf
 from cinder.volume import volume_types
 
 from cinder.tests import fake_vmem_xgtools_client as vxg
 from cinder.volume.drivers.violin import v6000_common
+from cinder.volume.drivers.violin.vxg.core import futures
 
 VOLUME_ID = "abcdabcd-1234-abcd-1234-abcdeffedcba"
 VOLUME = {
@@ -73,6 +76,8 @@ mock_client_conf = [
     'basic',
     'basic.login',
     'basic.get_node_values',
+    'basic.get_node_values_multi',
+    'basic.submit',
     'lun',
     'igroup',
     'snapshot',
@@ -209,6 +214,18 @@ class V6000CommonDriverTestCase(test.TestCase):
         self.assertRaises(v6000_common.InvalidBackendConfig,
                           self.driver.check_for_setup_error)
 
+    def test_shutdown(self):
+        self.driver.config_saver = mock.Mock()
+        self.driver.config_saver.close.side_effect = IOError('save failed')
+        self.driver.gateway_router = mock.Mock()
+        self.driver.gateway_metrics = mock.Mock()
+
+        self.driver._shutdown()
+
+        self.driver.config_saver.close.assert_called_with()
+        self.driver.gateway_router.close.assert_called_with()
+        self.driver.gateway_metrics.close.assert_called_with()
+
     def test_create_volume(self):
         '''Volume created successfully.'''
         self.driver._create_lun = mock.Mock()
@@ -349,6 +366,68 @@ class V6000CommonDriverTestCase(test.TestCase):
         self.assertRaises(v6000_common.ViolinBackendErr,
                           self.driver._create_lun, VOLUME)
 
+    @mock.patch('uuid.uuid4')
+    def test_create_luns_together(self, m_uuid):
+        '''Several luns are created in one action, then renamed.'''
+        m_uuid.return_value.hex = 'abcdef0123456789'
+        prefix = 'cinder-bulk-abcdef01-'
+        bn = "/vshare/state/local/container/myContainer/lun/*"
+        conf = {
+            'basic.get_node_values.return_value':
+            dict((bn[:-1] + x, x) for x in
+                 [prefix + '10', prefix + '9', prefix + '11', VOLUME_ID]),
+        }
+        self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
+        vols = [VOLUME, SRC_VOL]
+        self.driver._send_cmd = mock.Mock(side_effect=[
+            None, None, v6000_common.ViolinBackendErr(message='fail'),
+            None])
+
+        result = self.driver._create_luns((2, '0'), vols)
+
+        v = self.driver.vmem_vip
+        self.driver.vmem_vip.basic.get_node_values.assert_called_with(bn)
+        self.assertEqual(self.driver._send_cmd.call_args_list, [
+            mock.call(v.lun.create_lun, 'LUN create: success!',
+                      'myContainer', prefix, 2, 2, '0', '0', 'w', 1, 512,
+                      False, False, None),
+            mock.call(v.lun.rename_lun, '', 'myContainer', prefix + '9',
+                      VOLUME_ID),
+            mock.call(v.lun.rename_lun, '', 'myContainer', prefix + '10',
+                      SRC_VOL_ID),
+            mock.call(v.lun.bulk_delete_luns, ['lun deletion started', ''],
+                      'myContainer', [prefix + '11', prefix + '10'])])
+        self.assertEqual(result[0], None)
+        self.assertTrue(isinstance(result[1], v6000_common.ViolinBackendErr))
+
+    def test_create_luns_together_falls_back(self):
+        '''A failed bulk create is retried one lun at a time.'''
+        conf = {
+            'basic.get_node_values.return_value': {},
+        }
+        self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
+        error = v6000_common.ViolinBackendErr(message='no space')
+        self.driver._send_cmd = mock.Mock(side_effect=[error, None, error])
+
+        result = self.driver._create_luns((2, '0'), [VOLUME, SRC_VOL])
+
+        self.driver._send_cmd.assert_called_with(
+            self.driver.vmem_vip.lun.create_lun, 'LUN create: success!',
+            self.driver.container, SRC_VOL_ID, 2, 1, '0', '0', 'w', 1, 512,
+            False, False, None)
+        self.assertEqual(result, [None, error])
+
+    def test_create_lun_with_batcher(self):
+        '''Luns of the same size and type are batched together.'''
+        self.driver.create_batcher = mock.Mock()
+        request = self.driver.create_batcher.submit.return_value
+
+        self.driver._create_lun(VOLUME)
+
+        self.driver.create_batcher.submit.assert_called_with(
+            (VOLUME['size'], '0'), VOLUME)
+        request.result.assert_called_with()
+
     def test_delete_lun(self):
         '''Lun is deleted successfully.'''
         response = {'code': 0, 'message': 'lun deletion started'}
@@ -416,6 +495,55 @@ class V6000CommonDriverTestCase(test.TestCase):
         self.assertRaises(v6000_common.ViolinBackendErr,
                           self.driver._delete_lun, VOLUME)
 
+    def test_delete_luns_together(self):
+        '''Several luns are deleted in one action.'''
+        success_msgs = ['lun deletion started', '']
+
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver._send_cmd = mock.Mock()
+        self.driver.lun_tracker = mock.Mock()
+
+        result = self.driver._delete_luns('myContainer', [VOLUME, SRC_VOL])
+
+        self.driver._send_cmd.assert_called_once_with(
+            self.driver.vmem_vip.lun.bulk_delete_luns, success_msgs,
+            'myContainer', [VOLUME_ID, SRC_VOL_ID])
+        self.driver.lun_tracker.free_lun_ids_for_volumes.assert_called_with(
+            [VOLUME, SRC_VOL])
+        self.assertEqual(result, [None, None])
+
+    def test_delete_luns_together_splits_failures(self):
+        '''A failed bulk delete is retried one lun at a time.'''
+        vols = [VOLUME, SRC_VOL, SNAPSHOT]
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver._send_cmd = mock.Mock(side_effect=[
+            v6000_common.ViolinBackendErrExists(),
+            v6000_common.ViolinBackendErrNotFound(),
+            v6000_common.ViolinBackendErrExists(),
+            None])
+        self.driver.lun_tracker = mock.Mock()
+
+        result = self.driver._delete_luns('myContainer', vols)
+
+        self.assertEqual(self.driver._send_cmd.call_count, 4)
+        self.assertEqual(result[0], None)
+        self.assertTrue(isinstance(result[1], exception.VolumeIsBusy))
+        self.assertEqual(result[2], None)
+        self.driver.lun_tracker.free_lun_ids_for_volumes.assert_called_with(
+            [VOLUME, SNAPSHOT])
+
+    def test_delete_lun_with_batcher(self):
+        '''Deletions wait for the batch they were added to.'''
+        self.driver.delete_batcher = mock.Mock()
+        request = self.driver.delete_batcher.submit.return_value
+        request.result.side_effect = exception.VolumeIsBusy(
+            volume_name=VOLUME_ID)
+
+        self.assertRaises(exception.VolumeIsBusy,
+                          self.driver._delete_lun, VOLUME)
+        self.driver.delete_batcher.submit.assert_called_with(
+            'myContainer', VOLUME)
+
     def test_create_lun_snapshot(self):
         '''Snapshot creation completes successfully.'''
         response = {'code': 0, 'message': 'success'}
@@ -508,6 +636,43 @@ class V6000CommonDriverTestCase(test.TestCase):
                           self.driver._send_cmd,
                           request_func, success_msg, request_args)
 
+    @mock.patch('time.sleep')
+    def test_send_cmd_backs_off_when_busy(self, m_sleep):
+        '''A busy gateway is retried after a backoff.'''
+        success_msg = 'success'
+        response1 = {'code': 14032, 'message': 'lc_err_lock_busy'}
+        response2 = {'code': 0, 'message': 'success'}
+
+        request_func = mock.Mock(side_effect=[response1, response1,
+                                              response2])
+        self.driver.retry_policy.backoff = mock.Mock(return_value=0.5)
+
+        self.assertEqual(self.driver._send_cmd(request_func, success_msg),
+                         response2)
+        self.assertEqual(self.driver.retry_policy.backoff.call_args_list,
+                         [mock.call(14032, 1), mock.call(14032, 2)])
+        self.assertEqual(m_sleep.call_args_list,
+                         [mock.call(0.5), mock.call(0.5)])
+
+    @mock.patch('time.sleep')
+    def test_send_cmd_backs_off_on_deletion_in_progress(self, m_sleep):
+        '''A lun deletion in progress is retried after its own backoff,
+        whether or not the gateways send change events.'''
+        response1 = {'code': 1024, 'message': 'lun deletion in progress'}
+        response2 = {'code': 0, 'message': 'lun deletion started'}
+
+        request_func = mock.Mock(side_effect=[response1, response2])
+        self.driver.retry_policy.backoff = mock.Mock(return_value=2.5)
+        listener = mock.Mock(active=True)
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.gateway_listeners = {self.driver.vmem_vip: listener}
+
+        self.assertEqual(self.driver._send_cmd(request_func,
+                                               'lun deletion started'),
+                         response2)
+        m_sleep.assert_called_once_with(2.5)
+        self.assertFalse(listener.watch.called)
+
     def test_get_igroup(self):
         '''The igroup is verified and already exists.'''
         bn = '/vshare/config/igroup/%s' % CONNECTOR['host']
@@ -536,6 +701,85 @@ class V6000CommonDriverTestCase(test.TestCase):
         self.assertEqual(self.driver._get_igroup(VOLUME, CONNECTOR),
                          CONNECTOR['host'])
 
+    def test_get_container_space(self):
+        bn0 = '/cluster/state/master_id'
+        bn1 = "/vshare/state/global/1/container/myContainer/total_bytes"
+        bn2 = "/vshare/state/global/1/container/myContainer/free_bytes"
+        response1 = {bn0: '1'}
+        response2 = {bn1: 100, bn2: 50}
+
+        conf = {
+            'basic.get_node_values.side_effect': [response1, response2],
+        }
+        self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
+
+        result = self.driver._get_container_space()
+
+        calls = [mock.call(bn0), mock.call([bn1, bn2])]
+        self.driver.vmem_vip.basic.get_node_values.assert_has_calls(calls)
+        self.assertEqual(result, (100, 50))
+        self.assertEqual(self.driver.master_cluster_id, '1')
+
+    def test_get_container_space_with_known_master_id(self):
+        """A cached master id costs a single batched query."""
+        bn0 = '/cluster/state/master_id'
+        bn1 = "/vshare/state/global/1/container/myContainer/total_bytes"
+        bn2 = "/vshare/state/global/1/container/myContainer/free_bytes"
+        response = [{bn0: '1'}, {bn1: 100, bn2: 50}]
+
+        conf = {
+            'basic.get_node_values_multi.return_value': response,
+        }
+        self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
+        self.driver.master_cluster_id = '1'
+
+        result = self.driver._get_container_space()
+
+        self.driver.vmem_vip.basic.get_node_values_multi.assert_called_with(
+            [bn0, [bn1, bn2]])
+        self.assertFalse(self.driver.vmem_vip.basic.get_node_values.called)
+        self.assertEqual(result, (100, 50))
+
+    def test_get_container_space_with_new_master_id(self):
+        """The space is queried again if the master has changed."""
+        bn0 = '/cluster/state/master_id'
+        bn1 = "/vshare/state/global/1/container/myContainer/total_bytes"
+        bn2 = "/vshare/state/global/1/container/myContainer/free_bytes"
+        bn3 = "/vshare/state/global/2/container/myContainer/total_bytes"
+        bn4 = "/vshare/state/global/2/container/myContainer/free_bytes"
+
+        conf = {
+            'basic.get_node_values_multi.return_value': [{bn0: '2'}, {}],
+            'basic.get_node_values.return_value': {bn3: 100, bn4: 50},
+        }
+        self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
+        self.driver.master_cluster_id = '1'
+
+        result = self.driver._get_container_space()
+
+        self.driver.vmem_vip.basic.get_node_values_multi.assert_called_with(
+            [bn0, [bn1, bn2]])
+        self.driver.vmem_vip.basic.get_node_values.assert_called_with(
+            [bn3, bn4])
+        self.assertEqual(result, (100, 50))
+        self.assertEqual(self.driver.master_cluster_id, '2')
+
+    def test_get_container_space_with_router(self):
+        """Space queries go through the gateway router when there is one."""
+        bn0 = '/cluster/state/master_id'
+        bn1 = "/vshare/state/global/1/container/myContainer/total_bytes"
+        bn2 = "/vshare/state/global/1/container/myContainer/free_bytes"
+
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.gateway_router = mock.Mock()
+        self.driver.gateway_router.get_node_values.side_effect = [
+            {bn0: '1'}, {bn1: 100, bn2: 50}]
+
+        result = self.driver._get_container_space()
+
+        self.assertEqual(result, (100, 50))
+        self.assertFalse(self.driver.vmem_vip.basic.get_node_values.called)
+
     @mock.patch.object(context, 'get_admin_context')
     @mock.patch.object(volume_types, 'get_volume_type')
     def test_get_volume_type_extra_spec(self, m_get_vol_type, m_get_context):
@@ -627,6 +871,306 @@ class V6000CommonDriverTestCase(test.TestCase):
 
         self.assertTrue(self.driver._wait_for_exportstate(vol['name'], False))
 
+    def _submit(self, func, *args):
+        '''Stand-in for the session's submit(), runs func right away.'''
+        f = futures.Future()
+        try:
+            f.set_result(func(*args))
+        except Exception as e:
+            f.set_exception(e)
+        return f
+
+    def test_wait_for_export_state_with_workers(self):
+        '''Both cluster nodes are polled through their worker threads.'''
+        vol = VOLUME.copy()
+        bn = "/vshare/config/export/container/myContainer/lun/%s" \
+            % vol['name']
+        response = {bn: vol['name']}
+
+        conf = {
+            'basic.get_node_values.return_value': response,
+            'basic.submit.side_effect': self._submit,
+        }
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf=conf)
+        self.driver.vmem_mgb = self.setup_mock_vshare(m_conf=conf)
+        self.driver.gateway_workers = 2
+
+        result = self.driver._wait_for_exportstate(vol['name'], True)
+
+        for v in (self.driver.vmem_mga, self.driver.vmem_mgb):
+            v.basic.submit.assert_called_with(v.basic.get_node_values, bn)
+            v.basic.get_node_values.assert_called_with(bn)
+        self.assertTrue(result)
+
+    @mock.patch('time.sleep')
+    def test_wait_for_export_state_backs_off(self, m_sleep):
+        '''Polls back off until the export shows up on both nodes.'''
+        bn = "/vshare/config/export/container/myContainer/lun/vol-01"
+        response = {bn: 'vol-01'}
+
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf={
+            'basic.get_node_values.side_effect': [{}, response]})
+        self.driver.vmem_mgb = self.setup_mock_vshare(m_conf={
+            'basic.get_node_values.side_effect': [{}, {}, response]})
+
+        self.assertTrue(self.driver._wait_for_exportstate('vol-01', True))
+
+        self.assertEqual(self.driver.vmem_mga.basic.get_node_values.call_count,
+                         2)
+        self.assertEqual(self.driver.vmem_mgb.basic.get_node_values.call_count,
+                         3)
+        self.assertEqual(m_sleep.call_args_list,
+                         [mock.call(v6000_common.VERIFY_MIN_INTERVAL),
+                          mock.call(v6000_common.VERIFY_MIN_INTERVAL * 2)])
+        self.assertEqual(self.driver.verify_stats['verified'], 1)
+        self.assertEqual(self.driver.verify_stats['polls'], 3)
+
+    @mock.patch('time.sleep')
+    def test_wait_for_export_state_with_events(self, m_sleep):
+        '''A change event ends the wait without sleeping.'''
+        bn = "/vshare/config/export/container/myContainer/lun/vol-01"
+        response = {bn: 'vol-01'}
+
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf={
+            'basic.get_node_values.side_effect': [{}, response]})
+        self.driver.vmem_mgb = self.setup_mock_vshare(m_conf={
+            'basic.get_node_values.return_value': response})
+        waker = threading.Event()
+        waker.set()
+        listener = mock.Mock(active=True)
+        listener.watch.return_value = waker
+        self.driver.gateway_listeners = {self.driver.vmem_mga: listener,
+                                         self.driver.vmem_mgb: listener}
+
+        self.assertTrue(self.driver._wait_for_exportstate('vol-01', True))
+
+        self.assertFalse(m_sleep.called)
+        self.assertEqual(listener.watch.call_args_list,
+                         [mock.call(bn, None), mock.call(bn, waker)])
+        listener.unwatch.assert_called_with(bn, waker)
+        self.assertEqual(self.driver.verify_stats['events'], 1)
+        self.assertFalse(waker.is_set())
+
+    @mock.patch('time.sleep')
+    def test_wait_for_export_state_timed_out(self, m_sleep):
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf={
+            'basic.get_node_values.return_value': {}})
+        self.driver.vmem_mgb = self.driver.vmem_mga
+        self.driver.verify_timeout = 0
+
+        self.assertFalse(self.driver._wait_for_exportstate('vol-01', True))
+        self.assertFalse(m_sleep.called)
+        self.assertEqual(self.driver.verify_stats['timeouts'], 1)
+
+    def test_wait_for_export_states(self):
+        '''Several exports are verified with one query per node.'''
+        prefix = "/vshare/config/export/container/myContainer/lun"
+        bns = ["%s/vol-01" % prefix, "%s/vol-02" % prefix]
+        response = {"%s/vol-01/target/hba-a1/initiator/i1/lun_id" % prefix: 1,
+                    "%s/vol-02" % prefix: 'vol-02'}
+
+        conf = {
+            'basic.get_node_values.return_value': response,
+        }
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf=conf)
+        self.driver.vmem_mgb = self.setup_mock_vshare(m_conf=conf)
+
+        self.assertTrue(self.driver._wait_for_exportstates(
+            ['vol-01', 'vol-02'], True))
+        self.driver.vmem_mga.basic.get_node_values.assert_called_once_with(
+            bns)
+        self.driver.vmem_mgb.basic.get_node_values.assert_called_once_with(
+            bns)
+
+    def test_export_luns(self):
+        '''A lone export keeps the lun id the driver assigned it.'''
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.lun_tracker = mock.Mock()
+        self.driver.lun_tracker.get_lun_id_for_volume.return_value = '3'
+        self.driver._send_cmd_and_verify = mock.Mock()
+
+        result = self.driver._export_luns(('all', ('i1', 'i2')), [VOLUME])
+
+        self.driver._send_cmd_and_verify.assert_called_with(
+            self.driver.vmem_vip.lun.export_lun,
+            self.driver._wait_for_exportstate, '',
+            [self.driver.container, VOLUME_ID, 'all', ['i1', 'i2'], '3'],
+            [VOLUME_ID, True])
+        self.assertEqual(result, ['3'])
+
+    def test_export_luns_together(self):
+        '''Several exports are each sent on the lun id the driver
+        assigned, then verified together.'''
+        lun_ids = {VOLUME_ID: '4', SRC_VOL_ID: '5'}
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.lun_tracker = mock.Mock()
+        self.driver.lun_tracker.get_lun_id_for_volume.side_effect = \
+            lambda volume: lun_ids[volume['id']]
+        self.driver._send_cmd = mock.Mock()
+        self.driver._wait_for_exportstates = mock.Mock(return_value=True)
+
+        result = self.driver._export_luns(('all', 'ig'), [VOLUME, SRC_VOL])
+
+        export_lun = self.driver.vmem_vip.lun.export_lun
+        self.assertEqual(
+            self.driver._send_cmd.call_args_list,
+            [mock.call(export_lun, '', self.driver.container, VOLUME_ID,
+                       'all', 'ig', '4'),
+             mock.call(export_lun, '', self.driver.container, SRC_VOL_ID,
+                       'all', 'ig', '5')])
+        self.driver._wait_for_exportstates.assert_called_once_with(
+            [VOLUME_ID, SRC_VOL_ID], True)
+        self.assertEqual(result, ['4', '5'])
+
+    def test_export_luns_together_skips_allocated_ids(self):
+        '''Exports made together never take a lun id the driver has
+        already allocated, such as the lowest one the backend would pick
+        if it is not exported right now.'''
+        metadata = {VOLUME_ID: {'lun_id': '3'}, SRC_VOL_ID: {}}
+        db = mock.Mock()
+        db.volume_metadata_get.side_effect = \
+            lambda ctxt, volume_id: metadata[volume_id]
+        self.driver.lun_tracker = v6000_common.LunIdList(db, 1, 5)
+        self.driver.lun_tracker.lun_ids.reserve(1)
+        self.driver.lun_tracker.lun_ids.reserve(3)
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver._send_cmd = mock.Mock()
+        self.driver._wait_for_exportstates = mock.Mock(return_value=True)
+
+        result = self.driver._export_luns(('all', 'ig'), [VOLUME, SRC_VOL])
+
+        self.assertEqual([x[0][-1] for x in
+                          self.driver._send_cmd.call_args_list], ['3', '2'])
+        db.volume_metadata_update.assert_called_once_with(
+            self.driver.lun_tracker.context, SRC_VOL_ID, {'lun_id': '2'},
+            False)
+        self.assertEqual(result, ['3', '2'])
+
+    def test_export_luns_together_one_fails(self):
+        '''An export that fails is left out of the verification.'''
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.lun_tracker = mock.Mock()
+        self.driver.lun_tracker.get_lun_id_for_volume.return_value = '3'
+        error = v6000_common.ViolinBackendErr(message='fail')
+        self.driver._send_cmd = mock.Mock(side_effect=[error, None])
+        self.driver._wait_for_exportstates = mock.Mock(return_value=True)
+
+        result = self.driver._export_luns(('all', 'ig'), [VOLUME, SRC_VOL])
+
+        self.driver._wait_for_exportstates.assert_called_once_with(
+            [SRC_VOL_ID], True)
+        self.assertEqual(result, [error, '3'])
+
+    def test_export_luns_together_falls_back(self):
+        '''Exports that are not verified together are retried one at a
+        time.'''
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.lun_tracker = mock.Mock()
+        self.driver.lun_tracker.get_lun_id_for_volume.return_value = '3'
+        error = v6000_common.ViolinBackendErr(message='fail')
+        self.driver._send_cmd = mock.Mock()
+        self.driver._wait_for_exportstates = mock.Mock(return_value=False)
+        self.driver._send_cmd_and_verify = mock.Mock(
+            side_effect=[None, error])
+
+        result = self.driver._export_luns(('all', 'ig'), [VOLUME, SRC_VOL])
+
+        self.assertEqual(self.driver._send_cmd.call_count, 2)
+        self.assertEqual(self.driver._send_cmd_and_verify.call_count, 2)
+        self.assertEqual(result, ['3', error])
+
+    def test_export_lun_to_with_batcher(self):
+        '''Exports wait for the batch they were added to.'''
+        self.driver.export_batcher = mock.Mock()
+        self.driver.export_batcher.submit.return_value.result.return_value = \
+            '3'
+
+        result = self.driver._export_lun_to(VOLUME, 'all', ['i1', 'i2'])
+
+        self.driver.export_batcher.submit.assert_called_with(
+            ('all', ('i1', 'i2')), VOLUME)
+        self.assertEqual(result, '3')
+
+    def test_fan_out(self):
+        conf = {
+            'basic.submit.side_effect': self._submit,
+        }
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf=conf)
+        self.driver.vmem_mgb = self.setup_mock_vshare(m_conf=conf)
+        self.driver.gateway_workers = 2
+        func_a = mock.Mock(return_value='a')
+        func_b = mock.Mock(return_value='b')
+
+        result = self.driver._fan_out([(self.driver.vmem_mga, func_a, [1]),
+                                       (self.driver.vmem_mgb, func_b, [2])])
+
+        func_a.assert_called_with(1)
+        func_b.assert_called_with(2)
+        self.assertEqual(result, ['a', 'b'])
+
+    def test_fan_out_with_failed_call(self):
+        '''Every call completes before the failure is raised.'''
+        conf = {
+            'basic.submit.side_effect': self._submit,
+        }
+        self.driver.vmem_mga = self.setup_mock_vshare(m_conf=conf)
+        self.driver.vmem_mgb = self.setup_mock_vshare(m_conf=conf)
+        self.driver.gateway_workers = 2
+        func_a = mock.Mock(
+            side_effect=v6000_common.ViolinBackendErr(message='fail'))
+        func_b = mock.Mock(return_value='b')
+
+        self.assertRaises(v6000_common.ViolinBackendErr,
+                          self.driver._fan_out,
+                          [(self.driver.vmem_mga, func_a, []),
+                           (self.driver.vmem_mgb, func_b, [])])
+        func_b.assert_called_with()
+
+    def test_run_concurrently(self):
+        func_a = mock.Mock(return_value='a')
+        func_b = mock.Mock(return_value='b')
+
+        result = self.driver._run_concurrently(func_a, func_b)
+
+        func_a.assert_called_with()
+        func_b.assert_called_with()
+        self.assertEqual(result, ['a', 'b'])
+
+    def test_run_concurrently_with_failed_call(self):
+        '''Every call completes before the failure is raised.'''
+        func_a = mock.Mock(
+            side_effect=v6000_common.ViolinBackendErr(message='fail'))
+        func_b = mock.Mock(return_value='b')
+
+        self.assertRaises(v6000_common.ViolinBackendErr,
+                          self.driver._run_concurrently, func_a, func_b)
+        func_b.assert_called_with()
+
+    def test_setup_inventory(self):
+        lun_bn = "/vshare/state/local/container/myContainer/lun/*"
+        snap_bn = "/vshare/state/snapshot/container/myContainer/lun/*"
+        conf = {
+            'basic.get_node_values.return_value':
+            {'/vshare/state/local/container/myContainer': 'myContainer'},
+            'basic.get_node_values_multi.side_effect':
+            [[{lun_bn: VOLUME_ID}, {snap_bn: VOLUME_ID}],
+             [{'x': SNAPSHOT_ID}]],
+        }
+        self.driver.container = ''
+        self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
+        self.driver.lun_tracker = mock.Mock()
+
+        self.driver._setup_inventory()
+
+        self.assertEqual(self.driver.container, 'myContainer')
+        self.driver.vmem_vip.basic.get_node_values_multi.assert_called_with(
+            ["/vshare/state/snapshot/container/myContainer/lun/%s/snap/*"
+             % VOLUME_ID])
+        self.driver.lun_tracker.update_from_volume_ids.assert_called_with(
+            [VOLUME_ID])
+        self.driver.lun_tracker.update_from_snapshot_ids.assert_called_with(
+            [SNAPSHOT_ID])
+
     def test_is_supported_vmos_version(self):
         '''Currently supported VMOS version.'''
         version = 'V6.3.1'
@@ -345,8 +345,8 @@ class testV6000FC(unittest.TestCase):
         resp2 = {'/vshare/state/global/2/target/fc/hba-a1/wwn':
                  'wwn.21:00:00:24:ff:45:e2:30'}
         self.m_conn.basic.get_node_values(bn0).AndReturn(resp0)
-        self.m_conn.basic.get_node_values(bn2).AndReturn(resp2)
-        self.m_conn.basic.get_node_values(bn1).AndReturn(resp1)
+        self.m_conn.basic.get_node_values_multi(
+            [bn2, bn1]).AndReturn([resp2, resp1])
         result = ['21000024ff45e230', '21000024ff45fb22']
         self.m.ReplayAll()
         self.assertEqual(self.driver._get_active_fc_targets(), result)
@@ -74,6 +74,7 @@ mock_client_conf = [
     'basic',
     'basic.login',
     'basic.get_node_values',
+    'basic.get_node_values_multi',
     'basic.save_config',
     'lun',
     'lun.export_lun',
@@ -214,6 +215,18 @@ class V6000FCPDriverTestCase(test.TestCase):
         self.driver.vmem_vip.basic.save_config.assert_called_with()
         self.assertEqual(result, None)
 
+    def test_terminate_connection_with_config_saver(self):
+        volume = mock.Mock(spec=models.Volume)
+
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.config_saver = mock.Mock()
+        self.driver._unexport_lun = mock.Mock()
+
+        self.driver.terminate_connection(volume, CONNECTOR)
+
+        self.driver.config_saver.mark_dirty.assert_called_with()
+        self.assertFalse(self.driver.vmem_vip.basic.save_config.called)
+
     def test_get_volume_stats(self):
         self.driver._update_stats = mock.Mock()
         self.driver._update_stats()
@@ -406,16 +419,18 @@ class V6000FCPDriverTestCase(test.TestCase):
         wwpns = ['21000024ff45fb22', '21000024ff45e230']
 
         conf = {
-            'basic.get_node_values.side_effect':
-            [response0, response1, response2],
+            'basic.get_node_values.return_value': response0,
+            'basic.get_node_values_multi.return_value':
+            [response1, response2],
         }
         self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
 
         result = self.driver._get_active_fc_targets()
 
-        calls = [mock.call(bn0), mock.call(bn1), mock.call(bn2)]
-        self.driver.vmem_vip.basic.get_node_values.assert_has_calls(
-            calls, any_order=True)
+        m_multi = self.driver.vmem_vip.basic.get_node_values_multi
+        self.driver.vmem_vip.basic.get_node_values.assert_called_with(bn0)
+        self.assertEqual(m_multi.call_count, 1)
+        self.assertEqual(sorted(m_multi.call_args[0][0]), [bn1, bn2])
         self.assertEqual(result, wwpns)
 
     def test_convert_wwns_openstack_to_vmem(self):
@@ -486,7 +486,8 @@ class testViolin(unittest.TestCase):
         response2 = {"/net/interface/state/eth4/addr/ipv4/1/ip": "1.1.1.1",
                      "/net/interface/state/eth4/flags/link_up": True}
         self.m_conn.basic.get_node_values(mox.IsA(str)).AndReturn(response1)
-        self.m_conn.basic.get_node_values(request).AndReturn(response2)
+        self.m_conn.basic.get_node_values_multi(
+            [request]).AndReturn([response2])
         self.m.ReplayAll()
         ips = self.driver._get_active_iscsi_ips(self.m_conn)
         self.assertEqual(len(ips), 1)
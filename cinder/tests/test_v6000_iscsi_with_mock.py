@@ -73,6 +73,7 @@ mock_client_conf = [
     'basic',
     'basic.login',
     'basic.get_node_values',
+    'basic.get_node_values_multi',
     'basic.save_config',
     'lun',
     'lun.export_lun',
@@ -321,6 +322,19 @@ class V6000ISCSIDriverTestCase(test.TestCase):
         self.driver.vmem_vip.basic.save_config.assert_called_with()
         self.assertTrue(result is None)
 
+    def test_terminate_connection_with_config_saver(self):
+        volume = mock.MagicMock(spec=models.Volume)
+
+        self.driver.vmem_vip = self.setup_mock_vshare()
+        self.driver.config_saver = mock.Mock()
+        self.driver._unexport_lun = mock.Mock()
+        self.driver._delete_iscsi_target = mock.Mock()
+
+        self.driver.terminate_connection(volume, CONNECTOR)
+
+        self.driver.config_saver.mark_dirty.assert_called_with()
+        self.assertFalse(self.driver.vmem_vip.basic.save_config.called)
+
     def test_get_volume_stats(self):
         self.driver._update_stats = mock.Mock()
         self.driver._update_stats()
@@ -578,17 +592,41 @@ class V6000ISCSIDriverTestCase(test.TestCase):
                      "/net/interface/state/eth4/flags/link_up": True}
 
         conf = {
-            'basic.get_node_values.side_effect': [response1, response2],
+            'basic.get_node_values.return_value': response1,
+            'basic.get_node_values_multi.return_value': [response2],
         }
         self.driver.vmem_vip = self.setup_mock_vshare(m_conf=conf)
 
         results = self.driver._get_active_iscsi_ips(self.driver.vmem_vip)
 
-        calls = [mock.call(bn0), mock.call(bn1)]
-        self.driver.vmem_vip.basic.get_node_values.assert_has_calls(calls)
+        self.driver.vmem_vip.basic.get_node_values.assert_called_with(bn0)
+        self.driver.vmem_vip.basic.get_node_values_multi.assert_called_with(
+            [bn1])
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0], "1.1.1.1")
 
+    def test_setup_iscsi_targets(self):
+        self.driver.vmem_mga = self.setup_mock_vshare()
+        self.driver.vmem_mgb = self.setup_mock_vshare()
+        self.driver.array_info = []
+        self.driver._get_active_iscsi_ips = mock.Mock(
+            side_effect=lambda conn: {self.driver.vmem_mga: ['1.1.1.1'],
+                                      self.driver.vmem_mgb: ['2.2.2.2']}[conn])
+        self.driver._get_hostname = mock.Mock(
+            side_effect=lambda mg: 'host_' + mg)
+
+        self.driver._setup_iscsi_targets()
+
+        self.assertEqual(self.driver.gateway_iscsi_ip_addresses_mga,
+                         ['1.1.1.1'])
+        self.assertEqual(self.driver.gateway_iscsi_ip_addresses_mgb,
+                         ['2.2.2.2'])
+        self.assertEqual(self.driver.array_info,
+                         [{"node": 'host_mga', "addr": '1.1.1.1',
+                           "conn": self.driver.vmem_mga},
+                          {"node": 'host_mgb', "addr": '2.2.2.2',
+                           "conn": self.driver.vmem_mgb}])
+
     def test_get_active_iscsi_ips_with_invalid_interfaces(self):
         response = {"/net/interface/config/lo": "lo",
                     "/net/interface/config/vlan10": "vlan10",
@@ -603,6 +641,8 @@ class V6000ISCSIDriverTestCase(test.TestCase):
 
         result = self.driver._get_active_iscsi_ips(self.driver.vmem_vip)
 
+        self.assertFalse(
+            self.driver.vmem_vip.basic.get_node_values_multi.called)
         self.assertEqual(len(result), 0)
 
     def test_get_active_iscsi_ips_with_no_interfaces(self):
@@ -0,0 +1,123 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for V6000 per object locks
+"""
+
+import threading
+import time
+import unittest
+
+from cinder.volume.drivers.violin import v6000_locks
+
+
+class FakeDriver(object):
+    def __init__(self, locks):
+        self.locks = locks
+        self.calls = []
+
+    @v6000_locks.synchronized(v6000_locks.volume_keys)
+    def work(self, volume, delay=0):
+        self.calls.append(volume['id'])
+        time.sleep(delay)
+        return volume['id']
+
+
+class KeyedLockManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.locks = v6000_locks.KeyedLockManager()
+
+    def _hold_in_thread(self, keys, seconds):
+        """Holds the locks of keys from another thread for a while."""
+        held = threading.Event()
+
+        def hold():
+            with self.locks.held(keys):
+                held.set()
+                time.sleep(seconds)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait(5)
+        return thread
+
+    def testIndependentKeys(self):
+        thread = self._hold_in_thread(['lun:1'], 0.5)
+
+        start = time.time()
+        with self.locks.held(['lun:2']):
+            self.assertTrue(time.time() - start < 0.25)
+        thread.join()
+
+        self.assertEqual(self.locks.stats()['contended'], 0)
+
+    def testContention(self):
+        thread = self._hold_in_thread(['lun:1'], 0.2)
+
+        with self.locks.held(['lun:1']):
+            pass
+        thread.join()
+
+        stats = self.locks.stats()
+        self.assertEqual(stats['acquired'], 2)
+        self.assertEqual(stats['contended'], 1)
+        self.assertTrue(stats['wait_max'] > 0)
+        self.assertEqual(stats['wait_max'], stats['wait_total'])
+
+    def testSeveralKeys(self):
+        thread = self._hold_in_thread(['lun:2'], 0.2)
+
+        self.locks.acquire(['lun:3', 'lun:2', 'lun:1', 'lun:3'])
+        self.assertEqual(self.locks.stats()['locked'], 3)
+        self.locks.release(['lun:1', 'lun:2', 'lun:3'])
+        thread.join()
+
+        self.assertEqual(self.locks.stats()['contended'], 1)
+
+    def testLocksDropped(self):
+        with self.locks.held(['lun:1', 'snap:1']):
+            self.assertEqual(self.locks.stats()['locked'], 2)
+        self.assertEqual(self.locks.stats()['locked'], 0)
+        self.assertEqual(repr(self.locks), '<KeyedLockManager keys:0>')
+
+    def testSynchronized(self):
+        driver = FakeDriver(self.locks)
+        volumes = [{'id': '1'}, {'id': '1'}, {'id': '2'}]
+        threads = [threading.Thread(target=driver.work, args=(x, 0.2))
+                   for x in volumes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(driver.calls), ['1', '1', '2'])
+        self.assertEqual(self.locks.stats()['contended'], 1)
+        self.assertEqual(driver.work.__name__, 'work')
+
+    def testKeys(self):
+        volumes = [{'id': '1'}, {'id': '2'}]
+        self.assertEqual(v6000_locks.volume_keys(volumes[0], 'all'),
+                         ['lun:1'])
+        self.assertEqual(v6000_locks.batch_volume_keys('key', volumes),
+                         ['lun:1', 'lun:2'])
+        self.assertEqual(v6000_locks.snapshot_keys({'id': '3'}),
+                         ['snap:3'])
+        self.assertEqual(v6000_locks.target_keys(volumes[1]),
+                         ['target:2'])
+        self.assertEqual(v6000_locks.igroup_keys('ig'), ['igroup:ig'])
@@ -0,0 +1,89 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for V6000 lun ID allocation
+"""
+
+import unittest
+
+from cinder.volume.drivers.violin import v6000_lunid
+
+
+class LunIdAllocatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ids = v6000_lunid.LunIdAllocator(1, 5)
+
+    def testAllocate(self):
+        self.assertEqual([self.ids.allocate() for i in range(5)],
+                         [1, 2, 3, 4, 5])
+        self.assertEqual(self.ids.allocated, 5)
+        self.assertEqual(self.ids.allocate(), None)
+
+    def testFreedIdsReusedAfterWrapping(self):
+        for i in range(3):
+            self.ids.allocate()
+        self.ids.free(2)
+
+        self.assertFalse(self.ids.is_allocated(2))
+        self.assertEqual([self.ids.allocate() for i in range(3)], [4, 5, 2])
+
+    def testFreeWhenFull(self):
+        for i in range(5):
+            self.ids.allocate()
+        self.ids.free(3)
+        self.ids.free(3)
+
+        self.assertEqual(self.ids.allocated, 4)
+        self.assertEqual(self.ids.allocate(), 3)
+
+    def testNextId(self):
+        self.assertEqual(self.ids.allocate(), 1)
+        self.assertEqual(self.ids.next_id, 2)
+        self.ids.reserve(5, skip=True)
+        self.assertEqual(self.ids.next_id, 1)
+        self.ids.reserve(2)
+        self.assertEqual(self.ids.next_id, 1)
+        self.assertEqual(self.ids.allocate(), 3)
+        self.assertEqual(self.ids.next_id, 4)
+
+    def testReserve(self):
+        self.assertTrue(self.ids.reserve(1))
+        self.assertTrue(self.ids.reserve(3))
+        self.assertEqual(self.ids.allocate(), 2)
+
+    def testReserveSkip(self):
+        self.ids.reserve(3, skip=True)
+        self.assertEqual(self.ids.allocate(), 4)
+        self.ids.reserve(2, skip=True)
+        self.assertEqual([self.ids.allocate() for i in range(3)],
+                         [5, 1, None])
+
+    def testReserveOutsideRange(self):
+        self.assertFalse(self.ids.reserve(0))
+        self.assertFalse(self.ids.reserve(6, skip=True))
+        self.assertEqual(self.ids.allocated, 0)
+        self.assertEqual(self.ids.allocate(), 1)
+
+    def testRange(self):
+        ids = v6000_lunid.LunIdAllocator(10, 11)
+        self.assertEqual([ids.allocate() for i in range(3)], [10, 11, None])
+        self.assertTrue(11 in ids)
+        self.assertFalse(9 in ids)
+        self.assertRaises(ValueError, v6000_lunid.LunIdAllocator, 5, 4)
+        self.assertRaises(ValueError, v6000_lunid.LunIdAllocator, -1, 4)
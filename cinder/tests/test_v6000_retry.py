@@ -0,0 +1,74 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for the V6000 gateway retry policy
+"""
+
+import random
+import unittest
+
+from cinder.volume.drivers.violin import v6000_retry
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = v6000_retry.RetryPolicy()
+        self._uniform = random.uniform
+        random.uniform = lambda low, high: high
+
+    def tearDown(self):
+        random.uniform = self._uniform
+
+    def testDefaults(self):
+        self.assertTrue(self.policy.is_fatal(14000))
+        self.assertTrue(self.policy.is_fatal(14004))
+        self.assertFalse(self.policy.is_fatal(14032))
+        self.assertFalse(self.policy.is_fatal(1024))
+        self.assertFalse(self.policy.is_fatal(0))
+
+    def testBackoff(self):
+        # Doubles from the base until it reaches the cap
+        self.assertEqual([self.policy.backoff(14032, x) for x in range(1, 7)],
+                         [0.5, 1.0, 2.0, 4.0, 8.0, 8.0])
+        self.assertEqual(self.policy.backoff(1024, 1), 2.0)
+        self.assertEqual(self.policy.backoff(0, 1),
+                         v6000_retry.DEFAULT_BACKOFF[0])
+        self.assertEqual(self.policy.stats(), {14032: 6, 1024: 1, 0: 1})
+        self.assertRaises(ValueError, self.policy.backoff, 14000, 1)
+
+    def testJitter(self):
+        random.uniform = self._uniform
+        delays = [self.policy.backoff(14032, 4) for x in range(100)]
+        self.assertTrue(min(delays) >= 0 and max(delays) <= 4.0)
+        self.assertTrue(len(set(delays)) > 1)
+
+    def testOverrides(self):
+        policy = v6000_retry.RetryPolicy(v6000_retry.parse(
+            ['14032:1:2', ' 14000:retry', '1024:fatal']))
+        self.assertEqual(policy.backoff(14032, 3), 2.0)
+        self.assertFalse(policy.is_fatal(14000))
+        self.assertEqual(policy.backoff(14000, 1),
+                         v6000_retry.DEFAULT_BACKOFF[0])
+        self.assertTrue(policy.is_fatal(1024))
+
+    def testParseErrors(self):
+        for entry in ('14032', 'x:fatal', '14032:1', '14032:a:2',
+                      '14032:-1:2', '14032:1:2:3', '14032:never'):
+            self.assertRaises(ValueError, v6000_retry.parse, [entry])
+        self.assertEqual(v6000_retry.parse([]), {})
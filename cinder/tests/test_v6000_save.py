@@ -0,0 +1,106 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for V6000 write-behind config saves
+"""
+
+import threading
+import time
+import unittest
+
+from cinder.volume.drivers.violin import v6000_save
+
+
+class ConfigSaverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.saves = 0
+        self.saved = threading.Event()
+        self.fail = False
+
+    def save(self):
+        if self.fail:
+            raise IOError('save failed')
+        self.saves += 1
+        self.saved.set()
+
+    def _wait_for_save(self):
+        self.assertTrue(self.saved.wait(5) or self.saved.is_set())
+        self.saved.clear()
+
+    def testCoalesce(self):
+        saver = v6000_save.ConfigSaver(self.save, 0.2)
+        for i in range(5):
+            saver.mark_dirty()
+        self.assertEqual(self.saves, 0)
+        self.assertTrue(saver.dirty())
+
+        self._wait_for_save()
+        self.assertEqual(self.saves, 1)
+        self.assertFalse(saver.dirty())
+        self.assertEqual(saver.stats(),
+                         {'changes': 5, 'saves': 1, 'failures': 0})
+        saver.close()
+
+    def testMaxPending(self):
+        saver = v6000_save.ConfigSaver(self.save, 60, max_pending=3)
+        for i in range(3):
+            saver.mark_dirty()
+
+        self._wait_for_save()
+        self.assertEqual(self.saves, 1)
+        saver.close()
+
+    def testFlush(self):
+        saver = v6000_save.ConfigSaver(self.save, 60)
+        saver.flush()
+        self.assertEqual(self.saves, 0)
+
+        saver.mark_dirty()
+        saver.flush()
+        self.assertEqual(self.saves, 1)
+        self.assertFalse(saver.dirty())
+
+    def testClose(self):
+        saver = v6000_save.ConfigSaver(self.save, 60)
+        saver.mark_dirty()
+        saver.close()
+
+        self.assertEqual(self.saves, 1)
+        self.assertRaises(RuntimeError, saver.mark_dirty)
+
+    def testFailure(self):
+        errors = []
+        saver = v6000_save.ConfigSaver(self.save, 0.1, on_error=errors.append)
+        self.fail = True
+        saver.mark_dirty()
+        self.assertRaises(IOError, saver.flush)
+        self.assertTrue(saver.dirty())
+
+        time.sleep(0.3)
+        self.assertTrue(errors)
+        self.fail = False
+        self._wait_for_save()
+        self.assertFalse(saver.dirty())
+        self.assertEqual(saver.stats()['saves'], 1)
+        self.assertTrue(saver.stats()['failures'] >= 2)
+        saver.close()
+
+    def testBadArguments(self):
+        self.assertRaises(ValueError, v6000_save.ConfigSaver, self.save, -1)
+        self.assertRaises(ValueError, v6000_save.ConfigSaver, self.save, 1, 0)
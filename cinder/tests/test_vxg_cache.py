@@ -0,0 +1,223 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for the XG query cache
+"""
+
+import StringIO
+import time
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import cache
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGActionTemplate
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+OK_STATUS = ('<return-status><return-code>0</return-code>'
+             '<return-msg>Success</return-msg></return-status>')
+
+
+def _query(value, db_rev=5):
+    return (HEADER + '<xg-response><query-response>' + OK_STATUS +
+            '<db-revision-id>%d</db-revision-id><nodes><node>'
+            '<name>/vshare/config/igroup/a</name><type>string</type>'
+            '<value>%s</value></node></nodes></query-response>'
+            '</xg-response>' % (db_rev, value))
+
+
+def _result(type, db_rev=6):
+    return (HEADER + '<xg-response><%s-response>' % (type,) + OK_STATUS +
+            '<db-revision-id>%d</db-revision-id></%s-response>'
+            '</xg-response>' % (db_rev, type))
+
+
+class FakeHandle(object):
+    """Stands in for the session's urllib2 opener, answering each request
+    with the next of responses.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def open(self, url, data=None):
+        self.sent.append(data)
+        return StringIO.StringIO(self.responses.pop(0))
+
+
+def _nodes(value='x'):
+    return [XGNode('/a', 'string', value)]
+
+
+class XGQueryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = cache.XGQueryCache(maxsize=2)
+
+    def _key(self, name):
+        return self.cache.key([name], False, False, True, True, None)
+
+    def testHitsAndMisses(self):
+        key = self._key('/a')
+        self.assertEqual(self.cache.get(key), None)
+        self.cache.put(key, _nodes())
+        self.assertEqual(self.cache.get(key)[0].value, 'x')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def testCopies(self):
+        key = self._key('/a')
+        nodes = _nodes()
+        self.cache.put(key, nodes)
+        nodes[0].value = 'changed'
+        self.cache.get(key)[0].value = 'changed'
+        self.assertEqual(self.cache.get(key)[0].value, 'x')
+
+    def testLRUEviction(self):
+        a, b, c = self._key('/a'), self._key('/b'), self._key('/c')
+        self.cache.put(a, _nodes())
+        self.cache.put(b, _nodes())
+        self.cache.get(a)
+        self.cache.put(c, _nodes())
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(self.cache.get(b), None)
+        self.assertNotEqual(self.cache.get(a), None)
+        self.assertNotEqual(self.cache.get(c), None)
+
+    def testTTLRules(self):
+        self.assertEqual(self.cache.get_ttl(['/vshare/config/igroup/*']),
+                         cache.DEFAULT_TTL)
+        self.assertEqual(self.cache.get_ttl(['/vshare/config/igroup/*',
+                                             '/vshare/state/local/*']), 2)
+
+        rules = cache.XGQueryCache(ttl=10, ttl_rules=[('/a/*', 0),
+                                                      ('/b/*', 0.05),
+                                                      ('/b/*', 5)])
+        self.assertEqual(rules.get_ttl(['/b/x']), 0.05)
+        self.assertEqual(rules.get_ttl(['/c/x']), 10)
+
+        key = rules.key(['/a/x'], False, False, True, True, None)
+        rules.put(key, _nodes())
+        self.assertEqual(len(rules), 0)
+
+        key = rules.key(['/b/x'], False, False, True, True, None)
+        rules.put(key, _nodes())
+        self.assertNotEqual(rules.get(key), None)
+        time.sleep(0.1)
+        self.assertEqual(rules.get(key), None)
+        self.assertEqual(len(rules), 0)
+
+    def testGeneration(self):
+        key = self._key('/a')
+        generation = self.cache.generation
+        self.cache.clear()
+        self.cache.put(key, _nodes(), generation=generation)
+        self.assertEqual(self.cache.get(key), None)
+
+        self.cache.put(key, _nodes(), generation=self.cache.generation)
+        self.assertNotEqual(self.cache.get(key), None)
+
+    def testNoteRevision(self):
+        key = self._key('/a')
+        self.cache.put(key, _nodes(), db_rev=5)
+        for db_rev in (0, 4, 5):
+            self.cache.note_revision(db_rev)
+            self.assertNotEqual(self.cache.get(key), None)
+
+        self.cache.note_revision(6)
+        self.assertEqual(self.cache.get(key), None)
+        self.assertEqual(self.cache.invalidations, 1)
+
+        # A slow response read before the change is not cached
+        self.cache.put(key, _nodes(), db_rev=5)
+        self.assertEqual(self.cache.get(key), None)
+
+    def testNewerRevisionClears(self):
+        a, b = self._key('/a'), self._key('/b')
+        self.cache.put(a, _nodes(), db_rev=5)
+        self.cache.put(b, _nodes(), db_rev=6)
+        self.assertEqual(self.cache.get(a), None)
+        self.assertNotEqual(self.cache.get(b), None)
+
+    def testStats(self):
+        self.cache.put(self._key('/a'), _nodes())
+        self.cache.get(self._key('/a'))
+        self.assertEqual(self.cache.stats(),
+                         {'size': 1, 'hits': 1, 'misses': 0,
+                          'evictions': 0, 'invalidations': 0})
+
+
+class XGSessionCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = XGSession('mga', autologin=False,
+                                 log_fd=StringIO.StringIO())
+        self.session.enable_query_cache()
+        self.node = '/vshare/config/igroup/a'
+
+    def _get(self):
+        return self.session.get_node_values(self.node)[self.node]
+
+    def _check_invalidated(self, change, type):
+        self.session._handle = FakeHandle([_query('x'), _result(type),
+                                           _query('y', 6)])
+        self.assertEqual(self._get(), 'x')
+        self.assertEqual(self._get(), 'x')
+        self.assertEqual(len(self.session._handle.sent), 1)
+
+        change()
+        self.assertEqual(self._get(), 'y')
+        self.assertEqual(len(self.session._handle.sent), 3)
+        self.assertEqual(self.session.query_cache.db_rev, 6)
+
+    def testAction(self):
+        self._check_invalidated(
+            lambda: self.session.perform_action('/vshare/actions/x'),
+            'action')
+
+    def testSet(self):
+        self._check_invalidated(
+            lambda: self.session.perform_set(
+                [XGNode('/vshare/config/x', 'string', 'a')]),
+            'set')
+
+    def testTemplate(self):
+        template = XGActionTemplate('/vshare/actions/x',
+                                    [('container', 'string')])
+        self._check_invalidated(
+            lambda: self.session.perform_template(template,
+                                                  container='PROD08'),
+            'action')
+
+    def testUncached(self):
+        self.session._handle = FakeHandle([_query('x'), _query('y')])
+        self._get()
+        values = self.session.get_node_values(self.node, cached=False)
+        self.assertEqual(values[self.node], 'y')
+        self.assertEqual(self._get(), 'y')
+        self.assertEqual(len(self.session._handle.sent), 2)
+
+    def testDisabled(self):
+        self.session.disable_query_cache()
+        self.session._handle = FakeHandle([_query('x'), _query('x')])
+        self._get()
+        self._get()
+        self.assertEqual(len(self.session._handle.sent), 2)
+        self.assertEqual(self.session.cache_stats(), {})
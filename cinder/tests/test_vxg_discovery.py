@@ -0,0 +1,253 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools device discovery
+"""
+
+import os
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import urllib2
+
+from cinder.volume.drivers.violin import vxg
+from cinder.volume.drivers.violin.vxg.core import discovery
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+from cinder.volume.drivers.violin.vxg.vshare import vshare
+
+VERSION_INFO = {'type': 'G', 'version': '6.3.0'}
+
+
+class FakeDevice(object):
+    def __init__(self, kind, proto, version_info):
+        self.kind = kind
+        self.proto = proto
+        self.version_info = version_info
+
+
+class DiscoveryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'state', 'gateways.json')
+        self.cache = discovery.DiscoveryCache(self.path, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testPutGet(self):
+        self.assertEqual(self.cache.get('mga'), None)
+        self.cache.put('mga', 'https', 'xml', VERSION_INFO)
+
+        # Another process sees the same file
+        other = discovery.DiscoveryCache(self.path, ttl=60)
+        entry = other.get('mga')
+        self.assertEqual((entry['proto'], entry['kind'],
+                          entry['version_info']),
+                         ('https', 'xml', VERSION_INFO))
+        self.assertEqual(other.get('mgb'), None)
+
+        self.cache.forget('mga')
+        self.assertEqual(other.get('mga'), None)
+
+    def testExpired(self):
+        self.cache.put('mga', 'https', 'xml', VERSION_INFO)
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.get('mga'), None)
+
+    def testBadFile(self):
+        os.makedirs(os.path.dirname(self.path))
+        for data in ('not json', '[1, 2]', '{"mga": {"time": 1e12}}'):
+            fp = open(self.path, 'w')
+            fp.write(data)
+            fp.close()
+            self.assertEqual(self.cache.get('mga'), None)
+
+        self.cache.put('mga', 'https', 'xml', VERSION_INFO)
+        self.assertEqual(self.cache.get('mga')['kind'], 'xml')
+
+    def testUnwritable(self):
+        cache = discovery.DiscoveryCache(
+            os.path.join(self.tmpdir, 'file', 'gateways.json'))
+        open(os.path.join(self.tmpdir, 'file'), 'w').close()
+        cache.put('mga', 'https', 'xml', VERSION_INFO)
+        self.assertEqual(cache.get('mga'), None)
+
+
+class OpenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = discovery.DiscoveryCache(
+            os.path.join(self.tmpdir, 'gateways.json'))
+        self.probes = []
+        self.opened = []
+        self.pages = {'https': (None, 'refused'), 'http': ('xml', None)}
+        self.fail_open = None
+
+        self._probe = vxg._probe
+        self._openers = vxg._OPENERS
+        vxg._probe = self.probe
+        vxg._OPENERS = {'xml': self.opener}
+
+    def tearDown(self):
+        vxg._probe = self._probe
+        vxg._OPENERS = self._openers
+        shutil.rmtree(self.tmpdir)
+
+    def probe(self, host, proto):
+        self.probes.append((proto, threading.current_thread().name))
+        return self.pages[proto]
+
+    def opener(self, host, user, password, proto, version, debug,
+               keepalive, log_fd, workers, tracer, metrics,
+               version_info=None):
+        self.opened.append((proto, version_info))
+        if self.fail_open is not None:
+            raise self.fail_open
+        return FakeDevice('xml', proto, version_info or VERSION_INFO)
+
+    def _open(self):
+        return vxg.open('mga', discovery=self.cache,
+                        logger=StringIO.StringIO())
+
+    def testDiscover(self):
+        conn = self._open()
+        self.assertEqual(conn.proto, 'http')
+        self.assertEqual(sorted(x[0] for x in self.probes),
+                         ['http', 'https'])
+        # Both protocols are probed on worker threads
+        self.assertTrue(all(x[1].startswith('vxg-worker')
+                            for x in self.probes))
+        self.assertEqual(self.opened, [('http', None)])
+        self.assertEqual(self.cache.get('mga')['proto'], 'http')
+
+    def testPreferOrder(self):
+        self.pages['https'] = ('xml', None)
+        self.assertEqual(self._open().proto, 'https')
+
+    def testCached(self):
+        self._open()
+        self.probes = []
+        self.opened = []
+
+        conn = self._open()
+        self.assertEqual(conn.proto, 'http')
+        self.assertEqual(self.probes, [])
+        self.assertEqual(self.opened, [('http', VERSION_INFO)])
+
+    def testCachedFailure(self):
+        self.cache.put('mga', 'https', 'xml', VERSION_INFO)
+        self.fail_open = error.NetworkError('Failed autologin')
+        self.assertRaises(error.NetworkError, self._open)
+        self.assertEqual(self.opened, [('https', VERSION_INFO),
+                                       ('http', None)])
+        self.assertEqual(self.cache.get('mga'), None)
+
+    def testCachedLoginRejected(self):
+        self.cache.put('mga', 'https', 'xml', VERSION_INFO)
+        self.fail_open = error.AuthenticationError('Failed autologin')
+        self.assertRaises(error.AuthenticationError, self._open)
+        # A wrong password is not worth probing every protocol for
+        self.assertEqual(self.probes, [])
+        self.assertEqual(self.opened, [('https', VERSION_INFO)])
+        self.assertEqual(self.cache.get('mga')['proto'], 'https')
+
+    def testNothingFound(self):
+        self.pages['http'] = (None, None)
+        self.assertEqual(self._open(), None)
+        self.assertEqual(self.cache.get('mga'), None)
+
+
+class FakeHandle(object):
+    """Stands in for the session's urllib2 opener, answering the login
+    with page, or failing it with error.
+    """
+    def __init__(self, page=None, error=None):
+        self.page = page
+        self.error = error
+
+    def open(self, url, data=None):
+        if self.error is not None:
+            raise self.error
+        return StringIO.StringIO(self.page)
+
+
+class LoginErrorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = XGSession('mga', autologin=False,
+                                 log_fd=StringIO.StringIO())
+
+    def testRejected(self):
+        self.session._handle = FakeHandle('<html>Login failed</html>')
+        self.assertFalse(self.session.open())
+        self.assertTrue(isinstance(self.session._login_error,
+                                   error.AuthenticationError))
+
+    def testUnreachable(self):
+        self.session._handle = FakeHandle(
+            error=urllib2.URLError('Connection refused'))
+        self.assertFalse(self.session.open())
+        self.assertTrue(isinstance(self.session._login_error,
+                                   error.NetworkError))
+
+    def testLoggedIn(self):
+        self.session._handle = FakeHandle(
+            "template=dashboard HTTP-EQUIV='Refresh'")
+        self.assertTrue(self.session.open())
+        self.assertEqual(self.session._login_error, None)
+
+
+class DeviceClassTestCase(unittest.TestCase):
+
+    def testRegistry(self):
+        classes = vxg._get_device_classes('vshare')
+        self.assertEqual(classes[0], ((6, 0, 0), vshare.VShare))
+        self.assertEqual([x[0] for x in classes],
+                         sorted([x[0] for x in classes], reverse=True))
+        self.assertTrue(vxg._get_device_classes('vshare') is classes)
+        self.assertRaises(ValueError, vxg._get_device_classes, 'vfoo')
+
+    def testLazyImport(self):
+        # Run in a fresh interpreter, as other tests load the families
+        code = ('import sys\n'
+                'from cinder.volume.drivers.violin import vxg\n'
+                'def loaded():\n'
+                '    return [x.split(".", 5)[-1]\n'
+                '            for x in sorted(sys.modules)\n'
+                '            if x.split(".")[5:6] in (["varray"], ["vmos7"],\n'
+                '                                     ["vshare"])]\n'
+                'before = loaded()\n'
+                'vxg._get_device_classes("vshare")\n'
+                'print(" ".join(before) + "|" + " ".join(loaded()))\n')
+        proc = subprocess.Popen([sys.executable, '-c', code],
+                                stdout=subprocess.PIPE)
+        out = proc.communicate()[0].strip()
+        self.assertEqual(proc.returncode, 0)
+        before, after = [x.split() for x in out.split('|')]
+        self.assertEqual(before, [])
+        self.assertTrue('vshare.vshare' in after)
+        self.assertTrue('vshare.lun' in after)
+        self.assertEqual([x for x in after if not x.startswith('vshare')],
+                         [])
@@ -0,0 +1,179 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools event subscriptions
+"""
+
+import Queue
+import StringIO
+import threading
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core import events
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGEvent
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+EXPORT = '/vshare/config/export/container/c/lun/vol-01'
+
+
+def _event_response(code, names=()):
+    nodes = ''.join('<node><name>%s</name><type>string</type>'
+                    '<value>%s</value></node>'
+                    % (x, events.DBCHANGE_EVENT) for x in names)
+    return (HEADER + '<xg-response><event-response><return-status>'
+            '<return-code>%d</return-code><return-msg>msg</return-msg>'
+            '</return-status><nodes>%s</nodes></event-response>'
+            '</xg-response>' % (code, nodes))
+
+
+class FakeGateway(object):
+    """Stands in for the session's urllib2 opener, answering event
+    requests like a gateway that emits dbchange events.
+    """
+    def __init__(self, accept=True, hold=0.05):
+        self.accept = accept
+        self.hold = hold
+        self.subscriptions = []
+        self.waits = 0
+        self.pending = Queue.Queue()
+
+    def emit(self, *names):
+        self.pending.put(_event_response(0, names))
+
+    def drop(self):
+        """Fails the current wait, as if the subscription was lost."""
+        self.pending.put(_event_response(1))
+
+    def open(self, url, data=None):
+        if events.SUBSCRIBE_EVENT in data:
+            self.subscriptions.append(data)
+            return StringIO.StringIO(_event_response(0 if self.accept
+                                                     else 1))
+        assert events.WAIT_EVENT in data
+        self.waits += 1
+        try:
+            if not self.hold:
+                return StringIO.StringIO(self.pending.get(False))
+            return StringIO.StringIO(self.pending.get(timeout=self.hold))
+        except Queue.Empty:
+            return StringIO.StringIO(_event_response(0))
+
+
+class XGEventTestCase(unittest.TestCase):
+
+    def testToXml(self):
+        req = XGEvent('/xg/events/wait', [XGNode('timeout', 'uint32', 30)])
+        self.assertEqual(req.type, 'event')
+        self.assertTrue('<event-request><event-name>/xg/events/wait'
+                        '</event-name><nodes>' in req.to_xml())
+
+    def testMissingName(self):
+        self.assertRaises(error.TypeError, XGEvent, None)
+
+
+class XGEventListenerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.gateway = FakeGateway()
+        self.session = XGSession('mga', autologin=False,
+                                 log_fd=StringIO.StringIO())
+        self.session._handle = self.gateway
+        self.listener = events.XGEventListener(self.session,
+                                               retry_after=0.01,
+                                               min_interval=0.01)
+
+    def tearDown(self):
+        for listener in (self.listener, self.session._listener):
+            if listener is not None and listener._thread is not None:
+                thread = listener._thread
+                listener.close()
+                thread.join()
+
+    def testWatch(self):
+        self.assertTrue(self.listener.start())
+        self.assertTrue(self.listener.active)
+        self.assertTrue(events.DBCHANGE_EVENT in
+                        self.gateway.subscriptions[0])
+
+        export = self.listener.watch('/vshare/config/export/')
+        both = self.listener.watch(EXPORT)
+        self.listener.watch('/vshare/config/iscsi', both)
+        other = self.listener.watch('/vshare/config/igroup')
+
+        self.gateway.emit(EXPORT)
+        export.wait(5)
+        both.wait(5)
+        self.assertTrue(export.is_set())
+        self.assertTrue(both.is_set())
+        self.assertFalse(other.is_set())
+
+        # Only watched paths are woken, once unwatched
+        both.clear()
+        self.listener.unwatch(EXPORT, both)
+        self.gateway.emit(EXPORT, '/vshare/config/igroup/host1')
+        other.wait(5)
+        self.assertTrue(other.is_set())
+        self.assertFalse(both.is_set())
+        self.assertEqual(self.listener.received, 3)
+
+    def testRefused(self):
+        self.gateway.accept = False
+        self.assertFalse(self.listener.start())
+        self.assertFalse(self.listener.active)
+        self.assertEqual(self.listener._thread, None)
+
+    def testResubscribe(self):
+        self.listener.start()
+        waker = self.listener.watch(EXPORT)
+        self.gateway.drop()
+        for i in range(100):
+            if len(self.gateway.subscriptions) > 1:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(len(self.gateway.subscriptions), 2)
+
+        self.gateway.emit(EXPORT)
+        waker.wait(5)
+        self.assertTrue(waker.is_set())
+        self.assertTrue(self.listener.active)
+
+    def testEmptyWaits(self):
+        self.gateway.hold = 0
+        listener = events.XGEventListener(self.session, min_interval=0.1)
+        listener.start()
+        threading.Event().wait(0.35)
+        thread = listener._thread
+        listener.close()
+        thread.join()
+
+        self.assertTrue(2 <= self.gateway.waits <= 5, self.gateway.waits)
+
+    def testSessionListener(self):
+        listener = self.session.event_listener()
+        self.assertTrue(listener.active)
+        self.assertTrue(self.session.event_listener() is listener)
+        self.assertEqual(len(self.gateway.subscriptions), 1)
+
+        thread = listener._thread
+        self.session.close()
+        self.assertFalse(listener.active)
+        thread.join()
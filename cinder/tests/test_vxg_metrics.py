@@ -0,0 +1,170 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools request metrics
+"""
+
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core import metrics
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGAction
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+ACTION_OK = (HEADER + '<xg-response><action-response><return-status>'
+             '<return-code>0</return-code><return-msg>ok</return-msg>'
+             '</return-status></action-response></xg-response>')
+
+ACTION_BUSY = (HEADER + '<xg-response><action-response><return-status>'
+               '<return-code>14032</return-code><return-msg>busy'
+               '</return-msg></return-status></action-response>'
+               '</xg-response>')
+
+LOGGED_OUT = (HEADER + '<xg-response><xg-status><status-code>1'
+              '</status-code><status-msg>Not authenticated</status-msg>'
+              '</xg-status></xg-response>')
+
+EXPORT = '/vshare/actions/lun/export'
+
+
+class FakeHandle(object):
+    """Stands in for the session's urllib2 opener."""
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def open(self, url, data=None):
+        return StringIO.StringIO(self.responses.pop(0))
+
+
+def _series(snap, host, operation):
+    for x in snap['series']:
+        if (x['host'], x['operation']) == (host, operation):
+            return x
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics()
+        self.action = XGAction(EXPORT, [XGNode('lun', 'string', 'x')])
+        self.query = XGQuery([XGNode('/a')])
+
+    def testObserve(self):
+        self.metrics.observe('mga', self.action, 0.003, 0, 100, 50)
+        self.metrics.observe('mga', self.action, 0.2, 14032, 100, 60)
+        self.metrics.observe('mga', self.action, 45.0, 'NetworkError', 100)
+        self.metrics.observe('mgb', self.query, 0.01, 0, 10, 20)
+        self.metrics.retried('mga', self.action)
+
+        snap = self.metrics.snapshot()
+        export = _series(snap, 'mga', EXPORT)
+        self.assertEqual(export['count'], 3)
+        self.assertEqual(export['failures'], 2)
+        self.assertEqual(export['retries'], 1)
+        self.assertEqual(export['bytes_out'], 300)
+        self.assertEqual(export['bytes_in'], 110)
+        self.assertEqual(export['codes'],
+                         {'0': 1, '14032': 1, 'NetworkError': 1})
+        self.assertEqual(export['latency'][0], [0.005, 1])
+        self.assertEqual(dict(export['latency'])[0.25], 2)
+        self.assertEqual(export['latency'][-1], [None, 3])
+
+        query = _series(snap, 'mgb', 'query')
+        self.assertEqual((query['count'], query['failures']), (1, 0))
+        # Buckets are inclusive of their upper bound
+        self.assertEqual(query['latency'][1], [0.01, 1])
+
+    def testWrite(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            self.metrics.observe('mga', self.action, 0.003, 0, 100, 50)
+
+            path = os.path.join(tmpdir, 'vxg.json')
+            self.metrics.write(path)
+            snap = json.load(open(path))
+            self.assertEqual(_series(snap, 'mga', EXPORT)['count'], 1)
+
+            path = os.path.join(tmpdir, 'vxg.prom')
+            self.metrics.write(path, 'text')
+            text = open(path).read()
+            labels = 'host="mga",operation="%s"' % (EXPORT,)
+            self.assertTrue('vxg_requests_total{%s} 1\n' % (labels,)
+                            in text)
+            self.assertTrue('vxg_latency_seconds_bucket{%s,le="+Inf"} 1\n'
+                            % (labels,) in text)
+            self.assertTrue('vxg_return_codes_total{%s,code="0"} 1\n'
+                            % (labels,) in text)
+
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['vxg.json', 'vxg.prom'])
+            self.assertRaises(ValueError, self.metrics.write, path, 'xml')
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def testCloseWrites(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'vxg.json')
+            self.metrics.start(path, interval=3600)
+            self.metrics.observe('mga', self.action, 0.003, 0, 100, 50)
+            self.metrics.close()
+
+            snap = json.load(open(path))
+            self.assertEqual(_series(snap, 'mga', EXPORT)['count'], 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class XGSessionMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics()
+        self.session = XGSession('mga', autologin=False, keepalive=True,
+                                 log_fd=StringIO.StringIO(),
+                                 metrics=self.metrics)
+        self.session.login = lambda: True
+
+    def testPerformAction(self):
+        self.session._handle = FakeHandle([ACTION_OK, ACTION_BUSY,
+                                           LOGGED_OUT, ACTION_OK])
+        for i in range(3):
+            self.session.perform_action(EXPORT)
+
+        export = _series(self.metrics.snapshot(), 'mga', EXPORT)
+        self.assertEqual(export['count'], 4)
+        self.assertEqual(export['retries'], 1)
+        self.assertEqual(export['codes'], {'0': 2, '14032': 1,
+                                           'AuthenticationError': 1})
+
+    def testNoRetry(self):
+        self.session.keepalive = False
+        self.session._handle = FakeHandle([LOGGED_OUT])
+        self.assertRaises(error.AuthenticationError,
+                          self.session.perform_action, EXPORT)
+        export = _series(self.metrics.snapshot(), 'mga', EXPORT)
+        self.assertEqual((export['count'], export['retries']), (1, 0))
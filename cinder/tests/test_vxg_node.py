@@ -0,0 +1,87 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools nodes
+"""
+
+import unittest
+import xml.etree.ElementTree as ET
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.node import XGNodeDict
+
+
+class XGNodeTestCase(unittest.TestCase):
+    """Nodes parsed from responses convert their values on first read."""
+
+    def _parse(self, xml_str, flat=True):
+        return XGNode.parse_el(ET.fromstring(xml_str), flat)
+
+    def testParseFlat(self):
+        nodes = self._parse('<node><name>/a</name><type>string</type>'
+                            '<value>x</value><node><name>/a/b</name>'
+                            '<type>uint64</type><value>12</value></node>'
+                            '<node><name>/a/c</name><type>bool</type>'
+                            '<value>true</value></node></node>')
+        self.assertEqual(sorted(nodes.keys()), ['/a', '/a/b', '/a/c'])
+        self.assertEqual(nodes['/a'].value, 'x')
+        self.assertEqual(nodes['/a/b'].value, 12)
+        self.assertTrue(nodes['/a/c'].value is True)
+        self.assertEqual(nodes['/a/b'], XGNode('/a/b', 'uint64', '12'))
+
+    def testParseTree(self):
+        node = self._parse('<node><name>/a</name><type>string</type>'
+                           '<value>x</value><node><name>/a/b</name>'
+                           '<type>int16</type><value>-1</value></node>'
+                           '</node>', False)
+        self.assertEqual(node.name, '/a')
+        self.assertEqual(len(node.nodes), 1)
+        self.assertEqual(node.nodes[0].value, -1)
+
+    def testLazyValue(self):
+        node = XGNode.from_response('/a', 'duration_sec', '1d2h')
+        copy = XGNode.copy(node)
+        self.assertEqual(node.value, 93600)
+        self.assertEqual(copy.value, 93600)
+
+        node.value = 5
+        self.assertEqual(node.value, 5)
+        self.assertEqual(copy.value, 93600)
+
+        bad = XGNode.from_response('/a', 'uint32', 'zz')
+        self.assertRaises(error.TypeError, getattr, bad, 'value')
+        self.assertRaises(error.TypeError, XGNode, '/a', 'uint32', 'zz')
+
+    def testFromResponseNameFlags(self):
+        node = XGNode.from_response('/a/*', 'string', 'x')
+        self.assertEqual(node.name, '/a')
+        self.assertEqual(node.subop, 'iterate')
+
+    def testCompact(self):
+        node = XGNode.from_response('/a', 'string', 'x')
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertRaises(AttributeError, setattr, node, 'bogus', 1)
+
+    def testNodeDictUpdates(self):
+        nodes = XGNodeDict([XGNode.from_response('/a', 'uint32', '1'),
+                            XGNode.from_response('/b', 'uint32', '2')],
+                           True)
+        nodes['/a'] = 3
+        updates = nodes.get_updates()
+        self.assertEqual([(x.name, x.value) for x in updates], [('/a', 3)])
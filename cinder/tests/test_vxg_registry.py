@@ -0,0 +1,138 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools shared sessions
+"""
+
+import StringIO
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import registry
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+
+KEY = ('1.2.3.4', 'admin', 'https')
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = 0
+        self.basic = 'basic'
+
+    def close(self):
+        self.closed += 1
+
+
+class SessionRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = registry.SessionRegistry()
+        self.opened = []
+
+    def _factory(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def testShared(self):
+        one = self.registry.open(KEY, 'pw', self._factory)
+        two = self.registry.open(KEY, 'pw', self._factory)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(one.basic, 'basic')
+        self.assertEqual(self.registry.stats(), {KEY: 2})
+
+        one.close()
+        one.close()
+        self.assertEqual(self.opened[0].closed, 0)
+        self.assertRaises(AttributeError, getattr, one, 'basic')
+
+        two.close()
+        self.assertEqual(self.opened[0].closed, 1)
+        self.assertEqual(self.registry.stats(), {})
+
+        # Opened afresh once everyone has let go
+        self.registry.open(KEY, 'pw', self._factory)
+        self.assertEqual(len(self.opened), 2)
+
+    def testOtherKeys(self):
+        self.registry.open(KEY, 'pw', self._factory)
+        self.registry.open(('1.2.3.5', 'admin', 'https'), 'pw',
+                           self._factory)
+        self.assertEqual(len(self.opened), 2)
+
+    def testPasswordMismatch(self):
+        shared = self.registry.open(KEY, 'pw', self._factory)
+        other = self.registry.open(KEY, 'other', self._factory)
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(other is self.opened[1])
+        self.assertEqual(self.registry.stats(), {KEY: 1})
+        shared.close()
+        self.assertEqual(self.opened[1].closed, 0)
+
+    def testSettingsMismatch(self):
+        metrics = object()
+        shared = self.registry.open(KEY, 'pw', self._factory, (4, metrics))
+        same = self.registry.open(KEY, 'pw', self._factory, (4, metrics))
+        other = self.registry.open(KEY, 'pw', self._factory, (4, object()))
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(other is self.opened[1])
+        self.assertEqual(self.registry.stats(), {KEY: 2})
+        shared.close()
+        same.close()
+        self.assertEqual(self.opened[0].closed, 1)
+        self.assertEqual(self.opened[1].closed, 0)
+
+    def testFailedOpen(self):
+        self.assertTrue(self.registry.open(KEY, 'pw', lambda: None) is None)
+        self.assertEqual(self.registry.stats(), {})
+
+        def fail():
+            raise ValueError('no route to host')
+
+        self.assertRaises(ValueError, self.registry.open, KEY, 'pw', fail)
+        self.assertEqual(self.registry.stats(), {})
+
+
+class XGSessionReloginTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = XGSession('1.2.3.4', autologin=False, keepalive=True,
+                                 log_fd=StringIO.StringIO())
+        self.logins = 0
+
+        def login():
+            self.logins += 1
+            return True
+
+        self.session.login = login
+
+    def testRelogin(self):
+        seen = self.session._logins
+        self.assertTrue(self.session._relogin(seen))
+        self.assertEqual(self.logins, 1)
+
+        # A request that failed alongside the first only retries
+        self.assertTrue(self.session._relogin(seen))
+        self.assertEqual(self.logins, 1)
+
+        self.assertTrue(self.session._relogin(self.session._logins))
+        self.assertEqual(self.logins, 2)
+
+    def testFailedRelogin(self):
+        self.session.login = lambda: False
+        self.assertFalse(self.session._relogin(self.session._logins))
+        self.assertEqual(self.session._logins, 0)
@@ -0,0 +1,184 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools request serialization
+"""
+
+import unittest
+import xml.etree.ElementTree as ET
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGAction
+from cinder.volume.drivers.violin.vxg.core.request import XGActionTemplate
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.request import XGSet
+
+
+def _canonical(xml_str):
+    def walk(el):
+        return (el.tag, (el.text or '').strip(),
+                tuple(walk(x) for x in el))
+    return walk(ET.fromstring(xml_str))
+
+
+class XGRequestSerializerTestCase(unittest.TestCase):
+    """Compact serializer output matches the element tree paths."""
+
+    def _assertParity(self, req):
+        compact = req.to_xml()
+        self.assertEqual(_canonical(compact),
+                         _canonical(req.to_xml(pretty_print=True)))
+        self.assertEqual(_canonical(compact),
+                         _canonical(ET.tostring(req._to_element_tree())))
+        return compact
+
+    def testQuery(self):
+        req = XGQuery([XGNode('/vshare/state/local/container/*'),
+                       XGNode('/vshare/config/igroup/**'),
+                       XGNode('/system/hostname/***'),
+                       XGNode('/cluster/state/master_id',
+                              flags=['no-state'])])
+        compact = self._assertParity(req)
+        self.assertTrue(compact.startswith('<?xml version="1.0" '
+                                           'encoding="UTF-8"?>\n'))
+        self.assertTrue('<query-request><nodes><node><subop>iterate</subop>'
+                        '<name>/vshare/state/local/container</name></node>'
+                        in compact)
+        self.assertFalse('<value>' in compact)
+
+    def testAction(self):
+        req = XGAction('/vshare/actions/lun/create',
+                       [XGNode('container', 'string', 'PROD08'),
+                        XGNode('size', 'uint64', 1024),
+                        XGNode('thin', 'bool', True),
+                        XGNode('description', 'string', '')])
+        compact = self._assertParity(req)
+        self.assertTrue('<action-name>/vshare/actions/lun/create'
+                        '</action-name>' in compact)
+        self.assertTrue('<type>bool</type><value>true</value>' in compact)
+        self.assertTrue('<type>uint64</type><value>1024</value>' in compact)
+
+    def testSet(self):
+        req = XGSet([XGNode('/system/hostname', 'hostname', 'mg-a')])
+        compact = self._assertParity(req)
+        self.assertTrue('<set-request><nodes>' in compact)
+
+    def testEscaping(self):
+        req = XGAction('/vshare/actions/a&b',
+                       [XGNode('x<y', 'string', 'a&b <c> "d"')])
+        compact = self._assertParity(req)
+        self.assertTrue('/vshare/actions/a&amp;b' in compact)
+        self.assertTrue('<name>x&lt;y</name>' in compact)
+        self.assertTrue('<value>a&amp;b &lt;c&gt; "d"</value>' in compact)
+
+    def testUnicodeValue(self):
+        req = XGAction('/vshare/actions/lun/create',
+                       [XGNode('description', 'string', u'caf\xe9')])
+        compact = req.to_xml()
+        self.assertTrue(isinstance(compact, str))
+        self.assertTrue('<value>caf&#233;</value>' in compact)
+        self.assertEqual(ET.fromstring(compact).find('.//value').text,
+                         u'caf\xe9')
+
+    def testPrettyPrintUnchanged(self):
+        req = XGAction('/vshare/actions/lun/rename',
+                       [XGNode('container', 'string', 'PROD08'),
+                        XGNode('lun_old', 'string', 'a&b')])
+        self.assertEqual(req.to_xml(pretty_print=True),
+                         '<?xml version="1.0" encoding="UTF-8"?>\n'
+                         '<xg-request>\n'
+                         '  <action-request>\n'
+                         '    <action-name>/vshare/actions/lun/rename'
+                         '</action-name>\n'
+                         '    <nodes>\n'
+                         '      <node>\n'
+                         '        <name>container</name>\n'
+                         '        <type>string</type>'
+                         '<value>PROD08</value></node>\n'
+                         '      <node>\n'
+                         '        <name>lun_old</name>\n'
+                         '        <type>string</type>'
+                         '<value>a&amp;b</value></node>\n'
+                         '    </nodes>\n'
+                         '  </action-request>\n'
+                         '</xg-request>\n')
+
+
+class XGActionTemplateTestCase(unittest.TestCase):
+    """Bound templates send the same XML as the equivalent XGAction."""
+
+    def setUp(self):
+        self.template = XGActionTemplate(
+            '/vshare/actions/lun/export',
+            [('container', 'string'),
+             ('names/{0}', 'string'),
+             ('ports/{0}', 'string'),
+             ('lun_id', 'int16'),
+             ('action', 'string', 'c'),
+             ('unexport', 'bool'),
+             ('description', 'string')],
+            optional=['description'])
+
+    def _action(self, container, names, ports, lun_id, unexport,
+                description=None):
+        nodes = [XGNode('container', 'string', container)]
+        nodes.extend(XGNode.as_node_list('names/{0}', 'string', names))
+        nodes.extend(XGNode.as_node_list('ports/{0}', 'string', ports))
+        nodes.append(XGNode('lun_id', 'int16', lun_id))
+        nodes.append(XGNode('action', 'string', 'c'))
+        nodes.append(XGNode('unexport', 'bool', unexport))
+        if description is not None:
+            nodes.append(XGNode('description', 'string', description))
+        return XGAction('/vshare/actions/lun/export', nodes)
+
+    def testBind(self):
+        req = self.template.bind(container='PROD08', names=['a', 'b&c'],
+                                 ports='all', lun_id='12', unexport=False,
+                                 description='<none>')
+        expected = self._action('PROD08', ['a', 'b&c'], 'all', 12, False,
+                                '<none>')
+        self.assertEqual(req.to_xml(), expected.to_xml())
+        self.assertEqual(req.to_xml(pretty_print=True),
+                         expected.to_xml(pretty_print=True))
+        self.assertEqual(req.type, 'action')
+        self.assertEqual(req.action, '/vshare/actions/lun/export')
+
+    def testBindOptional(self):
+        req = self.template.bind(container='PROD08', names='a', ports=None,
+                                 lun_id=-1, unexport='true')
+        expected = self._action('PROD08', 'a', None, -1, True)
+        self.assertEqual(req.to_xml(), expected.to_xml())
+        self.assertEqual(len(req.nodes), 5)
+
+    def testBindErrors(self):
+        self.assertRaises(error.TypeError, self.template.bind,
+                          container='PROD08', names='a', lun_id=1,
+                          unexport=False, bogus=1)
+        self.assertRaises(error.TypeError, self.template.bind,
+                          container='PROD08', names='a', unexport=False)
+        self.assertRaises(error.TypeError, self.template.bind,
+                          container='PROD08', names='a', lun_id='x',
+                          unexport=False)
+        self.assertRaises(error.TypeError, self.template.bind,
+                          container='PROD08', names='a', lun_id=1,
+                          unexport='maybe')
+        self.assertRaises(ValueError, self.template.bind, container='PROD08',
+                          names=1, lun_id=1, unexport=False)
+        self.assertRaises(error.TypeError, XGActionTemplate, '/a',
+                          [('a', 'string')], optional=['b'])
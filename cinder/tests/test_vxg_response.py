@@ -0,0 +1,224 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools response parsing
+"""
+
+import StringIO
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGAction
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.response import XGResponse
+from cinder.volume.drivers.violin.vxg.core.response import XGResponseStream
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+OK_STATUS = ('<return-status><return-code>0</return-code>'
+             '<return-msg>Success</return-msg></return-status>')
+
+
+def _query(nodes, db_rev='<db-revision-id>47</db-revision-id>',
+           status=OK_STATUS):
+    return (HEADER + '<xg-response><query-response>' + status + db_rev +
+            '<nodes>' + nodes + '</nodes></query-response></xg-response>')
+
+
+def _node(name, type='string', value='x', children='', node_id=None,
+          binding=False, attribs=''):
+    body = '<name>%s</name><type>%s</type><value>%s</value>%s' % (
+        name, type, value, attribs)
+    if binding:
+        body = '<binding>%s</binding>' % (body,)
+    if node_id is not None:
+        body = '<node-id>%s</node-id>' % (node_id,) + body
+    return '<node>%s%s</node>' % (body, children)
+
+
+ATTRIBS = ('<attribs><attrib><attribute-id>unit</attribute-id>'
+           '<type>string</type><value>bytes</value></attrib>'
+           '<attrib><attribute-id>min</attribute-id><type>uint32</type>'
+           '<value>0</value></attrib></attribs>')
+
+LUNS = ''.join(_node('/vshare/state/local/container/PROD08/lun/%s' % (x,),
+                     children=_node('/vshare/state/local/container/PROD08'
+                                    '/lun/%s/size' % (x,),
+                                    'uint64', '1024'))
+               for x in ('a', 'b', 'c&amp;d'))
+
+# (description, response) pairs, each parsed every way the gateway
+# responses are: flat and tree, with and without a prefix to strip
+CORPUS = [
+    ('empty nodes', _query('')),
+    ('no nodes element', HEADER + '<xg-response><query-response>' +
+     OK_STATUS + '</query-response></xg-response>'),
+    ('no db revision', _query(_node('/a'), db_rev='')),
+    ('empty db revision', _query(_node('/a'),
+                                 db_rev='<db-revision-id/>')),
+    ('no return-msg', _query(_node('/a'), status='<return-status>'
+                             '<return-code>1</return-code>'
+                             '</return-status>')),
+    ('empty return-msg', _query(_node('/a'), status='<return-status>'
+                                '<return-code>14003</return-code>'
+                                '<return-msg/></return-status>')),
+    ('typed values', _query(_node('/a/b', 'uint64', '12') +
+                            _node('/a/c', 'bool', 'true') +
+                            _node('/a/d', 'float64', '0.5') +
+                            _node('/a/e', 'duration_sec', '1d2h') +
+                            _node('/a/f', 'int16', '-1'))),
+    ('empty value', _query(_node('/a', value=''))),
+    ('escaped text', _query(_node('/a&amp;b', value='&lt;x&gt; &amp; y'))),
+    ('whitespace', _query('\n  ' + _node('/a', value=' spaced ') +
+                          '\n')),
+    ('nested', _query(LUNS)),
+    ('bindings', _query(_node('/a', binding=True, node_id='7',
+                              children=_node('/a/b', binding=True)))),
+    ('attribs', _query(_node('/a', attribs=ATTRIBS) +
+                       _node('/b', binding=True, attribs=ATTRIBS))),
+    ('unnamed parent', _query('<node><node-id>1</node-id>' +
+                              _node('/a') + '</node>')),
+    ('duplicate names', _query(_node('/a', value='1') +
+                               _node('/a', value='2',
+                                     children=_node('/a', value='3')))),
+    ('name flags', _query(_node('/a/*') + _node('/b/'))),
+    ('extra response fields', HEADER + '<xg-response><query-response>'
+     '<other>1</other>' + OK_STATUS + '<db-revision-id>3</db-revision-id>'
+     '<nodes>' + _node('/a') + '</nodes><nodes>' + _node('/b') +
+     '</nodes></query-response></xg-response>'),
+    ('status', HEADER + '<xg-response><xg-status><status-code>1</status-code>'
+     '<status-msg>Bad request</status-msg></xg-status></xg-response>'),
+]
+
+ERRORS = [
+    ('not xg-response', HEADER + '<xg-reply/>', error.ParseError),
+    ('type mismatch', HEADER + '<xg-response><set-response>' + OK_STATUS +
+     '</set-response></xg-response>', error.ParseError),
+    ('missing return-status', HEADER + '<xg-response><query-response>'
+     '<nodes/></query-response></xg-response>', error.ParseError),
+    ('missing return-code', _query('', status='<return-status>'
+                                   '<return-msg/></return-status>'),
+     error.ParseError),
+    ('bad db revision', _query('', db_rev='<db-revision-id>x'
+                               '</db-revision-id>'), error.ParseError),
+    ('bad nodes child', _query('<item/>'), error.ParseError),
+    ('bad node child', _query('<node><name>/a</name><item/></node>'),
+     error.ParseError),
+    ('bad binding child', _query('<node><binding><node-id>1</node-id>'
+                                 '</binding></node>'), error.ParseError),
+    ('bad attrib', _query(_node('/a', attribs='<attribs><attrib>'
+                                '<type>string</type></attrib></attribs>')),
+     error.ParseError),
+    ('bad status field', HEADER + '<xg-response><xg-status><other/>'
+     '</xg-status></xg-response>', error.ParseError),
+    ('not authenticated', HEADER + '<xg-response><xg-status>'
+     '<status-code>1</status-code><status-msg>Not authenticated'
+     '</status-msg></xg-status></xg-response>', error.AuthenticationError),
+]
+
+
+def _attrs(attrs):
+    if isinstance(attrs, dict):
+        return sorted((k, v.id, v.type, v.value) for k, v in attrs.items())
+    return list(attrs)
+
+
+def _canonical_node(node):
+    return (node.name, node.type, node.value, node.node_id, node.flags,
+            node.subop, _attrs(node.attrs),
+            [_canonical_node(x) for x in node.nodes])
+
+
+def _canonical(resp):
+    if isinstance(resp.nodes, list):
+        nodes = [_canonical_node(x) for x in resp.nodes]
+    else:
+        nodes = sorted((k, _canonical_node(resp.nodes.get_node(k)))
+                       for k in resp.nodes)
+    return (resp.type, resp.r_code, resp.r_msg, resp.db_rev, nodes)
+
+
+class XGResponseParserTestCase(unittest.TestCase):
+    """fromstring() matches the element tree parser it replaced."""
+
+    def _requests(self):
+        nodes = [XGNode('/vshare/state/local/container/PROD08/**')]
+        return [XGQuery(nodes, flat=True),
+                XGQuery(nodes, flat=True, values_only=True),
+                XGQuery(nodes, flat=False)]
+
+    def testParity(self):
+        for name, xml_str in CORPUS:
+            for req in self._requests():
+                for strip in (None, '/vshare/state/local/container',
+                              '/a/'):
+                    expected = XGResponse._fromstring_etree(req, xml_str,
+                                                            strip)
+                    actual = XGResponse.fromstring(req, xml_str, strip)
+                    self.assertEqual(_canonical(actual),
+                                     _canonical(expected),
+                                     '%s (flat=%s strip=%s)'
+                                     % (name, req.flat, strip))
+                    self.assertEqual(actual.nodes.__class__,
+                                     expected.nodes.__class__)
+
+    def testErrors(self):
+        req = XGQuery([XGNode('/a')], flat=True)
+        for name, xml_str, exc in ERRORS:
+            self.assertRaises(exc, XGResponse._fromstring_etree, req,
+                              xml_str)
+            self.assertRaises(exc, XGResponse.fromstring, req, xml_str)
+
+    def testMalformed(self):
+        req = XGQuery([XGNode('/a')], flat=True)
+        self.assertRaises(error.ParseError, XGResponse.fromstring, req,
+                          _query(_node('/a'))[:-10])
+        self.assertRaises(error.ParseError, XGResponse.fromstring, req,
+                          'not xml')
+
+    def testAction(self):
+        req = XGAction('/vshare/actions/lun/create')
+        resp = XGResponse.fromstring(req, HEADER +
+                                     '<xg-response><action-response>' +
+                                     OK_STATUS + '<db-revision-id>9'
+                                     '</db-revision-id></action-response>'
+                                     '</xg-response>')
+        self.assertEqual(resp.as_action_result(),
+                         {'code': 0, 'message': 'Success'})
+        self.assertEqual(resp.db_rev, 9)
+
+    def testStream(self):
+        req = XGQuery([XGNode('/vshare/state/local/container/PROD08/**')],
+                      flat=True)
+        for name, xml_str in CORPUS:
+            expected = XGResponse.fromstring(req, xml_str)
+            # Status responses have an empty node list
+            expected_nodes = expected.nodes and expected.nodes.values()
+            stream = XGResponseStream(req, StringIO.StringIO(xml_str))
+            stream.chunk_size = 7
+            nodes = list(stream)
+            # Nodes are streamed as they are decoded, duplicates and all
+            self.assertEqual(dict((x.name, _canonical_node(x))
+                                  for x in nodes),
+                             dict((x.name, _canonical_node(x))
+                                  for x in expected_nodes),
+                             name)
+            self.assertEqual(stream.count, len(nodes))
+            self.assertEqual(stream.db_rev, expected.db_rev)
+            self.assertEqual(stream.r_code, expected.r_code)
@@ -0,0 +1,122 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for the XG-Tools gateway router
+"""
+
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import router
+
+
+class FakeSession(object):
+    """Answers queries with its own name, after a settable delay."""
+    def __init__(self, name, clock):
+        self.name = name
+        self.clock = clock
+        self.delay = 0.01
+        self.fail = False
+        self.queries = 0
+        self.cached = []
+
+    def get_node_values(self, nodes, cached=True):
+        self.queries += 1
+        self.cached.append(cached)
+        self.clock.now += self.delay
+        if self.fail:
+            raise IOError('%s is down' % (self.name,))
+        return {nodes: self.name}
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class GatewayRouterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self._time = router.time.time
+        router.time.time = self.clock.time
+        self.sessions = [FakeSession(x, self.clock)
+                         for x in ('vip', 'mga', 'mgb')]
+        self.router = router.GatewayRouter([(x.name, x)
+                                            for x in self.sessions],
+                                           retry_after=30)
+
+    def tearDown(self):
+        router.time.time = self._time
+
+    def testPrimaryFirst(self):
+        self.assertTrue(self.router.primary is self.sessions[0])
+        self.assertEqual(self.router.ranked(), ['vip', 'mga', 'mgb'])
+        self.assertEqual(self.router.get_node_values('/a'), {'/a': 'vip'})
+
+    def testUncached(self):
+        self.router.probe()
+        self.router.get_node_values('/a')
+        self.assertEqual(self.sessions[0].cached, [False, False])
+
+    def testFastest(self):
+        self.sessions[0].delay = 0.5
+        self.sessions[2].delay = 0.02
+        self.router.probe()
+        self.assertEqual(self.router.ranked(), ['mga', 'mgb', 'vip'])
+        self.assertEqual(self.router.get_node_values('/a'), {'/a': 'mga'})
+
+        # A gateway that slows down loses its place as samples come in
+        self.sessions[1].delay = 1.0
+        for i in range(5):
+            self.router.probe()
+        self.assertEqual(self.router.ranked(), ['mgb', 'vip', 'mga'])
+
+    def testFailover(self):
+        self.router.probe()
+        self.sessions[0].fail = True
+        self.assertEqual(self.router.get_node_values('/a'), {'/a': 'mga'})
+        stats = self.router.stats()
+        self.assertFalse(stats['vip']['healthy'])
+        self.assertEqual(stats['vip']['errors'], 1)
+
+        # Skipped until retry_after is up
+        queries = self.sessions[0].queries
+        self.router.get_node_values('/a')
+        self.assertEqual(self.sessions[0].queries, queries)
+
+        self.sessions[0].fail = False
+        self.clock.now += 30
+        self.assertTrue(self.router.stats()['vip']['healthy'])
+        self.router.probe()
+        self.assertEqual(self.router.ranked()[-1], 'vip')
+
+    def testAllFailing(self):
+        for x in self.sessions:
+            x.fail = True
+        self.assertRaises(IOError, self.router.get_node_values, '/a')
+        self.assertEqual([x.queries for x in self.sessions], [1, 1, 1])
+
+        # Failing gateways are still tried, as a last resort
+        self.sessions[1].fail = False
+        self.assertEqual(self.router.get_node_values('/a'), {'/a': 'mga'})
+
+    def testNoGateways(self):
+        self.assertRaises(ValueError, router.GatewayRouter, [])
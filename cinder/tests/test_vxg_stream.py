@@ -0,0 +1,211 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools streamed query responses
+"""
+
+import socket
+import StringIO
+import unittest
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.response import XGResponseStream
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+OK_STATUS = ('<return-status><return-code>0</return-code>'
+             '<return-msg>Success</return-msg></return-status>')
+
+PREFIX = '/vshare/config/lun'
+
+
+def _query(nodes, db_rev=5):
+    return (HEADER + '<xg-response><query-response>' + OK_STATUS +
+            '<db-revision-id>%d</db-revision-id><nodes>%s</nodes>'
+            '</query-response></xg-response>' % (db_rev, nodes))
+
+
+def _nodes(count):
+    return ''.join('<node><name>%s/lun%d</name><type>uint64</type>'
+                   '<value>%d</value></node>' % (PREFIX, i, i)
+                   for i in range(count))
+
+
+RESPONSE = _query(_nodes(100))
+
+# The response breaks off with a bad element after the first nodes
+BAD_RESPONSE = _query(_nodes(3) + '<item/>' + _nodes(100))
+
+# As above, but only after more than a chunk of nodes
+LATE_BAD_RESPONSE = _query(_nodes(500) + '<item/>')
+
+
+class FakeResponse(StringIO.StringIO):
+    """Stands in for the HTTP response, failing with error once "fail_at"
+    bytes have been read.
+    """
+    def __init__(self, data, fail_at=None, error=None):
+        StringIO.StringIO.__init__(self, data)
+        self.fail_at = fail_at
+        self.error = error
+
+    def read(self, n=-1):
+        if self.fail_at is not None and self.tell() >= self.fail_at:
+            raise self.error
+        return StringIO.StringIO.read(self, n)
+
+
+class FakeHandle(object):
+    """Stands in for the session's urllib2 opener, answering each request
+    with the next of responses.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.opened = []
+
+    def open(self, url, data=None):
+        resp = FakeResponse(self.responses.pop(0))
+        self.opened.append(resp)
+        return resp
+
+
+class XGResponseStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.req = XGQuery([XGNode(PREFIX + '/**')], flat=True)
+
+    def testChunks(self):
+        for chunk_size in (1, 7, 16384):
+            fp = FakeResponse(RESPONSE)
+            stream = XGResponseStream(self.req, fp)
+            stream.chunk_size = chunk_size
+            nodes = list(stream)
+
+            self.assertEqual([(x.name, x.value) for x in nodes],
+                             [('%s/lun%d' % (PREFIX, i), i)
+                              for i in range(100)])
+            self.assertEqual(stream.count, 100)
+            self.assertEqual(stream.bytes_read, len(RESPONSE))
+            self.assertEqual(stream.db_rev, 5)
+            self.assertEqual(stream.r_code, 0)
+            self.assertTrue(fp.closed)
+
+    def testIncremental(self):
+        fp = FakeResponse(RESPONSE)
+        stream = XGResponseStream(self.req, fp)
+        stream.chunk_size = 256
+        it = iter(stream)
+
+        self.assertEqual(it.next().name, PREFIX + '/lun0')
+        self.assertTrue(stream.bytes_read < len(RESPONSE) / 10)
+
+    def testStrip(self):
+        stream = XGResponseStream(self.req, FakeResponse(RESPONSE),
+                                  strip=PREFIX + '/')
+        self.assertEqual(iter(stream).next().name, 'lun0')
+
+    def testEarlyClose(self):
+        fp = FakeResponse(RESPONSE)
+        stream = XGResponseStream(self.req, fp)
+        stream.chunk_size = 64
+        it = iter(stream)
+        it.next()
+        it.close()
+
+        self.assertTrue(fp.closed)
+        self.assertTrue(stream.fp is None)
+        self.assertEqual(stream.count, 1)
+
+    def testBadElement(self):
+        fp = FakeResponse(BAD_RESPONSE)
+        stream = XGResponseStream(self.req, fp)
+        stream.chunk_size = 16
+        nodes = []
+
+        def read_all():
+            for node in stream:
+                nodes.append(node)
+
+        self.assertRaises(error.ParseError, read_all)
+        # The last node before the bad element may come out with it
+        self.assertTrue(nodes)
+        self.assertTrue(len(nodes) <= 3)
+        self.assertTrue(fp.closed)
+
+    def testReadFailure(self):
+        fp = FakeResponse(RESPONSE, fail_at=len(RESPONSE) / 2,
+                          error=socket.error(104, 'Connection reset'))
+        stream = XGResponseStream(self.req, fp)
+        stream.chunk_size = 64
+        nodes = []
+
+        def read_all():
+            for node in stream:
+                nodes.append(node)
+
+        self.assertRaises(error.NetworkError, read_all)
+        self.assertTrue(0 < len(nodes) < 100)
+        self.assertTrue(fp.closed)
+
+
+class XGSessionStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = XGSession('mga', autologin=False,
+                                 log_fd=StringIO.StringIO())
+
+    def testIterNodes(self):
+        self.session._handle = FakeHandle([RESPONSE])
+        nodes = list(self.session.iter_nodes(PREFIX + '/**'))
+
+        self.assertEqual(len(nodes), 100)
+        self.assertEqual(nodes[0].name, PREFIX + '/lun0')
+        self.assertTrue(self.session._handle.opened[0].closed)
+
+    def testIterNodeValues(self):
+        self.session._handle = FakeHandle([RESPONSE])
+        values = self.session.iter_node_values(PREFIX + '/**',
+                                               strip=PREFIX + '/')
+
+        self.assertEqual(values.next(), ('lun0', 'uint64', 0))
+        self.assertEqual(len(list(values)), 99)
+
+    def testEarlyClose(self):
+        self.session._handle = FakeHandle([RESPONSE])
+        nodes = self.session.iter_nodes(PREFIX + '/**')
+        nodes.next()
+        fp = self.session._handle.opened[0]
+        self.assertFalse(fp.closed)
+
+        nodes.close()
+        self.assertTrue(fp.closed)
+
+    def testErrorMidStream(self):
+        self.session._handle = FakeHandle([LATE_BAD_RESPONSE])
+        nodes = []
+
+        def read_all():
+            for node in self.session.iter_nodes(PREFIX + '/**'):
+                nodes.append(node)
+
+        self.assertRaises(error.ParseError, read_all)
+        self.assertTrue(0 < len(nodes) < 500)
+        self.assertTrue(self.session._handle.opened[0].closed)
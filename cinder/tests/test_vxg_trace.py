@@ -0,0 +1,175 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for XG-Tools request tracing
+"""
+
+import StringIO
+import time
+import unittest
+import urllib2
+
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGAction
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.session import XGSession
+from cinder.volume.drivers.violin.vxg.core import trace
+
+RESPONSE = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<xg-response><query-response><return-status>'
+            '<return-code>0</return-code><return-msg/></return-status>'
+            '<db-revision-id>5</db-revision-id><nodes><node>'
+            '<name>/system/hostname</name><type>hostname</type>'
+            '<value>mga</value></node></nodes></query-response>'
+            '</xg-response>')
+
+
+class FakeHandle(object):
+    """Stands in for the session's urllib2 opener."""
+    def __init__(self, response=RESPONSE, error=None):
+        self.response = response
+        self.error = error
+        self.sent = []
+
+    def open(self, url, data=None):
+        self.sent.append(data)
+        if self.error is not None:
+            raise self.error
+        return StringIO.StringIO(self.response)
+
+
+class TracerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        self.tracer = trace.Tracer(self.lines.append, interval=3600)
+        self.query = XGQuery([XGNode('/a'), XGNode('/b')], flat=True)
+
+    def tearDown(self):
+        self.tracer.close()
+
+    def testRecord(self):
+        self.tracer.trace('mga', self.query, '<x/>', time.time(), 0,
+                          RESPONSE)
+        self.assertEqual(self.lines, [])
+
+        self.tracer.flush()
+        self.assertEqual(len(self.lines), 1)
+        self.assertTrue(self.lines[0].startswith(
+            'xg host=mga type=query target=/a,/b out=4 in=%d ms='
+            % (len(RESPONSE),)), self.lines[0])
+        self.assertTrue(self.lines[0].endswith(' code=0'))
+        self.assertEqual(self.tracer.recorded, 1)
+
+    def testTarget(self):
+        action = XGAction('/vshare/actions/lun/create',
+                          [XGNode('name', 'string', 'x')])
+        self.assertEqual(trace._target(action), '/vshare/actions/lun/create')
+        query = XGQuery([XGNode('/%d' % (x,)) for x in range(5)])
+        self.assertEqual(trace._target(query), '/0,/1,/2,+2')
+
+    def testSampling(self):
+        self.tracer.trace('mga', self.query, '<x/>', time.time(), 0,
+                          RESPONSE)
+        self.tracer.sample_rate = 1.0
+        self.tracer.max_payload = 10
+        self.tracer.trace('mga', self.query, '<x/>', time.time(), 0,
+                          RESPONSE)
+        records = list(self.tracer._buffer)
+        self.assertEqual(records[0].request, None)
+        self.assertEqual(records[0].response, None)
+        self.assertEqual(records[1].request, '<x/>')
+        self.assertEqual(records[1].response,
+                         '%s... (%d bytes)' % (RESPONSE[:10],
+                                               len(RESPONSE)))
+
+    def testCapacity(self):
+        tracer = trace.Tracer(self.lines.append, capacity=2, interval=3600)
+        for i in range(5):
+            tracer.trace('mga', self.query, '<x/>', time.time(), i)
+        self.assertEqual(tracer.dropped, 3)
+        tracer.close()
+        self.assertEqual([x[-6:] for x in self.lines],
+                         ['code=3', 'code=4'])
+
+    def testFileSink(self):
+        out = StringIO.StringIO()
+        tracer = trace.Tracer(out, interval=0.01)
+        tracer.trace('mga', self.query, '<x/>', time.time(), 0)
+        for i in range(100):
+            if out.getvalue():
+                break
+            time.sleep(0.01)
+        tracer.close()
+        self.assertTrue(out.getvalue().endswith(' code=0\n'),
+                        out.getvalue())
+
+    def testBadSink(self):
+        self.assertRaises(ValueError, trace.Tracer, 'stdout')
+
+
+class XGSessionTraceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        self.tracer = trace.Tracer(self.lines.append, interval=3600)
+        self.session = XGSession('mga', autologin=False,
+                                 log_fd=StringIO.StringIO(),
+                                 tracer=self.tracer)
+
+    def tearDown(self):
+        self.tracer.close()
+
+    def testSendRequest(self):
+        self.session._handle = FakeHandle()
+        resp = self.session.get_node_values('/system/hostname')
+        self.assertEqual(resp['/system/hostname'], 'mga')
+        record = self.tracer._buffer[0]
+        self.assertEqual((record.host, record.type, record.target,
+                          record.code),
+                         ('mga', 'query', '/system/hostname', 0))
+        self.assertEqual(record.bytes_out,
+                         len(self.session._handle.sent[0]))
+        self.assertEqual(record.bytes_in, len(RESPONSE))
+
+    def testNetworkError(self):
+        self.session._handle = FakeHandle(
+            error=urllib2.URLError('refused'))
+        self.assertRaises(error.NetworkError, self.session.get_node_values,
+                          '/system/hostname')
+        record = self.tracer._buffer[0]
+        self.assertEqual(record.code, 'URLError')
+        self.assertEqual(record.bytes_in, None)
+
+    def testStream(self):
+        self.session._handle = FakeHandle()
+        self.assertEqual(list(self.session.iter_node_values('/system/**')),
+                         [('/system/hostname', 'hostname', 'mga')])
+        record = self.tracer._buffer[0]
+        self.assertEqual((record.target, record.code, record.bytes_in),
+                         ('/system', 0, len(RESPONSE)))
+
+    def testDebug(self):
+        out = StringIO.StringIO()
+        session = XGSession('mga', autologin=False, debug=True, log_fd=out)
+        self.assertEqual(session.tracer.sample_rate, 1.0)
+        session._handle = FakeHandle()
+        session.get_node_values('/system/hostname')
+        session.tracer.close()
+        self.assertTrue('<value>mga</value>' in out.getvalue())
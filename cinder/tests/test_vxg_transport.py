@@ -0,0 +1,268 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory tests for the XG-Tools pooled HTTP transport
+"""
+
+import cookielib
+import httplib
+import socket
+import StringIO
+import time
+import unittest
+import urllib2
+
+from cinder.volume.drivers.violin.vxg.core import transport
+
+URL = 'http://mga/admin/launch?script=rh&template=xg'
+
+OK = 'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'
+
+LINES = 'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\na\nb\n'
+
+CLOSE = ('HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n'
+         '\r\nok')
+
+LOGIN = ('HTTP/1.1 200 OK\r\nContent-Length: 2\r\n'
+         'Set-Cookie: session=abc; Path=/\r\n\r\nok')
+
+
+class FakeSocket(object):
+    def __init__(self, data):
+        self.data = data
+
+    def makefile(self, mode, bufsize=0):
+        return StringIO.StringIO(self.data)
+
+
+def _response(data):
+    resp = httplib.HTTPResponse(FakeSocket(data), method='POST')
+    resp.begin()
+    return resp
+
+
+class FakeConnection(object):
+    """Stands in for an httplib connection, answering each request with
+    the next of replies: an HTTP response, or a ('request', error) or
+    ('response', error) tuple to fail sending the request or reading
+    its response with.
+    """
+    def __init__(self, replies=()):
+        self.replies = list(replies)
+        self.sent = []
+        self.closed = False
+        self._reply = None
+
+    def request(self, method, url, body=None, headers={}):
+        reply = self.replies.pop(0)
+        if isinstance(reply, tuple) and reply[0] == 'request':
+            raise reply[1]
+        self.sent.append((method, url, body, headers))
+        self._reply = reply
+
+    def getresponse(self):
+        reply, self._reply = self._reply, None
+        if isinstance(reply, tuple):
+            raise reply[1]
+        return _response(reply)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(transport.ConnectionPool):
+    """Opens a FakeConnection with the next of replies for each new
+    connection.
+    """
+    def __init__(self, replies, **kwargs):
+        transport.ConnectionPool.__init__(self, **kwargs)
+        self.replies = list(replies)
+        self.conns = []
+
+    def _new_conn(self, scheme, host, timeout):
+        conn = FakeConnection(self.replies.pop(0))
+        self.conns.append(conn)
+        return conn
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakePool([[], []])
+
+    def testReuse(self):
+        conn, reused = self.pool.get('http', 'mga')
+        self.assertFalse(reused)
+        self.pool.put('http', 'mga', conn)
+
+        self.assertEqual(self.pool.get('http', 'mga'), (conn, True))
+        self.assertEqual(self.pool.get('http', 'mgb'),
+                         (self.pool.conns[1], False))
+        self.assertEqual(self.pool.stats(),
+                         {'hits': 1, 'misses': 2, 'evictions': 0, 'idle': 0})
+
+    def testMaxSize(self):
+        pool = transport.ConnectionPool(maxsize=1)
+        a, b = FakeConnection(), FakeConnection()
+        pool.put('http', 'mga', a)
+        pool.put('http', 'mga', b)
+
+        self.assertFalse(a.closed)
+        self.assertTrue(b.closed)
+        self.assertEqual(pool.stats(),
+                         {'hits': 0, 'misses': 0, 'evictions': 1, 'idle': 1})
+
+    def testIdleEviction(self):
+        pool = FakePool([[]], idle_timeout=0.05)
+        old = FakeConnection()
+        pool.put('http', 'mga', old)
+        time.sleep(0.1)
+
+        conn, reused = pool.get('http', 'mga')
+        self.assertFalse(reused)
+        self.assertTrue(conn is not old)
+        self.assertTrue(old.closed)
+        self.assertEqual(pool.stats(),
+                         {'hits': 0, 'misses': 1, 'evictions': 1, 'idle': 0})
+
+    def testClear(self):
+        a, b = FakeConnection(), FakeConnection()
+        self.pool.put('http', 'mga', a)
+        self.pool.put('http', 'mgb', b)
+        self.pool.clear('http', 'mga')
+
+        self.assertTrue(a.closed)
+        self.assertFalse(b.closed)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+
+class PooledResponseFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.released = []
+
+    def _file(self, data):
+        return transport._PooledResponseFile(_response(data),
+                                             self.released.append)
+
+    def testDrained(self):
+        fp = self._file(OK)
+        self.assertEqual(fp.read(), 'ok')
+        self.assertEqual(fp.read(), '')
+        self.assertEqual(self.released, [True])
+
+    def testClosedEarly(self):
+        fp = self._file(OK)
+        self.assertEqual(fp.read(1), 'o')
+        fp.close()
+        fp.close()
+        self.assertEqual(self.released, [False])
+
+    def testServerClose(self):
+        fp = self._file(CLOSE)
+        self.assertEqual(fp.read(), 'ok')
+        self.assertEqual(self.released, [False])
+
+    def testReadLines(self):
+        self.assertEqual(list(self._file(LINES)), ['a\n', 'b\n'])
+        self.assertEqual(self.released, [True])
+
+
+class KeepAliveHandlerTestCase(unittest.TestCase):
+
+    def _opener(self, replies):
+        self.pool = FakePool(replies)
+        return urllib2.build_opener(
+            urllib2.HTTPCookieProcessor(cookielib.CookieJar()),
+            transport.KeepAliveHandler(self.pool))
+
+    def testReuse(self):
+        opener = self._opener([[OK, OK]])
+        for i in range(2):
+            self.assertEqual(opener.open(URL, '<xg-request/>').read(), 'ok')
+
+        self.assertEqual(len(self.pool.conns), 1)
+        sent = self.pool.conns[0].sent
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sent[0][:3], ('POST', URL[len('http://mga'):],
+                                       '<xg-request/>'))
+        self.assertEqual(sent[0][3]['Connection'], 'keep-alive')
+        self.assertEqual(self.pool.stats()['hits'], 1)
+        self.assertEqual(self.pool.stats()['misses'], 1)
+
+    def testNotDrained(self):
+        opener = self._opener([[OK], [OK]])
+        opener.open(URL, '').close()
+        opener.open(URL, '').read()
+
+        self.assertEqual(len(self.pool.conns), 2)
+        self.assertTrue(self.pool.conns[0].closed)
+
+    def testSharedCookies(self):
+        opener = self._opener([[LOGIN], [OK]])
+        fp = opener.open(URL, '')
+        opener.open(URL, '').read()
+        fp.read()
+
+        self.assertEqual(len(self.pool.conns), 2)
+        self.assertEqual(self.pool.conns[1].sent[0][3]['Cookie'],
+                         'session=abc')
+
+    def _check_retried(self, reply):
+        opener = self._opener([[OK, reply], [OK]])
+        opener.open(URL, '').read()
+        self.assertEqual(opener.open(URL, '').read(), 'ok')
+
+        self.assertTrue(self.pool.conns[0].closed)
+        self.assertEqual(len(self.pool.conns[1].sent), 1)
+
+    def testRetryStaleOnSend(self):
+        self._check_retried(('request', socket.error(32, 'Broken pipe')))
+
+    def testRetryStaleOnResponse(self):
+        self._check_retried(('response', httplib.BadStatusLine('')))
+        self._check_retried(('response', httplib.BadStatusLine(
+            'No status line received - the server has closed the '
+            'connection')))
+
+    def _check_not_retried(self, reply):
+        opener = self._opener([[OK, reply], [OK]])
+        opener.open(URL, '').read()
+        self.assertRaises(urllib2.URLError, opener.open, URL, '')
+
+        self.assertTrue(self.pool.conns[0].closed)
+        self.assertEqual(len(self.pool.conns), 1)
+
+    def testNoRetryAfterTimeout(self):
+        self._check_not_retried(('response', socket.timeout('timed out')))
+
+    def testNoRetryAfterSendTimeout(self):
+        self._check_not_retried(('request', socket.timeout('timed out')))
+
+    def testNoRetryOnceResponseStarted(self):
+        self._check_not_retried(('response', httplib.BadStatusLine('HTP')))
+
+    def testNoRetryAfterReset(self):
+        self._check_not_retried(
+            ('response', socket.error(104, 'Connection reset by peer')))
+
+    def testNoRetryOnNewConnection(self):
+        opener = self._opener([[('request', socket.error(111, 'refused'))],
+                               [OK]])
+        self.assertRaises(urllib2.URLError, opener.open, URL, '')
+        self.assertEqual(len(self.pool.conns), 1)
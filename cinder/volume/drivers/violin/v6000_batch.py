@@ -0,0 +1,185 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory 6000 Series request coalescing for gateway actions
+
+Collects requests that arrive close together and can be made in a single
+gateway action, such as exports of several luns to the same initiators,
+so that a burst of attaches costs one action and one verification rather
+than one of each per volume.
+"""
+
+import threading
+
+# Most requests sent in one batch
+DEFAULT_MAX_SIZE = 32
+
+
+class BatchRequest(object):
+    """The pending result of a request submitted to a Batcher."""
+
+    def __init__(self, item):
+        self.item = item
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def __repr__(self):
+        return '<BatchRequest %s done:%s>' % (self.item, self.done())
+
+    def done(self):
+        """Returns True once the batch holding the request has run."""
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Waits for the batch to run and returns the request's result.
+
+        If the batch raised an exception, that exception is raised here.
+
+        Arguments:
+            timeout -- Seconds to wait, None to wait forever
+        """
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise RuntimeError('Batch not run after %s seconds' % (timeout,))
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._done.set()
+
+
+class Batcher(object):
+    """Coalesces requests that share a key into batches.
+
+    The first request submitted for a key opens a batch, and its caller
+    waits "window" seconds (or until max_size requests have joined) for
+    others with the same key.  It then closes the batch and runs
+
+        flush(key, items)
+
+    which must return a list of results, one for each item in order.
+    The caller that opened the batch runs it, so no thread is needed,
+    and each caller gets its own result from its BatchRequest.  A result
+    that is an exception is raised to that item's caller alone, while if
+    flush raises, every request in the batch raises the same exception.
+
+    A request submitted while a batch for its key is being flushed opens
+    the next batch, so flush() should serialize with itself if it needs
+    to.
+
+    """
+    def __init__(self, flush, window, max_size=DEFAULT_MAX_SIZE):
+        """Arguments:
+            flush    -- function of a key and a list of items, returning
+                        a list of their results
+            window   -- seconds a batch stays open for
+            max_size -- most items in a batch
+        """
+        if int(max_size) < 1:
+            raise ValueError('max_size must be at least 1')
+        self.flush = flush
+        self.window = window
+        self.max_size = int(max_size)
+        self._open = {}
+        self._lock = threading.Lock()
+        self._stats = {'batches': 0, 'requests': 0, 'largest': 0}
+
+    def __repr__(self):
+        return '<Batcher window:%s max_size:%d open:%d>' % (
+            self.window, self.max_size, len(self._open))
+
+    def submit(self, key, item):
+        """Adds item to the open batch for key, opening one if needed.
+
+        Returns:
+            The BatchRequest for item.  If this call opened the batch, it
+            only returns once the batch has run.
+        """
+        request = BatchRequest(item)
+
+        self._lock.acquire()
+        try:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            batch.requests.append(request)
+            if len(batch.requests) >= self.max_size:
+                del self._open[key]
+                batch.full.set()
+        finally:
+            self._lock.release()
+
+        if leader:
+            self._run(key, batch)
+        return request
+
+    def stats(self):
+        """Returns a dict of the number of batches run, the requests in
+        them and the size of the largest one.
+        """
+        self._lock.acquire()
+        try:
+            return dict(self._stats)
+        finally:
+            self._lock.release()
+
+    def _run(self, key, batch):
+        batch.full.wait(self.window)
+
+        self._lock.acquire()
+        try:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            requests = list(batch.requests)
+            self._stats['batches'] += 1
+            self._stats['requests'] += len(requests)
+            self._stats['largest'] = max(self._stats['largest'],
+                                         len(requests))
+        finally:
+            self._lock.release()
+
+        try:
+            results = self.flush(key, [x.item for x in requests])
+            if len(results) != len(requests):
+                raise ValueError('Batch of %d returned %d results'
+                                 % (len(requests), len(results)))
+        except Exception as e:
+            for request in requests:
+                request.set_exception(e)
+            return
+
+        for request, result in zip(requests, results):
+            if isinstance(result, Exception):
+                request.set_exception(result)
+            else:
+                request.set_result(result)
+
+
+class _Batch(object):
+    def __init__(self):
+        self.requests = []
+        self.full = threading.Event()
@@ -26,16 +26,24 @@ Senior Software Engineer
 Violin Memory
 """
 
+import atexit
 import re
+import threading
 import time
+import uuid
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from cinder import context
 from cinder import exception
 from cinder.openstack.common import log as logging
-from cinder import utils
 from cinder.volume.drivers.san import san
+from cinder.volume.drivers.violin import v6000_batch
+from cinder.volume.drivers.violin import v6000_locks
+from cinder.volume.drivers.violin import v6000_lunid
+from cinder.volume.drivers.violin import v6000_retry
+from cinder.volume.drivers.violin import v6000_save
 from cinder.volume import volume_types
 
 LOG = logging.getLogger(__name__)
@@ -44,6 +52,19 @@ LOG = logging.getLogger(__name__)
 # support vmos versions V6.3.1 or newer
 VMOS_SUPPORTED_VERSION_PATTERNS = ['V6.3.0.[4-9]', 'V6.3.[1-9].?[0-9]?']
 
+# Seconds between polls of the gateways for a config change to show up,
+# doubling from the first to the last
+VERIFY_MIN_INTERVAL = 0.01
+VERIFY_MAX_INTERVAL = 2.0
+
+# Seconds between polls while the gateways send change events, which are
+# then only a fallback for missed events
+VERIFY_EVENT_INTERVAL = 1.0
+
+# Locks on luns, snapshots, targets and igroups.  They are shared by all
+# the backends of the process, which may well be on the same array.
+OBJECT_LOCKS = v6000_locks.KeyedLockManager()
+
 try:
     import vxg
 except ImportError:
@@ -79,7 +100,131 @@ violin_opts = [
                 help='Use igroups to manage targets and initiators'),
     cfg.BoolOpt('use_thin_luns',
                 default=False,
-                help='Use thin luns instead of thick luns'), ]
+                help='Use thin luns instead of thick luns'),
+    cfg.IntOpt('gateway_workers',
+               default=2,
+               help='Number of requests each gateway connection may run '
+                    'at once, so that work on mg-a and mg-b can overlap '
+                    '(0 runs every gateway request sequentially)'),
+    cfg.IntOpt('gateway_query_cache_size',
+               default=0,
+               help='Number of query results to cache from the master VIP '
+                    '(0 disables the query cache).  Changes made other '
+                    'than through this backend\'s VIP session are only '
+                    'seen once cached results expire'),
+    cfg.IntOpt('gateway_query_cache_ttl',
+               default=30,
+               help='Seconds a cached config query result is reused for; '
+                    'state queries are only cached for a couple of '
+                    'seconds'),
+    cfg.BoolOpt('gateway_share_sessions',
+                default=True,
+                help='Share gateway sessions with other backends in this '
+                     'process that use the same gateway and user, so '
+                     'that each gateway is only logged into once.  Only '
+                     'backends with the same password and gateway '
+                     'workers, and with gateway tracing and metrics off, '
+                     'share a session'),
+    cfg.BoolOpt('gateway_route_reads',
+                default=True,
+                help='Send queries that may see slightly stale data, such '
+                     'as capacity stats, to whichever of the VIP, mg-a '
+                     'and mg-b is answering fastest'),
+    cfg.IntOpt('gateway_probe_interval',
+               default=60,
+               help='Seconds between background health checks of the '
+                    'gateways when gateway_route_reads is set, or 0 to '
+                    'only measure the queries themselves'),
+    cfg.BoolOpt('gateway_trace',
+                default=False,
+                help='Log a one line summary of every gateway request at '
+                     'debug level, written in the background'),
+    cfg.FloatOpt('gateway_trace_sample_rate',
+                 default=0.0,
+                 help='Fraction of traced gateway requests to also log '
+                      'the (truncated) request and response XML of'),
+    cfg.StrOpt('gateway_metrics_file',
+               default='',
+               help='File to periodically write gateway request metrics '
+                    '(latency histograms, sizes, retries and return codes '
+                    'per action) to, as JSON, or in the Prometheus text '
+                    'format if the name ends in .prom'),
+    cfg.IntOpt('gateway_metrics_interval',
+               default=60,
+               help='Seconds between writes of gateway_metrics_file'),
+    cfg.StrOpt('gateway_discovery_cache',
+               default='$state_path/violin_gateways.json',
+               help='File remembering the protocol, device type and '
+                    'version of each gateway, so that they are not '
+                    'probed for every time the driver starts.  Leave '
+                    'empty to always probe'),
+    cfg.IntOpt('gateway_discovery_cache_ttl',
+               default=3600,
+               help='Seconds a gateway_discovery_cache entry is trusted '
+                    'for'),
+    cfg.ListOpt('gateway_retry_policy',
+                default=[],
+                help='Overrides of how gateway return codes are retried, '
+                     'as a list of code:fatal, code:retry or '
+                     'code:base:cap entries.  Retries back off '
+                     'exponentially from base up to cap seconds, with '
+                     'jitter (e.g. 14032:0.5:8,1024:2:30)'),
+    cfg.FloatOpt('gateway_verify_timeout',
+                 default=30.0,
+                 help='Seconds to wait for a new or removed lun export or '
+                      'iSCSI target to show up on both mg-a and mg-b'),
+    cfg.BoolOpt('gateway_events',
+                default=False,
+                help='Subscribe to configuration change events from the '
+                     'gateways, so that waits for lun exports and iSCSI '
+                     'targets end as soon as the change is reported '
+                     'rather than at the next poll.  Only enable this for '
+                     'gateways known to send these events: otherwise '
+                     'waits poll once a second rather than backing off '
+                     'from 10 ms'),
+    cfg.FloatOpt('gateway_export_batch_window',
+                 default=0.0,
+                 help='Seconds to collect lun exports to the same '
+                      'initiators and ports for, so that they are verified '
+                      'together once every lun is exported on the lun id '
+                      'the driver assigned it (0 exports and verifies '
+                      'each lun on its own)'),
+    cfg.IntOpt('gateway_export_batch_size',
+               default=v6000_batch.DEFAULT_MAX_SIZE,
+               help='Most lun exports to verify together'),
+    cfg.FloatOpt('gateway_delete_batch_window',
+                 default=0.0,
+                 help='Seconds to collect lun deletions for, so that they '
+                      'are sent to the gateway in one bulk delete action '
+                      '(0 deletes each lun on its own)'),
+    cfg.IntOpt('gateway_delete_batch_size',
+               default=v6000_batch.DEFAULT_MAX_SIZE,
+               help='Most luns to delete in one gateway action'),
+    cfg.FloatOpt('gateway_create_batch_window',
+                 default=0.0,
+                 help='Seconds to collect creations of luns of the same '
+                      'size and type for, so that they are made in one '
+                      'gateway action and then renamed (0 creates each '
+                      'lun on its own)'),
+    cfg.IntOpt('gateway_create_batch_size',
+               default=v6000_batch.DEFAULT_MAX_SIZE,
+               help='Most luns to create in one gateway action'),
+    cfg.FloatOpt('gateway_config_save_interval',
+                 default=v6000_save.DEFAULT_INTERVAL,
+                 help='Most seconds an export change waits before the '
+                      'array configuration is saved in the background (0 '
+                      'saves it on every attach and detach)'),
+    cfg.IntOpt('gateway_config_save_max_pending',
+               default=v6000_save.DEFAULT_MAX_PENDING,
+               help='Number of unsaved export changes that get the array '
+                    'configuration saved without waiting out the interval'),
+    cfg.IntOpt('gateway_first_lun_id',
+               default=v6000_lunid.DEFAULT_FIRST_ID,
+               help='Lowest lun ID to export volumes and snapshots with'),
+    cfg.IntOpt('gateway_last_lun_id',
+               default=v6000_lunid.DEFAULT_LAST_ID,
+               help='Highest lun ID to export volumes and snapshots with'),
+]
 
 CONF = cfg.CONF
 CONF.register_opts(violin_opts)
@@ -118,6 +263,23 @@ class V6000CommonDriver(san.SanDriver):
         self.config = kwargs.get('configuration', None)
         self.context = None
         self.lun_tracker = LunIdList(self.db)
+        self.master_cluster_id = None
+        self.gateway_workers = 0
+        self.query_cache_enabled = False
+        self.gateway_router = None
+        self.gateway_metrics = None
+        self.setup_timings = []
+        self.retry_policy = v6000_retry.RetryPolicy()
+        self.verify_timeout = 30.0
+        self.verify_stats = {'verified': 0, 'timeouts': 0, 'polls': 0,
+                             'events': 0, 'delay_total': 0.0,
+                             'delay_max': 0.0}
+        self.gateway_listeners = {}
+        self.export_batcher = None
+        self.delete_batcher = None
+        self.create_batcher = None
+        self.locks = OBJECT_LOCKS
+        self.config_saver = None
         if self.config:
             self.config.append_config_values(violin_opts)
 
@@ -133,42 +295,232 @@ class V6000CommonDriver(san.SanDriver):
             raise exception.InvalidInput(
                 reason=_('Gateway IP for mg-b is not set'))
 
-        self.vmem_vip = vxg.open(self.config.gateway_vip,
-                                 self.config.gateway_user,
-                                 self.config.gateway_password,
-                                 keepalive=True)
-        self.vmem_mga = vxg.open(self.config.gateway_mga,
-                                 self.config.gateway_user,
-                                 self.config.gateway_password,
-                                 keepalive=True)
-        self.vmem_mgb = vxg.open(self.config.gateway_mgb,
-                                 self.config.gateway_user,
-                                 self.config.gateway_password,
-                                 keepalive=True)
+        self.gateway_workers = self.config.gateway_workers
+        self.verify_timeout = self.config.gateway_verify_timeout
+
+        try:
+            self.retry_policy = v6000_retry.RetryPolicy(
+                v6000_retry.parse(self.config.gateway_retry_policy))
+        except ValueError as e:
+            raise exception.InvalidInput(reason=unicode(e))
+
+        try:
+            self.lun_tracker = LunIdList(self.db,
+                                         self.config.gateway_first_lun_id,
+                                         self.config.gateway_last_lun_id)
+        except ValueError as e:
+            raise exception.InvalidInput(reason=unicode(e))
+
+        if self.config.gateway_export_batch_window > 0:
+            try:
+                self.export_batcher = v6000_batch.Batcher(
+                    self._export_luns,
+                    self.config.gateway_export_batch_window,
+                    self.config.gateway_export_batch_size)
+            except ValueError as e:
+                raise exception.InvalidInput(reason=unicode(e))
+
+        if self.config.gateway_delete_batch_window > 0:
+            try:
+                self.delete_batcher = v6000_batch.Batcher(
+                    self._delete_luns,
+                    self.config.gateway_delete_batch_window,
+                    self.config.gateway_delete_batch_size)
+            except ValueError as e:
+                raise exception.InvalidInput(reason=unicode(e))
+
+        if self.config.gateway_create_batch_window > 0:
+            try:
+                self.create_batcher = v6000_batch.Batcher(
+                    self._create_luns,
+                    self.config.gateway_create_batch_window,
+                    self.config.gateway_create_batch_size)
+            except ValueError as e:
+                raise exception.InvalidInput(reason=unicode(e))
+
+        if self.config.gateway_config_save_interval > 0:
+            try:
+                self.config_saver = v6000_save.ConfigSaver(
+                    lambda: self.vmem_vip.basic.save_config(),
+                    self.config.gateway_config_save_interval,
+                    self.config.gateway_config_save_max_pending,
+                    on_error=self._config_save_failed)
+            except ValueError as e:
+                raise exception.InvalidInput(reason=unicode(e))
+
+        # Save pending config changes, stop the gateway probe and write
+        # the last gateway metrics on exit
+        atexit.register(self._shutdown)
+
+        tracer = None
+        if self.config.gateway_trace:
+            tracer = vxg.Tracer(
+                LOG.debug,
+                sample_rate=self.config.gateway_trace_sample_rate)
+
+        discovery = None
+        if self.config.gateway_discovery_cache:
+            discovery = vxg.DiscoveryCache(
+                self.config.gateway_discovery_cache,
+                self.config.gateway_discovery_cache_ttl)
+
+        if self.config.gateway_metrics_file:
+            self.gateway_metrics = vxg.Metrics()
+            self.gateway_metrics.start(self.config.gateway_metrics_file,
+                                       self.config.gateway_metrics_interval)
+
+        def open_gateway(host):
+            return vxg.open(host,
+                            self.config.gateway_user,
+                            self.config.gateway_password,
+                            keepalive=True,
+                            workers=self.gateway_workers,
+                            shared=self.config.gateway_share_sessions,
+                            tracer=tracer,
+                            metrics=self.gateway_metrics,
+                            discovery=discovery)
+
+        # Log into the VIP and both mgs at once: each open() probes the
+        # host, logs in and reads its version.
+        #
+        phase_start = time.time()
+        self.vmem_vip, self.vmem_mga, self.vmem_mgb = self._run_concurrently(
+            lambda: open_gateway(self.config.gateway_vip),
+            lambda: open_gateway(self.config.gateway_mga),
+            lambda: open_gateway(self.config.gateway_mgb))
         self.context = context
+        self.setup_timings = [('connect', time.time() - phase_start)]
+
+        if self.config.gateway_route_reads:
+            self.gateway_router = vxg.GatewayRouter(
+                [('vip', self.vmem_vip.basic),
+                 ('mga', self.vmem_mga.basic),
+                 ('mgb', self.vmem_mgb.basic)])
+            self.gateway_router.start(self.config.gateway_probe_interval)
+
+        vip = self.vmem_vip.basic
 
+        # Config subtrees such as igroups and exports are re-read far more
+        # often than they change, so cache queries against the VIP.  Most
+        # changes are made through the VIP and clear the cache directly,
+        # the db revision of the next uncached query catches the rest.
+        #
+        # A shared session may already have its cache from another backend.
+        #
+        if self.config.gateway_query_cache_size:
+            if vip.query_cache is None:
+                vip.enable_query_cache(self.config.gateway_query_cache_size,
+                                       self.config.gateway_query_cache_ttl)
+            self.query_cache_enabled = True
+
+        # Only the lun inventory needs the container, so the protocol
+        # driver's own setup queries run alongside it.
+        #
+        tasks = [self._setup_inventory] + self._get_setup_tasks()
+        if self.config.gateway_events:
+            tasks.append(self._setup_events)
+
+        phase_start = time.time()
+        self._run_concurrently(*tasks)
+        self.setup_timings.append(('inventory', time.time() - phase_start))
+
+        LOG.info(_("Backend %(backend)s set up in %(total).2fs (%(phases)s)"),
+                 {'backend': self.config.volume_backend_name,
+                  'total': sum(x[1] for x in self.setup_timings),
+                  'phases': ', '.join('%s %.2fs' % x
+                                      for x in self.setup_timings)})
+
+    def _setup_inventory(self):
+        """Finds the container and tracks the luns and snapshots in it."""
         vip = self.vmem_vip.basic
 
         ret_dict = vip.get_node_values("/vshare/state/local/container/*")
         if ret_dict:
             self.container = ret_dict.items()[0][1]
 
-        ret_dict = vip.get_node_values(
-            "/vshare/state/local/container/%s/lun/*"
-            % self.container)
-        if ret_dict:
-            self.lun_tracker.update_from_volume_ids(ret_dict.values())
-
-        ret_dict = vip.get_node_values(
-            "/vshare/state/snapshot/container/%s/lun/*"
-            % self.container)
-        if ret_dict:
-            for vol_id in ret_dict.values():
-                snaps = vip.get_node_values(
-                    "/vshare/state/snapshot/container/%s/lun/%s/snap/*"
-                    % (self.container, vol_id))
+        # Fetch the lun and snapshot lists together, then the snapshots
+        # of every lun in a second request, rather than a query per lun.
+        #
+        luns, snap_luns = vip.get_node_values_multi(
+            ["/vshare/state/local/container/%s/lun/*" % self.container,
+             "/vshare/state/snapshot/container/%s/lun/*" % self.container])
+        if luns:
+            self.lun_tracker.update_from_volume_ids(luns.values())
+
+        if snap_luns:
+            bns = ["/vshare/state/snapshot/container/%s/lun/%s/snap/*"
+                   % (self.container, vol_id)
+                   for vol_id in snap_luns.values()]
+            for snaps in vip.get_node_values_multi(bns):
                 self.lun_tracker.update_from_snapshot_ids(snaps.values())
 
+    def _setup_events(self):
+        """Subscribes to change events from the VIP and both mgs."""
+        conns = [self.vmem_vip, self.vmem_mga, self.vmem_mgb]
+        listeners = self._run_concurrently(
+            lambda: self.vmem_vip.basic.event_listener(),
+            lambda: self.vmem_mga.basic.event_listener(),
+            lambda: self.vmem_mgb.basic.event_listener())
+
+        for conn, listener in zip(conns, listeners):
+            if listener.active:
+                self.gateway_listeners[conn] = listener
+            else:
+                LOG.info(_("No change events from %s, polling instead"),
+                         conn.basic.host)
+
+    def _get_setup_tasks(self):
+        """Returns the setup work of a protocol driver, as a list of
+        functions taking no arguments.
+
+        do_setup() runs them concurrently with each other and with the
+        lun inventory, once the gateway sessions are open, so they must
+        not rely on self.container.
+        """
+        return []
+
+    def _run_concurrently(self, *calls):
+        """Runs each of calls (functions taking no arguments) in its own
+        green thread.
+
+        Returns:
+            The results of the calls, in order.  If any raised, the first
+            such exception is re-raised once all of them have finished.
+        """
+        pool = greenpool.GreenPool()
+        threads = [pool.spawn(x) for x in calls]
+        pool.waitall()
+        return [x.wait() for x in threads]
+
+    def _save_config(self):
+        """Saves the array configuration after an export change.
+
+        With a config saver, the change is only marked, and saved along
+        with others made around the same time.
+        """
+        if self.config_saver:
+            self.config_saver.mark_dirty()
+        else:
+            self.vmem_vip.basic.save_config()
+
+    def _shutdown(self):
+        """Saves pending export changes, stops the background gateway
+        probe and writes the gateway metrics one last time, as the
+        process exits.
+        """
+        if self.config_saver:
+            try:
+                self.config_saver.close()
+            except Exception:
+                LOG.exception(_("Config save at exit failed!"))
+        if self.gateway_router:
+            self.gateway_router.close()
+        if self.gateway_metrics:
+            self.gateway_metrics.close()
+
+    def _config_save_failed(self, error):
+        LOG.warn(_("Background config save failed, will retry: %s"), error)
+
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met."""
         vip = self.vmem_vip.basic
@@ -259,23 +611,121 @@ class V6000CommonDriver(san.SanDriver):
             LOG.exception(_("LUN extend failed!"))
             raise
 
-    @utils.synchronized('vmem-lun')
     def _create_lun(self, volume):
         """Creates a new lun.
 
         The equivalent CLI command is "lun create container
         <container_name> name <lun_name> size <gb>"
 
+        Luns of the same size and type requested at about the same time
+        are created together if gateway_create_batch_window is set (see
+        _create_luns()).
+
         Arguments:
             volume -- volume object provided by the Manager
         """
         lun_type = '0'
+        if self.config.use_thin_luns:
+            lun_type = '1'
+
+        if self.create_batcher is None:
+            self._create_luns((volume['size'], lun_type), [volume])
+        else:
+            self.create_batcher.submit((volume['size'], lun_type),
+                                       volume).result()
+
+    @v6000_locks.synchronized(v6000_locks.batch_volume_keys)
+    def _create_luns(self, key, volumes):
+        """Creates luns of the same size and type.
+
+        A single lun is created under its volume's name.  Several are
+        created in one action, using its quantity and startnum fields to
+        number them under a temporary name prefix, and are then renamed
+        to their volumes' names.  If that action fails with a backend
+        error, each lun is created on its own instead.
+
+        Arguments:
+            key     -- (size, lun_type) tuple of the luns
+            volumes -- list of volume objects provided by the Manager
+
+        Returns:
+            A list of None for each created volume, or of the exception
+            its creation failed with, in the order of volumes.  The
+            exception of a single lun creation is raised instead.
+        """
         v = self.vmem_vip
+        size, lun_type = key
 
-        LOG.info(_("Creating lun %(name)s, %(size)s GB") % volume)
+        if len(volumes) == 1:
+            self._create_one_lun(volumes[0], lun_type)
+            return [None]
 
-        if self.config.use_thin_luns:
-            lun_type = '1'
+        prefix = 'cinder-bulk-%s-' % uuid.uuid4().hex[:8]
+
+        LOG.info(_("Creating %(count)d luns of %(size)s GB together as "
+                   "%(prefix)s*") %
+                 {'count': len(volumes), 'size': size, 'prefix': prefix})
+
+        try:
+            self._send_cmd(v.lun.create_lun,
+                           'LUN create: success!',
+                           self.container, prefix,
+                           size, len(volumes), '0', lun_type, 'w',
+                           1, 512, False, False, None)
+
+        except (ViolinBackendErr, ViolinBackendErrExists):
+            LOG.warn(_("Bulk lun create failed, creating each lun on its "
+                       "own"))
+            self._delete_bulk_luns(prefix)
+            results = []
+            for volume in volumes:
+                try:
+                    self._create_one_lun(volume, lun_type)
+                except Exception as e:
+                    results.append(e)
+                else:
+                    results.append(None)
+            return results
+
+        created = self._find_bulk_luns(prefix)
+
+        results = []
+        names = created[:len(volumes)]
+        names += [None] * (len(volumes) - len(names))
+        unused = created[len(volumes):]
+        for volume, name in zip(volumes, names):
+            if name is None:
+                results.append(ViolinBackendErr(
+                    message=_("Bulk lun create made too few luns")))
+                continue
+            try:
+                self._send_cmd(v.lun.rename_lun, '',
+                               self.container, name, volume['id'])
+            except ViolinBackendErrExists:
+                LOG.info(_("Lun %s already exists, continuing"),
+                         volume['id'])
+                unused.append(name)
+                results.append(None)
+            except Exception as e:
+                LOG.warn(_("Renaming lun %(name)s to %(vol_id)s failed: "
+                           "%(err)s") %
+                         {'name': name, 'vol_id': volume['id'], 'err': e})
+                unused.append(name)
+                results.append(e)
+            else:
+                results.append(None)
+
+        # Luns that were not renamed are of no use to anyone
+        if unused:
+            self._delete_bulk_luns(prefix, unused)
+
+        return results
+
+    def _create_one_lun(self, volume, lun_type):
+        """Creates a single lun under its volume's name."""
+        v = self.vmem_vip
+
+        LOG.info(_("Creating lun %(name)s, %(size)s GB") % volume)
 
         # using the defaults for fields: quantity, nozero,
         # readonly, startnum, blksize, naca, alua, preferredport
@@ -294,16 +744,118 @@ class V6000CommonDriver(san.SanDriver):
             LOG.warn(_("Lun create failed!"))
             raise
 
-    @utils.synchronized('vmem-lun')
+    def _find_bulk_luns(self, prefix):
+        """Lists the luns a bulk create made under a name prefix.
+
+        Returns:
+            The names of the luns, in the order they are numbered in.
+        """
+        vip = self.vmem_vip.basic
+        resp = vip.get_node_values("/vshare/state/local/container/%s/lun/*"
+                                   % self.container)
+
+        # The names only differ in their number, so shorter names sort first
+        return sorted([x for x in resp.values() if x.startswith(prefix)],
+                      key=lambda x: (len(x), x))
+
+    def _delete_bulk_luns(self, prefix, names=None):
+        """Deletes luns left behind by a bulk create, logging rather than
+        raising failures.
+
+        Arguments:
+            prefix -- name prefix the luns were created under
+            names  -- names of the luns (default: all under prefix)
+        """
+        v = self.vmem_vip
+        try:
+            if names is None:
+                names = self._find_bulk_luns(prefix)
+            if names:
+                self._send_cmd(v.lun.bulk_delete_luns,
+                               ['lun deletion started', ''],
+                               self.container, names)
+        except Exception as e:
+            LOG.warn(_("Failed to delete luns %(prefix)s*: %(err)s") %
+                     {'prefix': prefix, 'err': e})
+
     def _delete_lun(self, volume):
         """Deletes a lun.
 
         The equivalent CLI command is "no lun create container
         <container_name> name <lun_name>"
 
+        Deletions made at about the same time are sent together if
+        gateway_delete_batch_window is set (see _delete_luns()).
+
         Arguments:
             volume -- volume object provided by the Manager
         """
+        if self.delete_batcher is None:
+            self._delete_luns(self.container, [volume])
+        else:
+            self.delete_batcher.submit(self.container, volume).result()
+
+    @v6000_locks.synchronized(v6000_locks.batch_volume_keys)
+    def _delete_luns(self, container, volumes):
+        """Deletes luns in a single bulk delete action.
+
+        If the action fails with a backend error, such as one of the luns
+        not being found or having snapshots, each lun is deleted on its
+        own instead, to find out which.  The lun ids of the deleted luns
+        are then freed together.
+
+        Arguments:
+            container -- container of the luns (the batch key)
+            volumes   -- list of volume objects provided by the Manager
+
+        Returns:
+            A list of None for each deleted volume, or of the exception
+            its deletion failed with, in the order of volumes.  The
+            exception of a single volume deletion is raised instead.
+        """
+        v = self.vmem_vip
+        success_msgs = ['lun deletion started', '']
+
+        if len(volumes) == 1:
+            self._delete_one_lun(volumes[0])
+            self.lun_tracker.free_lun_id_for_volume(volumes[0])
+            return [None]
+
+        names = [x['id'] for x in volumes]
+
+        LOG.info(_("Deleting %(count)d luns together: %(names)s") %
+                 {'count': len(names), 'names': ', '.join(names)})
+
+        try:
+            self._send_cmd(v.lun.bulk_delete_luns,
+                           success_msgs,
+                           container, names)
+
+        except (ViolinBackendErr, ViolinBackendErrNotFound,
+                ViolinBackendErrExists):
+            LOG.warn(_("Bulk lun delete failed, deleting each lun on its "
+                       "own"))
+            results = []
+            deleted = []
+            for volume in volumes:
+                try:
+                    self._delete_one_lun(volume)
+                except Exception as e:
+                    results.append(e)
+                else:
+                    results.append(None)
+                    deleted.append(volume)
+            self.lun_tracker.free_lun_ids_for_volumes(deleted)
+            return results
+
+        self.lun_tracker.free_lun_ids_for_volumes(volumes)
+        return [None] * len(volumes)
+
+    def _delete_one_lun(self, volume):
+        """Deletes a single lun, without freeing its lun id.
+
+        Raises VolumeIsBusy if the lun has snapshots.
+        """
         v = self.vmem_vip
         success_msgs = ['lun deletion started', '']
 
@@ -326,9 +878,7 @@ class V6000CommonDriver(san.SanDriver):
             LOG.exception(_("Lun delete failed!"))
             raise
 
-        self.lun_tracker.free_lun_id_for_volume(volume)
-
-    @utils.synchronized('vmem-snap')
+    @v6000_locks.synchronized(v6000_locks.snapshot_keys)
     def _create_lun_snapshot(self, snapshot):
         """Creates a new snapshot for a lun.
 
@@ -356,7 +906,7 @@ class V6000CommonDriver(san.SanDriver):
             LOG.exception(_("LUN snapshot create failed!"))
             raise
 
-    @utils.synchronized('vmem-snap')
+    @v6000_locks.synchronized(v6000_locks.snapshot_keys)
     def _delete_lun_snapshot(self, snapshot):
         """Deletes an existing snapshot for a lun.
 
@@ -410,6 +960,7 @@ class V6000CommonDriver(san.SanDriver):
         resp = {}
         start = time.time()
         done = False
+        attempt = 0
 
         if isinstance(success_msgs, basestring):
             success_msgs = [success_msgs]
@@ -418,6 +969,9 @@ class V6000CommonDriver(san.SanDriver):
             if time.time() - start >= self.request_timeout:
                 raise RequestRetryTimeout(timeout=self.request_timeout)
 
+            if attempt:
+                self._retry_backoff(resp, attempt, start)
+
             resp = request_func(*args)
 
             if not resp['message']:
@@ -431,6 +985,7 @@ class V6000CommonDriver(san.SanDriver):
                     break
 
             self._fatal_error_code(resp)
+            attempt += 1
 
         return resp
 
@@ -468,6 +1023,7 @@ class V6000CommonDriver(san.SanDriver):
         start = time.time()
         request_needed = True
         verify_needed = True
+        attempt = 0
 
         if isinstance(request_success_msgs, basestring):
             request_success_msgs = [request_success_msgs]
@@ -477,17 +1033,21 @@ class V6000CommonDriver(san.SanDriver):
                 raise RequestRetryTimeout(timeout=self.request_timeout)
 
             if request_needed:
+                if attempt:
+                    self._retry_backoff(resp, attempt, start)
+
                 resp = request_func(*rargs)
                 if not resp['message']:
                     # XG requests will return None for a message if no message
                     # string is passed int the raw response
                     resp['message'] = ''
-                    for msg in request_success_msgs:
-                        if not resp['code'] and msg in resp['message']:
-                            # XG request func was completed
-                            request_needed = False
-                            break
+                for msg in request_success_msgs:
+                    if not resp['code'] and msg in resp['message']:
+                        # XG request func was completed
+                        request_needed = False
+                        break
                 self._fatal_error_code(resp)
+                attempt += 1
 
             elif verify_needed:
                 success = verify_func(*vargs)
@@ -500,6 +1060,25 @@ class V6000CommonDriver(san.SanDriver):
 
         return resp
 
+    def _retry_backoff(self, resp, attempt, start):
+        """Waits before resending a request, as long as the retry policy
+        says to for the response it got, but no later than the request
+        timeout.
+
+        Arguments:
+            resp    -- response dict from the last attempt
+            attempt -- number of the retry about to be made, from 1
+            start   -- time the first attempt was made
+        """
+        delay = self.retry_policy.backoff(resp['code'], attempt)
+        remaining = self.request_timeout - (time.time() - start)
+        if min(delay, remaining) <= 0:
+            return
+
+        LOG.debug(_("Retrying after code %(code)s in %(delay).2fs"),
+                  {'code': resp['code'], 'delay': delay})
+        time.sleep(min(delay, remaining))
+
     def _get_igroup(self, volume, connector):
         """Gets the igroup that should be used when configuring a volume.
 
@@ -524,13 +1103,242 @@ class V6000CommonDriver(san.SanDriver):
         # if it doesn't exist, create it!
         #
         bn = "/vshare/config/igroup/%s" % igroup_name
-        resp = v.basic.get_node_values(bn)
+        with self.locks.held(v6000_locks.igroup_keys(igroup_name)):
+            resp = v.basic.get_node_values(bn)
 
-        if not len(resp):
-            v.igroup.create_igroup(igroup_name)
+            if not len(resp):
+                v.igroup.create_igroup(igroup_name)
 
         return igroup_name
 
+    def _export_lun_to(self, volume, ports, export_to):
+        """Exports a volume, together with any other exports to the same
+        ports and initiators made at about the same time if
+        gateway_export_batch_window is set (see _export_luns()).
+
+        Arguments:
+            volume    -- volume object provided by the Manager
+            ports     -- ports (or iSCSI target) to export the volume on
+            export_to -- igroup or initiators to export the volume to
+
+        Returns:
+            lun_id -- the LUN ID assigned by the backend
+        """
+        if self.export_batcher is None:
+            return self._export_luns((ports, export_to), [volume])[0]
+
+        key = tuple(tuple(x) if isinstance(x, list) else x
+                    for x in (ports, export_to))
+        return self.export_batcher.submit(key, volume).result()
+
+    @v6000_locks.synchronized(v6000_locks.batch_volume_keys)
+    def _export_luns(self, key, volumes):
+        """Exports volumes to the same ports and initiators.
+
+        Each volume is exported on the lun id the driver assigned it.
+        The export action only takes one lun id for all the luns it
+        names, so each lun still gets its own action, but the luns are
+        only verified once all of them are exported: the gateways are
+        polled once for the whole batch rather than once per lun.  If
+        they do not all show up, each lun sent is exported and verified
+        on its own instead, so that one bad volume does not fail the
+        others.
+
+        Arguments:
+            key     -- (ports, export_to) tuple, see _export_lun_to()
+            volumes -- list of volume objects provided by the Manager
+
+        Returns:
+            A list of the lun id of each volume, or of the exception its
+            export failed with, in the order of volumes.  The exception of
+            a single volume export is raised instead.
+        """
+        v = self.vmem_vip
+        ports, export_to = [list(x) if isinstance(x, tuple) else x
+                            for x in key]
+
+        if len(volumes) == 1:
+            return [self._export_one_lun(volumes[0], ports, export_to)]
+
+        LOG.info(_("Exporting %(count)d luns together: %(names)s") %
+                 {'count': len(volumes),
+                  'names': ', '.join(x['id'] for x in volumes)})
+
+        results = []
+        sent = []
+        for i, volume in enumerate(volumes):
+            try:
+                lun_id = self.lun_tracker.get_lun_id_for_volume(volume)
+                self._send_cmd(v.lun.export_lun, '', self.container,
+                               volume['id'], ports, export_to, lun_id)
+            except Exception as e:
+                results.append(e)
+                continue
+            results.append(lun_id)
+            sent.append(i)
+
+        if sent and not self._wait_for_exportstates(
+                [volumes[i]['id'] for i in sent], True):
+            LOG.warn(_("Batched lun exports were not verified, exporting "
+                       "each lun on its own"))
+            for i in sent:
+                try:
+                    results[i] = self._export_one_lun(volumes[i], ports,
+                                                      export_to)
+                except Exception as e:
+                    results[i] = e
+
+        for volume, result in zip(volumes, results):
+            if not isinstance(result, Exception):
+                LOG.info(_("Exported lun %(vol_id)s on lun_id %(lun_id)s") %
+                         {'vol_id': volume['id'], 'lun_id': result})
+        return results
+
+    def _export_one_lun(self, volume, ports, export_to):
+        """Exports a volume on the lun id the driver assigned it.
+
+        Returns:
+            lun_id -- the LUN ID assigned by the backend
+        """
+        v = self.vmem_vip
+        lun_id = self.lun_tracker.get_lun_id_for_volume(volume)
+
+        LOG.info(_("Exporting lun %(vol_id)s on lun_id %(lun_id)s") %
+                 {'vol_id': volume['id'], 'lun_id': lun_id})
+
+        self._send_cmd_and_verify(v.lun.export_lun,
+                                  self._wait_for_exportstate,
+                                  '',
+                                  [self.container, volume['id'],
+                                   ports, export_to, lun_id],
+                                  [volume['id'], True])
+        return lun_id
+
+    def _fan_out(self, calls):
+        """Runs independent calls against the gateways at the same time.
+
+        Each call is run on its gateway connection's worker threads, so
+        for example mg-a and mg-b can be configured at once rather than
+        one after the other.  If gateway_workers is 0 the calls are made
+        sequentially instead.
+
+        Arguments:
+            calls -- list of (conn, func, args) tuples, where conn is the
+                     gateway connection func(*args) talks to
+
+        Returns:
+            results -- list of each call's return value, in order
+
+        Raises the first exception raised by any of the calls, once all
+        of them have finished.
+        """
+        if not self.gateway_workers:
+            return [func(*args) for conn, func, args in calls]
+
+        pending = [conn.basic.submit(func, *args)
+                   for conn, func, args in calls]
+
+        results = []
+        error = None
+        for f in pending:
+            try:
+                results.append(f.result())
+            except Exception as e:
+                LOG.debug(_("Gateway call failed: %s"), e)
+                results.append(None)
+                if error is None:
+                    error = e
+
+        if error is not None:
+            raise error
+
+        return results
+
+    def _get_container_space(self):
+        """Gets the total and free space of the container in bytes.
+
+        The node names depend on the cluster master id, which is
+        remembered from the previous call.  Once known, the master id
+        is re-read alongside the space nodes in a single request, and
+        the space is only queried again if the master has changed.
+
+        Returns:
+            (total_bytes, free_bytes) -- either may be None if the
+                                         backend did not report it
+        """
+        v = self._get_reader()
+        bn0 = '/cluster/state/master_id'
+        master_id = self.master_cluster_id
+
+        if master_id is None:
+            master_id = v.get_node_values(bn0).values()[0]
+            bns = self._container_space_nodes(master_id)
+            resp = v.get_node_values(bns)
+        else:
+            bns = self._container_space_nodes(master_id)
+            id_resp, resp = v.get_node_values_multi([bn0, bns])
+            if bn0 in id_resp and id_resp[bn0] != master_id:
+                master_id = id_resp[bn0]
+                bns = self._container_space_nodes(master_id)
+                resp = v.get_node_values(bns)
+
+        self.master_cluster_id = master_id
+
+        return (resp.get(bns[0]), resp.get(bns[1]))
+
+    def _get_reader(self):
+        """Returns where to send queries that tolerate stale data.
+
+        This is the gateway router if gateway_route_reads is set, which
+        may answer from mg-a or mg-b before they have caught up with a
+        change made through the VIP, and the VIP otherwise.  Anything
+        that must see the driver's own changes should query the VIP.
+        """
+        return self.gateway_router or self.vmem_vip.basic
+
+    def _container_space_nodes(self, master_id):
+        """Returns the total_bytes and free_bytes node names."""
+        bn = "/vshare/state/global/%s/container/%s" \
+            % (master_id, self.container)
+        return [bn + "/total_bytes", bn + "/free_bytes"]
+
+    def _log_gateway_stats(self):
+        """Logs the counters kept by the gateway caching, routing, retry,
+        batching, config save and locking code, for the periodic stats
+        update.
+        """
+        if self.query_cache_enabled:
+            LOG.debug(_("gateway query cache: %s"),
+                      self.vmem_vip.basic.cache_stats())
+
+        if self.gateway_router:
+            LOG.debug(_("gateway health: %s"), self.gateway_router.stats())
+
+        retries = self.retry_policy.stats()
+        if retries:
+            LOG.debug(_("gateway retries by return code: %s"), retries)
+
+        if self.verify_stats['polls']:
+            LOG.debug(_("gateway config propagation: %s"), self.verify_stats)
+
+        if self.export_batcher:
+            LOG.debug(_("gateway export batches: %s"),
+                      self.export_batcher.stats())
+
+        if self.delete_batcher:
+            LOG.debug(_("gateway delete batches: %s"),
+                      self.delete_batcher.stats())
+
+        if self.create_batcher:
+            LOG.debug(_("gateway create batches: %s"),
+                      self.create_batcher.stats())
+
+        if self.config_saver:
+            LOG.debug(_("gateway config saves: %s"),
+                      self.config_saver.stats())
+
+        LOG.debug(_("object locks: %s"), self.locks.stats())
+
     def _get_volume_type_extra_spec(self, volume, spec_key):
         """Parse data stored in a volume_type's extra_specs table.
 
@@ -577,8 +1385,8 @@ class V6000CommonDriver(san.SanDriver):
         created or deleted.
 
         This function will try to verify the creation or removal of
-        export state on both gateway nodes of the array every 5
-        seconds for up to 30 seconds.
+        export state on both gateway nodes of the array, for up to
+        gateway_verify_timeout seconds (see _wait_for_gateways()).
 
         Arguments:
             volume_name -- name of volume to be polled
@@ -588,29 +1396,132 @@ class V6000CommonDriver(san.SanDriver):
             True if the export state was correctly added or removed
             (depending on 'state' param)
         """
-        status = [False, False]
-        mg_conns = [self.vmem_mga.basic, self.vmem_mgb.basic]
-        success = False
-
         bn = "/vshare/config/export/container/%s/lun/%s" \
             % (self.container, volume_name)
 
-        for i in xrange(6):
-            for node_id in xrange(2):
-                if not status[node_id]:
-                    resp = mg_conns[node_id].get_node_values(bn)
-                    if state and len(resp.keys()):
-                        status[node_id] = True
-                    elif (not state) and (not len(resp.keys())):
-                        status[node_id] = True
-
-            if status[0] and status[1]:
-                success = True
-                break
-            else:
-                time.sleep(5)
+        return self._wait_for_gateways(
+            bn, lambda resp: bool(len(resp.keys())) == state)
+
+    def _wait_for_exportstates(self, volume_names, state=False):
+        """Polls backend to verify the export configuration of several
+        volumes at once, as _wait_for_exportstate() does for one.
 
-        return success
+        Arguments:
+            volume_names -- names of volumes to be polled
+            state        -- True to poll for existence, False for lack of
+
+        Returns:
+            True if the export state of every volume was correctly added
+            or removed (depending on 'state' param)
+        """
+        prefix = "/vshare/config/export/container/%s/lun" % self.container
+        bns = ["%s/%s" % (prefix, x) for x in volume_names]
+
+        def is_done(resp):
+            exported = set(x[len(prefix) + 1:].split('/', 1)[0]
+                           for x in resp.keys())
+            return all((x in exported) == state for x in volume_names)
+
+        return self._wait_for_gateways(bns, is_done, prefix)
+
+    def _wait_for_gateways(self, bn, is_done, watch_bn=None):
+        """Polls mg-a and mg-b until a config change shows up on both.
+
+        Both gateways are queried at the same time (see _fan_out()), and
+        a gateway that is done is not queried again.  Changes usually
+        take well under a second to propagate, so polling starts after
+        VERIFY_MIN_INTERVAL seconds and backs off to VERIFY_MAX_INTERVAL,
+        until self.verify_timeout seconds have passed.
+
+        If both gateways send change events (see gateway_events), they
+        are queried again as soon as either reports a change to bn, and
+        otherwise only every VERIFY_EVENT_INTERVAL seconds.
+
+        The time each change took to show up on both gateways is kept
+        in self.verify_stats.
+
+        Arguments:
+            bn       -- node name (or list of them) to query
+            is_done  -- function of a query response, returning True once
+                        it shows the change
+            watch_bn -- node name to watch for changes to (default: bn,
+                        which must then be a single name)
+
+        Returns:
+            True if the change showed up on both gateways in time
+        """
+        mg_conns = [self.vmem_mga, self.vmem_mgb]
+        pending = [0, 1]
+        interval = VERIFY_MIN_INTERVAL
+        start = time.time()
+        watch_bn = watch_bn or bn
+
+        # Watch before the first poll, so a change in between is not missed
+        waker, watched = self._watch(mg_conns, watch_bn)
+        try:
+            while True:
+                resps = self._fan_out(
+                    [(mg_conns[node_id],
+                      mg_conns[node_id].basic.get_node_values,
+                      [bn]) for node_id in pending])
+                self.verify_stats['polls'] += 1
+                pending = [node_id for node_id, resp in zip(pending, resps)
+                           if not is_done(resp)]
+
+                elapsed = time.time() - start
+                if not pending:
+                    self.verify_stats['verified'] += 1
+                    self.verify_stats['delay_total'] += elapsed
+                    self.verify_stats['delay_max'] = max(
+                        self.verify_stats['delay_max'], elapsed)
+                    LOG.debug(_("%(bn)s verified on both gateways in "
+                                "%(elapsed).3fs"),
+                              {'bn': watch_bn, 'elapsed': elapsed})
+                    return True
+
+                if elapsed >= self.verify_timeout:
+                    self.verify_stats['timeouts'] += 1
+                    LOG.debug(_("%(bn)s not verified after %(elapsed).1fs"),
+                              {'bn': watch_bn, 'elapsed': elapsed})
+                    return False
+
+                remaining = self.verify_timeout - elapsed
+                if waker is not None:
+                    waker.wait(min(VERIFY_EVENT_INTERVAL, remaining))
+                    if waker.is_set():
+                        self.verify_stats['events'] += 1
+                        waker.clear()
+                else:
+                    time.sleep(min(interval, remaining))
+                    interval = min(interval * 2, VERIFY_MAX_INTERVAL)
+        finally:
+            self._unwatch(watched, watch_bn, waker)
+
+    def _watch(self, conns, bn):
+        """Watches for changes to bn on each of the gateways.
+
+        Arguments:
+            conns -- gateway connections to watch
+            bn    -- node name to watch (along with the nodes under it)
+
+        Returns:
+            (waker, watched) -- waker is a threading.Event set when any
+            of the gateways reports a change, or None if not all of them
+            send change events.  Pass both to _unwatch() when done.
+        """
+        listeners = [self.gateway_listeners.get(conn) for conn in conns]
+        if not all(x is not None and x.active for x in listeners):
+            return (None, [])
+
+        waker = None
+        for listener in listeners:
+            waker = listener.watch(bn, waker)
+        return (waker, listeners)
+
+    def _unwatch(self, watched, bn, waker):
+        """Removes the watches set up by _watch()."""
+        for listener in watched:
+            listener.unwatch(bn, waker)
 
     def _is_supported_vmos_version(self, version_string):
         """Check that the version of VMOS running on the gateways is
@@ -624,63 +1535,28 @@ class V6000CommonDriver(san.SanDriver):
 
     def _fatal_error_code(self, response):
         """Check the error code in a XG response for a fatal error,
-        and returns an appropriate exception.  Error codes extracted
-        from vdmd_mgmt.c.
+        and returns an appropriate exception.  The fatal codes are those
+        of the retry policy (see v6000_retry.FATAL_CODES, extracted from
+        vdmd_mgmt.c, and gateway_retry_policy).
 
         Arguments:
             response -- a response dict result from an XG request
         """
-        # known non-fatal response codes
-        #
-        retry_codes = {1024: 'lun deletion in progress, try again later',
-                       14032: 'lc_err_lock_busy'}
+        code = response['code']
 
-        if response['code'] == 14000:
-            # lc_generic_error
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14002:
-            # lc_err_assertion_failed
+        if code == 1 and 'LUN ID conflict' in response['message']:
+            # lun id conflict while attempting to export
             raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14004:
+
+        if not self.retry_policy.is_fatal(code):
+            return
+        elif code == 14004:
             # lc_err_not_found
             raise ViolinBackendErrNotFound()
-        elif response['code'] == 14005:
+        elif code == 14005:
             # lc_err_exists
             raise ViolinBackendErrExists()
-        elif response['code'] == 14008:
-            # lc_err_unexpected_arg
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14014:
-            # lc_err_io_error
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14016:
-            # lc_err_io_closed
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14017:
-            # lc_err_io_timeout
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14021:
-            # lc_err_unexpected_case
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14025:
-            # lc_err_no_fs_space
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14035:
-            # lc_err_range
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14036:
-            # lc_err_invalid_param
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 14121:
-            # lc_err_cancelled_err
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 512:
-            # Not enough free space in container (vdmd bug)
-            raise ViolinBackendErr(message=response['message'])
-        elif response['code'] == 1 and 'LUN ID conflict' \
-                in response['message']:
-            # lun id conflict while attempting to export
-            raise ViolinBackendErr(message=response['message'])
+        raise ViolinBackendErr(message=response['message'])
 
 
 class LunIdList(object):
@@ -694,18 +1570,20 @@ class LunIdList(object):
     snapshot.  Only when the volume/snapshot is deleted entirely, the
     lun ID should be freed.
 
-    Lun IDs are montonically increasing up to a max value of 16k,
-    after which the selection will loop around to lun ID 1 and will
-    continue to increment until an available ID is found.
+    Lun IDs are montonically increasing up to the last ID of the range
+    (15999 by default), after which the selection will loop around to the
+    first one (1 by default) and will continue to increment until an
+    available ID is found.
+
+    Volumes are allocated and freed concurrently, so changes to the
+    allocated IDs are made under the object's lock.
     """
-    def __init__(self, db, *args, **kwargs):
-        self.max_lun_id = 16000
-        self.lun_id_list = [0] * self.max_lun_id
-        self.lun_id_list[0] = 1
-        self.prev_index = 1
-        self.free_index = 1
+    def __init__(self, db, first_id=v6000_lunid.DEFAULT_FIRST_ID,
+                 last_id=v6000_lunid.DEFAULT_LAST_ID):
+        self.lun_ids = v6000_lunid.LunIdAllocator(first_id, last_id)
         self.context = context.get_admin_context()
         self.db = db
+        self._lock = threading.RLock()
 
     def update_from_volume_ids(self, id_list=[]):
         """Walk a list of volumes collected that the array knows about and
@@ -727,9 +1605,8 @@ class LunIdList(object):
             else:
                 if metadata and 'lun_id' in metadata:
                     index = int(metadata['lun_id'])
-                    self.lun_id_list[index] = 1
+                    self._reserve_lun_id(index, item)
                     LOG.debug("Set lun_id=%d for volume_id=%s" % (index, item))
-                    self.update_free_index(index)
 
     def update_from_snapshot_ids(self, id_list=[]):
         """Walk a list of snapshots collected that the array knows about and
@@ -751,10 +1628,18 @@ class LunIdList(object):
             else:
                 if metadata and 'lun_id' in metadata:
                     index = int(metadata['lun_id'])
-                    self.lun_id_list[index] = 1
+                    self._reserve_lun_id(index, item)
                     LOG.debug("Set lun_id=%d for snapshot_id=%s" %
                               (index, item))
-                    self.update_free_index(index)
+
+    def _reserve_lun_id(self, lun_id, item):
+        """Marks a lun ID found in the metadata of a volume or snapshot
+        in use, skipping the IDs before it.
+        """
+        if not self.lun_ids.reserve(lun_id, skip=True):
+            LOG.warn(_("lun_id %(lun_id)d of %(item)s is outside the lun ID "
+                       "range, not tracking it"),
+                     {'lun_id': lun_id, 'item': item})
 
     def get_lun_id_for_volume(self, volume):
         """Allocate a free a lun ID to a volume and create a lun_id tag
@@ -812,6 +1697,27 @@ class LunIdList(object):
         if metadata and 'lun_id' in metadata:
             self.free_lun_id_str(metadata['lun_id'])
 
+    def free_lun_ids_for_volumes(self, volumes):
+        """Free the lun IDs of several volumes at once, as
+        free_lun_id_for_volume() does for one.
+
+        Arguments:
+            volumes -- list of volume objects with lun IDs to be free'd
+        """
+        lun_ids = []
+        for volume in volumes:
+            metadata = self.db.volume_metadata_get(self.context, volume['id'])
+            if metadata and 'lun_id' in metadata:
+                lun_ids.append(int(metadata['lun_id']))
+        if not lun_ids:
+            return
+        self._lock.acquire()
+        try:
+            for lun_id in lun_ids:
+                self.lun_ids.free(lun_id)
+        finally:
+            self._lock.release()
+
     def get_next_lun_id_str(self):
         """Mark the next available lun_id as allocated and return
         it to the caller.
@@ -819,9 +1725,13 @@ class LunIdList(object):
         Returns:
             next_id -- the lun ID that being allocated to the caller
         """
-        next_id = self.free_index
-        self.lun_id_list[next_id] = 1
-        self.update_free_index()
+        self._lock.acquire()
+        try:
+            next_id = self.lun_ids.allocate()
+        finally:
+            self._lock.release()
+        if next_id is None:
+            raise exception.Error("Cannot find free lun_id, giving up!")
         return str(next_id)
 
     def free_lun_id_str(self, value_str):
@@ -831,33 +1741,8 @@ class LunIdList(object):
             value_str -- lun ID to free (in string format)
         """
         value = int(value_str)
-        self.lun_id_list[value] = 0
-        self.update_free_index()
-
-    def update_free_index(self, index=None):
-        """Update the free index, monotonically increasing, and
-        looping back to 1 after the max lun ID value is hit.
-
-        Arguments:
-            index -- assume that all values below this number may be already
-                     allocated, so start searching at that value if it is
-                     higher than the free_index
-        """
-        i = 0
-        count = 0
-        max_size = len(self.lun_id_list)
-        if index and index > self.free_index:
-            i = index + 1
-        else:
-            i = self.free_index
-        # avoid possibility of indexError
-        if i >= max_size:
-            i = 1
-        while self.lun_id_list[i] == 1 and count < max_size:
-            count += 1
-            i += 1
-            if i >= max_size:
-                i = 1
-        self.free_index = i
-        if count == max_size:
-            raise exception.Error("Cannot find free lun_id, giving up!")
+        self._lock.acquire()
+        try:
+            self.lun_ids.free(value)
+        finally:
+            self._lock.release()
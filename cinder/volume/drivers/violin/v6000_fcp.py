@@ -46,8 +46,8 @@ Copy Volume to Image:           YES*
 from cinder.db.sqlalchemy import models
 from cinder import exception
 from cinder.openstack.common import log as logging
-from cinder import utils
 from cinder.volume.drivers.violin import v6000_common
+from cinder.volume.drivers.violin import v6000_locks
 
 LOG = logging.getLogger(__name__)
 
@@ -69,9 +69,11 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         LOG.info(_("Initialized driver %(name)s version: %(vers)s") %
                  {'name': self.__class__.__name__, 'vers': __version__})
 
-    def do_setup(self, context):
-        """Any initialization the driver does while starting."""
-        super(V6000FCDriver, self).do_setup(context)
+    def _get_setup_tasks(self):
+        """Returns the FC target lookup to run during do_setup()."""
+        return [self._setup_fc_targets]
+
+    def _setup_fc_targets(self):
         self.gateway_fc_wwns = self._get_active_fc_targets()
 
     def check_for_setup_error(self):
@@ -119,7 +121,7 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         else:
             lun_id = self._export_snapshot(volume, connector, igroup)
 
-        self.vmem_vip.basic.save_config()
+        self._save_config()
 
         properties = {}
         properties['target_discovered'] = True
@@ -136,7 +138,7 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         else:
             self._unexport_snapshot(volume)
 
-        self.vmem_vip.basic.save_config()
+        self._save_config()
 
     def get_volume_stats(self, refresh=False):
         """Get volume stats."""
@@ -144,13 +146,15 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
             self._update_stats()
         return self.stats
 
-    @utils.synchronized('vmem-export')
     def _export_lun(self, volume, connector=None, igroup=None):
         """Generates the export configuration for the given volume.
 
         The equivalent CLI command is "lun export container
         <container_name> name <lun_name>"
 
+        Exports to the same initiators may be made together, see
+        _export_lun_to().
+
         Arguments:
             volume -- volume object provided by the Manager
             connector -- connector object provided by the Manager
@@ -159,11 +163,7 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         Returns:
             lun_id -- the LUN ID assigned by the backend
         """
-        lun_id = ''
         export_to = ''
-        v = self.vmem_vip
-
-        lun_id = self.lun_tracker.get_lun_id_for_volume(volume)
 
         if igroup:
             export_to = igroup
@@ -173,16 +173,8 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         else:
             raise exception.Error(_("No initiators found, cannot proceed"))
 
-        LOG.info(_("Exporting lun %(vol_id)s on lun_id %(lun_id)s") %
-                 {'vol_id': volume['id'], 'lun_id': lun_id})
-
         try:
-            self._send_cmd_and_verify(v.lun.export_lun,
-                                      self._wait_for_exportstate,
-                                      '',
-                                      [self.container, volume['id'],
-                                       'all', export_to, lun_id],
-                                      [volume['id'], True])
+            lun_id = self._export_lun_to(volume, 'all', export_to)
 
         except Exception:
             LOG.exception(_("LUN export failed!"))
@@ -190,7 +182,7 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
 
         return lun_id
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.volume_keys)
     def _unexport_lun(self, volume):
         """Removes the export configuration for the given volume.
 
@@ -220,7 +212,7 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
             LOG.exception(_("LUN unexport failed!"))
             raise
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.snapshot_keys)
     def _export_snapshot(self, snapshot, connector=None, igroup=None):
         """Generates the export configuration for the given snapshot.
 
@@ -265,7 +257,7 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
 
         return lun_id
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.snapshot_keys)
     def _unexport_snapshot(self, snapshot):
         """Removes the export configuration for the given snapshot.
 
@@ -318,24 +310,16 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         data = {}
         total_gb = 'unknown'
         free_gb = 'unknown'
-        v = self.vmem_vip
 
-        master_cluster_id = self.vmem_vip.basic.get_node_values(
-            '/cluster/state/master_id').values()[0]
+        total_bytes, free_bytes = self._get_container_space()
 
-        bn1 = "/vshare/state/global/%s/container/%s/total_bytes" \
-            % (master_cluster_id, self.container)
-        bn2 = "/vshare/state/global/%s/container/%s/free_bytes" \
-            % (master_cluster_id, self.container)
-        resp = v.basic.get_node_values([bn1, bn2])
-
-        if bn1 in resp:
-            total_gb = resp[bn1] / 1024 / 1024 / 1024
+        if total_bytes is not None:
+            total_gb = total_bytes / 1024 / 1024 / 1024
         else:
             LOG.warn(_("Failed to receive update for total_gb stat!"))
 
-        if bn2 in resp:
-            free_gb = resp[bn2] / 1024 / 1024 / 1024
+        if free_bytes is not None:
+            free_gb = free_bytes / 1024 / 1024 / 1024
         else:
             LOG.warn(_("Failed to receive update for free_gb stat!"))
 
@@ -353,6 +337,8 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
             LOG.debug(_("stat update: %(name)s=%(data)s") %
                       {'name': i, 'data': data[i]})
 
+        self._log_gateway_stats()
+
         self.stats = data
 
     def _get_active_fc_targets(self):
@@ -364,15 +350,18 @@ class V6000FCDriver(v6000_common.V6000CommonDriver):
         Returns:
             active_gw_fcp_wwns -- list of WWNs
         """
-        v = self.vmem_vip.basic
+        v = self._get_reader()
         active_gw_fcp_wwns = []
 
         gateway_ids = v.get_node_values('/vshare/state/global/*').values()
 
-        for i in gateway_ids:
-            bn = "/vshare/state/global/%d/target/fc/**" % i
-            resp = v.get_node_values(bn)
+        # Query the targets of every gateway in one request
+        #
+        bns = ["/vshare/state/global/%d/target/fc/**" % i
+               for i in gateway_ids]
+        resps = v.get_node_values_multi(bns) if bns else []
 
+        for resp in resps:
             for node in resp:
                 if node.endswith('/wwn'):
                     active_gw_fcp_wwns.append(resp[node])
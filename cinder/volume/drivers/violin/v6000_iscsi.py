@@ -46,15 +46,14 @@ Copy Volume to Image:           YES*
 """
 
 import random
-import time
 
 from oslo.config import cfg
 
 from cinder.db.sqlalchemy import models
 from cinder import exception
 from cinder.openstack.common import log as logging
-from cinder import utils
 from cinder.volume.drivers.violin import v6000_common
+from cinder.volume.drivers.violin import v6000_locks
 
 LOG = logging.getLogger(__name__)
 
@@ -94,19 +93,25 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         LOG.info(_("Initialized driver %(name)s version: %(vers)s") %
                  {'name': self.__class__.__name__, 'vers': __version__})
 
-    def do_setup(self, context):
-        """Any initialization the driver does while starting."""
-        super(V6000ISCSIDriver, self).do_setup(context)
-        self.gateway_iscsi_ip_addresses_mga = self._get_active_iscsi_ips(
-            self.vmem_mga)
+    def _get_setup_tasks(self):
+        """Returns the iSCSI target lookups to run during do_setup()."""
+        return [self._setup_iscsi_targets]
+
+    def _setup_iscsi_targets(self):
+        """Finds the iSCSI IPs and hostname of both mgs."""
+        (self.gateway_iscsi_ip_addresses_mga,
+         self.gateway_iscsi_ip_addresses_mgb,
+         hostname_mga, hostname_mgb) = self._run_concurrently(
+            lambda: self._get_active_iscsi_ips(self.vmem_mga),
+            lambda: self._get_active_iscsi_ips(self.vmem_mgb),
+            lambda: self._get_hostname('mga'),
+            lambda: self._get_hostname('mgb'))
         for ip in self.gateway_iscsi_ip_addresses_mga:
-            self.array_info.append({"node": self._get_hostname('mga'),
+            self.array_info.append({"node": hostname_mga,
                                     "addr": ip,
                                     "conn": self.vmem_mga})
-        self.gateway_iscsi_ip_addresses_mgb = self._get_active_iscsi_ips(
-            self.vmem_mgb)
         for ip in self.gateway_iscsi_ip_addresses_mgb:
-            self.array_info.append({"node": self._get_hostname('mgb'),
+            self.array_info.append({"node": hostname_mgb,
                                     "addr": ip,
                                     "conn": self.vmem_mgb})
 
@@ -169,7 +174,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
 
         iqn = "%s%s:%s" % (self.config.gateway_iscsi_target_prefix,
                            tgt['node'], vol)
-        self.vmem_vip.basic.save_config()
+        self._save_config()
 
         properties = {}
         properties['target_discovered'] = False
@@ -190,7 +195,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         else:
             self._unexport_snapshot(volume)
         self._delete_iscsi_target(volume)
-        self.vmem_vip.basic.save_config()
+        self._save_config()
 
     def get_volume_stats(self, refresh=False):
         """Get volume stats."""
@@ -198,7 +203,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
             self._update_stats()
         return self.stats
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.target_keys)
     def _create_iscsi_target(self, volume):
         """Creates a new target for use in exporting a lun
 
@@ -230,18 +235,23 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
             LOG.exception(_("Failed to create iscsi target!"))
             raise
 
+        # Bind the target on both gateways at the same time
+        #
         try:
-            self._send_cmd(self.vmem_mga.iscsi.bind_ip_to_target, '',
-                           target_name, self.gateway_iscsi_ip_addresses_mga)
-            self._send_cmd(self.vmem_mgb.iscsi.bind_ip_to_target, '',
-                           target_name, self.gateway_iscsi_ip_addresses_mgb)
+            self._fan_out(
+                [(self.vmem_mga, self._send_cmd,
+                  [self.vmem_mga.iscsi.bind_ip_to_target, '',
+                   target_name, self.gateway_iscsi_ip_addresses_mga]),
+                 (self.vmem_mgb, self._send_cmd,
+                  [self.vmem_mgb.iscsi.bind_ip_to_target, '',
+                   target_name, self.gateway_iscsi_ip_addresses_mgb])])
         except Exception:
             LOG.exception(_("Failed to bind iSCSI targets!"))
             raise
 
         return self.array_info[random.randint(0, len(self.array_info) - 1)]
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.target_keys)
     def _delete_iscsi_target(self, volume):
         """Deletes the iscsi target for a lun
 
@@ -261,13 +271,15 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
             LOG.exception(_("Failed to delete iSCSI target!"))
             raise
 
-    @utils.synchronized('vmem-export')
     def _export_lun(self, volume, connector=None, igroup=None):
         """Generates the export configuration for the given volume
 
         The equivalent CLI command is "lun export container
         <container_name> name <lun_name>"
 
+        Each volume is exported on a target of its own, so it is never
+        exported together with other volumes (see _export_lun_to()).
+
         Arguments:
             volume -- volume object provided by the Manager
             connector -- connector object provided by the Manager
@@ -276,9 +288,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         Returns:
             lun_id -- the LUN ID assigned by the backend
         """
-        lun_id = ''
         export_to = ''
-        v = self.vmem_vip
 
         if igroup:
             export_to = igroup
@@ -287,20 +297,10 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         else:
             raise exception.Error(_("No initiators found, cannot proceed"))
 
-        lun_id = self.lun_tracker.get_lun_id_for_volume(volume)
-
         target_name = self._get_short_name(volume['id'])
 
-        LOG.info(_("Exporting lun %(vol_id)s on lun_id %(lun_id)s") %
-                 {'vol_id': volume['id'], 'lun_id': lun_id})
-
         try:
-            self._send_cmd_and_verify(v.lun.export_lun,
-                                      self._wait_for_exportstate,
-                                      '',
-                                      [self.container, volume['id'],
-                                      target_name, export_to, lun_id],
-                                      [volume['id'], True])
+            lun_id = self._export_lun_to(volume, target_name, export_to)
 
         except Exception:
             LOG.exception(_("LUN export failed!"))
@@ -308,7 +308,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
 
         return lun_id
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.volume_keys)
     def _unexport_lun(self, volume):
         """Removes the export configuration for the given volume.
 
@@ -338,7 +338,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
             LOG.exception(_("LUN unexport failed!"))
             raise
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.snapshot_keys)
     def _export_snapshot(self, snapshot, connector=None, igroup=None):
         """Generates the export configuration for the given snapshot.
 
@@ -384,7 +384,7 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
 
         return lun_id
 
-    @utils.synchronized('vmem-export')
+    @v6000_locks.synchronized(v6000_locks.snapshot_keys)
     def _unexport_snapshot(self, snapshot):
         """Removes the export configuration for the given snapshot.
 
@@ -435,24 +435,16 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         data = {}
         total_gb = 'unknown'
         free_gb = 'unknown'
-        v = self.vmem_vip
 
-        master_cluster_id = self.vmem_vip.basic.get_node_values(
-            '/cluster/state/master_id').values()[0]
+        total_bytes, free_bytes = self._get_container_space()
 
-        bn1 = "/vshare/state/global/%s/container/%s/total_bytes" \
-            % (master_cluster_id, self.container)
-        bn2 = "/vshare/state/global/%s/container/%s/free_bytes" \
-            % (master_cluster_id, self.container)
-        resp = v.basic.get_node_values([bn1, bn2])
-
-        if bn1 in resp:
-            total_gb = resp[bn1] / 1024 / 1024 / 1024
+        if total_bytes is not None:
+            total_gb = total_bytes / 1024 / 1024 / 1024
         else:
             LOG.warn(_("Failed to receive update for total_gb stat!"))
 
-        if bn2 in resp:
-            free_gb = resp[bn2] / 1024 / 1024 / 1024
+        if free_bytes is not None:
+            free_gb = free_bytes / 1024 / 1024 / 1024
         else:
             LOG.warn(_("Failed to receive update for free_gb stat!"))
 
@@ -470,6 +462,8 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
             LOG.debug(_("stat update: %(name)s=%(data)s") %
                       {'name': i, 'data': data[i]})
 
+        self._log_gateway_stats()
+
         self.stats = data
 
     def _get_short_name(self, volume_name):
@@ -502,14 +496,23 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         bn = "/net/interface/config/*"
         intf_list = mg_conn.basic.get_node_values(bn)
 
+        # Query the state of every candidate interface in one request
+        #
+        queries = []
         for i in intf_list:
             if intf_list[i] in interfaces_to_skip:
                 continue
 
             bn1 = "/net/interface/state/%s/addr/ipv4/1/ip" % intf_list[i]
             bn2 = "/net/interface/state/%s/flags/link_up" % intf_list[i]
-            resp = mg_conn.basic.get_node_values([bn1, bn2])
+            queries.append([bn1, bn2])
+
+        if not queries:
+            return active_gw_iscsi_ips
+
+        resps = mg_conn.basic.get_node_values_multi(queries)
 
+        for (bn1, bn2), resp in zip(queries, resps):
             if len(resp.keys()) == 2 and resp[bn2] == True:
                 active_gw_iscsi_ips.append(resp[bn1])
 
@@ -580,9 +583,9 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
     def _wait_for_targetstate(self, target_name):
         """Polls backend to verify an iscsi target configuration.
 
-        This function will try to verify the creation or removal of
-        an iscsi target on both gateway nodes of the array every 5
-        seconds for up to 30 seconds.
+        This function will try to verify the creation of an iscsi
+        target on both gateway nodes of the array, for up to
+        gateway_verify_timeout seconds.
 
         Arguments:
             target_name -- name of iscsi target to be polled
@@ -590,23 +593,6 @@ class V6000ISCSIDriver(v6000_common.V6000CommonDriver):
         Returns:
             True if the export state was correctly added
         """
-        status = [False, False]
-        mg_conns = [self.vmem_mga.basic, self.vmem_mgb.basic]
-        success = False
-
         bn = "/vshare/config/iscsi/target/%s" % (target_name)
 
-        for i in xrange(6):
-            for node_id in xrange(2):
-                if not status[node_id]:
-                    resp = mg_conns[node_id].get_node_values(bn)
-                    if len(resp.keys()):
-                        status[node_id] = True
-
-            if status[0] and status[1]:
-                success = True
-                break
-            else:
-                time.sleep(5)
-
-        return success
+        return self._wait_for_gateways(bn, lambda resp: bool(len(resp.keys())))
@@ -0,0 +1,187 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory 6000 Series per object locks
+
+Serializes work on each lun, snapshot, iSCSI target and igroup on its
+own, so that a request retrying against one busy object does not hold up
+work on every other object of the backend.
+"""
+
+import functools
+import threading
+import time
+
+
+class KeyedLockManager(object):
+    """Hands out a lock per key, such as "lun:<volume id>".
+
+    Locks only exist while they are held or waited for, so the manager
+    does not grow with the number of objects ever locked.  Holding
+    several keys at once is done by acquiring them in sorted order, so
+    two callers locking overlapping sets of keys cannot deadlock.  Locks
+    are not reentrant.
+
+    The manager counts how often a lock had to be waited for, and for
+    how long; see stats().
+
+    """
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'contended': 0,
+                       'wait_total': 0.0, 'wait_max': 0.0}
+
+    def __repr__(self):
+        return '<KeyedLockManager keys:%d>' % (len(self._locks),)
+
+    def acquire(self, keys):
+        """Blocks until the locks of all of keys are held."""
+        keys = sorted(set(keys))
+        acquired = []
+        try:
+            for key in keys:
+                self._acquire(key)
+                acquired.append(key)
+        except BaseException:
+            self.release(acquired)
+            raise
+
+    def release(self, keys):
+        """Releases the locks of keys, taken with acquire()."""
+        for key in sorted(set(keys), reverse=True):
+            self._lock.acquire()
+            try:
+                entry = self._locks[key]
+            finally:
+                self._lock.release()
+            entry[0].release()
+            self._drop(key, entry)
+
+    def held(self, keys):
+        """Returns a context manager holding the locks of keys:
+
+            with locks.held(['lun:' + volume['id']]):
+                ...
+        """
+        return _Held(self, keys)
+
+    def stats(self):
+        """Returns a dict of the number of locks acquired, how many of
+        them had to be waited for, the total and longest wait in seconds,
+        and the number of keys currently locked.
+        """
+        self._lock.acquire()
+        try:
+            stats = dict(self._stats)
+            stats['locked'] = len(self._locks)
+            return stats
+        finally:
+            self._lock.release()
+
+    def _acquire(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        finally:
+            self._lock.release()
+
+        wait = 0.0
+        if not entry[0].acquire(False):
+            start = time.time()
+            try:
+                entry[0].acquire()
+            except BaseException:
+                self._drop(key, entry)
+                raise
+            wait = time.time() - start
+
+        self._lock.acquire()
+        try:
+            self._stats['acquired'] += 1
+            if wait:
+                self._stats['contended'] += 1
+                self._stats['wait_total'] += wait
+                self._stats['wait_max'] = max(self._stats['wait_max'], wait)
+        finally:
+            self._lock.release()
+
+    def _drop(self, key, entry):
+        self._lock.acquire()
+        try:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+        finally:
+            self._lock.release()
+
+
+class _Held(object):
+    def __init__(self, manager, keys):
+        self.manager = manager
+        self.keys = list(keys)
+
+    def __enter__(self):
+        self.manager.acquire(self.keys)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.manager.release(self.keys)
+        return False
+
+
+def synchronized(key_func):
+    """Decorates a driver method to hold the driver's locks (its "locks"
+    KeyedLockManager) for the keys returned by key_func, which is called
+    with the method's arguments (other than self).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.locks.held(key_func(*args, **kwargs)):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def volume_keys(volume, *args, **kwargs):
+    """Keys of a method taking a volume as its first argument."""
+    return ['lun:%s' % volume['id']]
+
+
+def batch_volume_keys(key, volumes):
+    """Keys of a v6000_batch flush of volumes."""
+    return ['lun:%s' % x['id'] for x in volumes]
+
+
+def snapshot_keys(snapshot, *args, **kwargs):
+    """Keys of a method taking a snapshot as its first argument."""
+    return ['snap:%s' % snapshot['id']]
+
+
+def target_keys(volume, *args, **kwargs):
+    """Keys of a method working on the iSCSI target of a volume."""
+    return ['target:%s' % volume['id']]
+
+
+def igroup_keys(igroup_name):
+    """Keys of an igroup."""
+    return ['igroup:%s' % igroup_name]
@@ -0,0 +1,133 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory 6000 Series lun ID allocation
+
+Keeps track of the lun IDs in use in a container, and hands out the next
+free one, without walking the whole ID range on each allocation.
+"""
+
+# Lun IDs handed out by default; 0 is left out
+DEFAULT_FIRST_ID = 1
+DEFAULT_LAST_ID = 15999
+
+_FREE = b'\x00'
+_USED = 1
+
+
+class LunIdAllocator(object):
+    """Allocates lun IDs from the range first..last.
+
+    IDs are handed out in increasing order, starting after the last one
+    allocated, and wrapping round to "first" at the end of the range, so
+    that a freed ID is not reused until the other free ones have been.
+
+    The IDs in use are kept in a bytearray, one byte per ID.  Allocation
+    looks for the next free ID with a single bytearray.find() from where
+    the previous one left off; this is immediate while free IDs lie
+    ahead, and at worst one scan of the range at C speed when it is
+    nearly full.
+
+    The allocator is not thread safe.
+
+    """
+    def __init__(self, first=DEFAULT_FIRST_ID, last=DEFAULT_LAST_ID):
+        """Arguments:
+            first -- lowest lun ID to allocate
+            last  -- highest lun ID to allocate
+        """
+        first, last = int(first), int(last)
+        if first < 0 or last < first:
+            raise ValueError('Invalid lun ID range %d-%d' % (first, last))
+        self.first = first
+        self.last = last
+        self.next_id = first
+        self.allocated = 0
+        self._map = bytearray(last - first + 1)
+
+    def __repr__(self):
+        return '<LunIdAllocator %d-%d allocated:%d>' % (
+            self.first, self.last, self.allocated)
+
+    def __contains__(self, lun_id):
+        """Returns True if lun_id is in the range."""
+        return self.first <= lun_id <= self.last
+
+    def is_allocated(self, lun_id):
+        """Returns True if lun_id is in use."""
+        return lun_id in self and self._map[lun_id - self.first] == _USED
+
+    def allocate(self):
+        """Returns the next free lun ID, now marked in use, or None if
+        every ID in the range is in use.
+        """
+        lun_id = self._seek(self.next_id)
+        if lun_id is None:
+            return None
+        self._mark(lun_id)
+        self._advance(lun_id)
+        return lun_id
+
+    def reserve(self, lun_id, skip=False):
+        """Marks lun_id in use, such as one found on the array.
+
+        Arguments:
+            lun_id -- lun ID in use
+            skip   -- also skip the IDs below lun_id, so that the next
+                      allocation comes after it
+
+        Returns:
+            False if lun_id is outside the range, and so not tracked.
+        """
+        if lun_id not in self:
+            return False
+        self._mark(lun_id)
+        if lun_id == self.next_id or (skip and lun_id > self.next_id):
+            self._advance(lun_id)
+        return True
+
+    def free(self, lun_id):
+        """Marks lun_id free again, to be handed out once allocation
+        comes round to it.
+        """
+        if lun_id in self and self._map[lun_id - self.first] == _USED:
+            self._map[lun_id - self.first] = 0
+            self.allocated -= 1
+
+    def _mark(self, lun_id):
+        if self._map[lun_id - self.first] != _USED:
+            self._map[lun_id - self.first] = _USED
+            self.allocated += 1
+
+    def _seek(self, start):
+        """Returns the first free ID from start on, wrapping round to the
+        start of the range, or None if there is none.
+        """
+        offset = start - self.first
+        i = self._map.find(_FREE, offset)
+        if i < 0:
+            i = self._map.find(_FREE, 0, offset)
+        if i < 0:
+            return None
+        return self.first + i
+
+    def _advance(self, lun_id):
+        """Moves allocation on past lun_id; the next allocate() seeks the
+        free ID from there.
+        """
+        self.next_id = self.first if lun_id >= self.last else lun_id + 1
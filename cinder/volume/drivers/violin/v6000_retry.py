@@ -0,0 +1,145 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory 6000 Series retry policy for gateway requests
+
+Decides which gateway return codes are worth sending a request again for,
+and how long to back off first, so that a busy gateway is not flooded
+with retries while it works through the requests it already has.
+"""
+
+import random
+import threading
+
+FATAL = 'fatal'
+
+# Return codes no retry will fix, extracted from vdmd_mgmt.c
+FATAL_CODES = {
+    512: 'not enough free space in container (vdmd bug)',
+    14000: 'lc_generic_error',
+    14002: 'lc_err_assertion_failed',
+    14004: 'lc_err_not_found',
+    14005: 'lc_err_exists',
+    14008: 'lc_err_unexpected_arg',
+    14014: 'lc_err_io_error',
+    14016: 'lc_err_io_closed',
+    14017: 'lc_err_io_timeout',
+    14021: 'lc_err_unexpected_case',
+    14025: 'lc_err_no_fs_space',
+    14035: 'lc_err_range',
+    14036: 'lc_err_invalid_param',
+    14121: 'lc_err_cancelled_err',
+}
+
+# Backoff (base, cap) in seconds for return codes asking to try again
+BACKOFF_CODES = {
+    1024: (2.0, 30.0),      # lun deletion in progress, try again later
+    14032: (0.5, 8.0),      # lc_err_lock_busy
+}
+
+# Backoff for anything else that did not succeed, such as a return code
+# of 0 without the expected message
+DEFAULT_BACKOFF = (0.1, 5.0)
+
+
+class RetryPolicy(object):
+    """Per return code retry policy for gateway requests.
+
+    Each code is either FATAL, or retried after an exponential backoff
+    with "full jitter": retry n waits a random time of up to
+    min(cap, base * 2 ** (n - 1)) seconds.  Spreading retries out at
+    random keeps several requests that hit the same lock from all
+    coming back at once.
+
+    The policy counts the retries of each code; see stats().
+
+    """
+    def __init__(self, overrides=None):
+        """Arguments:
+            overrides -- dict of code to FATAL or (base, cap), replacing
+                         the defaults for those codes (see parse())
+        """
+        self.policies = dict((code, FATAL) for code in FATAL_CODES)
+        self.policies.update(BACKOFF_CODES)
+        self.policies.update(overrides or {})
+        self._retries = {}
+        self._lock = threading.Lock()
+
+    def is_fatal(self, code):
+        """Returns True if code means the request should be given up."""
+        return self.policies.get(code) == FATAL
+
+    def backoff(self, code, attempt):
+        """Returns the seconds to wait before retry number "attempt"
+        (counting from 1) of a request that returned code, and counts
+        the retry.
+        """
+        policy = self.policies.get(code, DEFAULT_BACKOFF)
+        if policy == FATAL:
+            raise ValueError('Return code %s is not retried' % (code,))
+
+        self._lock.acquire()
+        try:
+            self._retries[code] = self._retries.get(code, 0) + 1
+        finally:
+            self._lock.release()
+
+        base, cap = policy
+        return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+    def stats(self):
+        """Returns a dict of the number of retries for each code."""
+        self._lock.acquire()
+        try:
+            return dict(self._retries)
+        finally:
+            self._lock.release()
+
+
+def parse(entries):
+    """Parses policy overrides, such as those of gateway_retry_policy.
+
+    Each entry is "code:fatal", "code:retry" (retry with the default
+    backoff) or "code:base:cap" (retry with that backoff, in seconds).
+
+    Returns:
+        A dict of code to FATAL or (base, cap), for RetryPolicy.
+
+    Raises ValueError for a malformed entry.
+    """
+    overrides = {}
+    for entry in entries:
+        fields = entry.strip().split(':')
+        try:
+            code = int(fields[0])
+            if fields[1:] == [FATAL]:
+                overrides[code] = FATAL
+            elif fields[1:] == ['retry']:
+                overrides[code] = DEFAULT_BACKOFF
+            elif len(fields) == 3:
+                base, cap = float(fields[1]), float(fields[2])
+                if base < 0 or cap < 0:
+                    raise ValueError()
+                overrides[code] = (base, cap)
+            else:
+                raise ValueError()
+        except ValueError:
+            raise ValueError('Invalid retry policy "%s": expected '
+                             'code:fatal, code:retry or code:base:cap'
+                             % (entry,))
+    return overrides
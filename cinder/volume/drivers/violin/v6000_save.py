@@ -0,0 +1,195 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Violin Memory 6000 Series write-behind saves of the array configuration
+
+Saving the configuration ("write mem") is one of the slowest gateway
+actions.  Rather than saving after every export change, changes mark the
+configuration dirty and a background thread saves it once for all the
+changes made in a short interval.
+"""
+
+import threading
+import time
+
+# Seconds a change may wait before the configuration is saved
+DEFAULT_INTERVAL = 5.0
+
+# Changes that are saved right away, without waiting out the interval
+DEFAULT_MAX_PENDING = 32
+
+
+class ConfigSaver(object):
+    """Saves the configuration of an array some time after it changes.
+
+    mark_dirty() records a change, and returns at once.  A daemon thread
+    then runs save() once "interval" seconds have passed since the first
+    unsaved change, or as soon as max_pending changes are waiting, so a
+    burst of changes costs one save:
+
+        saver = ConfigSaver(session.save_config)
+        ... change exports ...
+        saver.mark_dirty()
+
+    flush() saves any pending changes before it returns, and close()
+    does the same and stops the thread; it should be called at shutdown.
+
+    A failed save is retried after another interval, however many
+    changes are waiting.  Failures are counted (see stats()) and passed
+    to on_error, when one is given.
+
+    """
+    def __init__(self, save, interval=DEFAULT_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING, on_error=None):
+        """Arguments:
+            save        -- function saving the configuration
+            interval    -- most seconds a change waits to be saved
+            max_pending -- number of changes saved without waiting
+            on_error    -- function called with the exception of a save
+                           made in the background that failed
+        """
+        if interval < 0:
+            raise ValueError('interval must not be negative')
+        if int(max_pending) < 1:
+            raise ValueError('max_pending must be at least 1')
+        self.save = save
+        self.interval = interval
+        self.max_pending = int(max_pending)
+        self.on_error = on_error
+        self._pending = 0
+        self._dirty_since = None
+        self._failed = False
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition(threading.Lock())
+        self._save_lock = threading.Lock()
+        self._stats = {'changes': 0, 'saves': 0, 'failures': 0}
+
+    def __repr__(self):
+        return '<ConfigSaver interval:%s pending:%d>' % (self.interval,
+                                                         self._pending)
+
+    def mark_dirty(self):
+        """Records a configuration change, to be saved later."""
+        self._cond.acquire()
+        try:
+            if self._closed:
+                raise RuntimeError('mark_dirty() after close()')
+            self._stats['changes'] += 1
+            self._pending += 1
+            if self._dirty_since is None:
+                self._dirty_since = time.time()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='v6000-config-saver')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+        finally:
+            self._cond.release()
+
+    def dirty(self):
+        """Returns True if there are changes waiting to be saved."""
+        return self._pending > 0
+
+    def flush(self):
+        """Saves any pending changes before returning.
+
+        Raises the exception of save() if it fails, leaving the changes
+        pending.
+        """
+        self._save()
+
+    def close(self):
+        """Saves any pending changes and stops the background thread."""
+        self._cond.acquire()
+        try:
+            self._closed = True
+            self._cond.notify()
+        finally:
+            self._cond.release()
+        self.flush()
+
+    def stats(self):
+        """Returns a dict of the number of changes marked, the saves made
+        for them and the saves that failed.
+        """
+        self._cond.acquire()
+        try:
+            return dict(self._stats)
+        finally:
+            self._cond.release()
+
+    def _run(self):
+        self._cond.acquire()
+        try:
+            while not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                delay = self._dirty_since + self.interval - time.time()
+                full = self._pending >= self.max_pending and not self._failed
+                if delay > 0 and not full:
+                    self._cond.wait(delay)
+                    continue
+
+                self._cond.release()
+                try:
+                    self._save()
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(e)
+                finally:
+                    self._cond.acquire()
+        finally:
+            self._cond.release()
+
+    def _save(self):
+        self._save_lock.acquire()
+        try:
+            self._cond.acquire()
+            try:
+                pending = self._pending
+                self._pending = 0
+                self._dirty_since = None
+            finally:
+                self._cond.release()
+            if not pending:
+                return
+
+            try:
+                self.save()
+            except Exception:
+                self._cond.acquire()
+                try:
+                    self._stats['failures'] += 1
+                    self._pending += pending
+                    self._dirty_since = time.time()
+                    self._failed = True
+                finally:
+                    self._cond.release()
+                raise
+
+            self._cond.acquire()
+            try:
+                self._stats['saves'] += 1
+                self._failed = False
+            finally:
+                self._cond.release()
+        finally:
+            self._save_lock.release()
@@ -28,6 +28,7 @@ except Exception:
 
 
 import sys
+import threading
 import urllib2
 
 # Require python 2.6.0
@@ -37,18 +38,23 @@ if sys.hexversion <= 0x02060000:
                       (sys.version_info[0], sys.version_info[1],
                        sys.version_info[2]))
 
-import inspect
-
+from cinder.volume.drivers.violin.vxg.core.discovery import DiscoveryCache
+from cinder.volume.drivers.violin.vxg.core import error
+from cinder.volume.drivers.violin.vxg.core.events import XGEventListener
+from cinder.volume.drivers.violin.vxg.core import futures
+from cinder.volume.drivers.violin.vxg.core.metrics import Metrics
+from cinder.volume.drivers.violin.vxg.core import registry
+from cinder.volume.drivers.violin.vxg.core.router import GatewayRouter
+from cinder.volume.drivers.violin.vxg.core.session import AsyncXGSession
 from cinder.volume.drivers.violin.vxg.core.session import Vmos7JsonSession
 from cinder.volume.drivers.violin.vxg.core.session import XGSession
-from cinder.volume.drivers.violin.vxg.varray import varray
-from cinder.volume.drivers.violin.vxg.vmos7 import vmos7
-from cinder.volume.drivers.violin.vxg.vshare import vshare
+from cinder.volume.drivers.violin.vxg.core.trace import Tracer
 
 
 def open(host, user='admin', password='', proto='https',
          version=1, debug=False, http_fallback=True,
-         keepalive=False, logger=None):
+         keepalive=False, logger=None, workers=0, shared=False,
+         tracer=None, metrics=None, discovery=None):
     """Opens up a REST connection with the given Violin appliance.
 
     This will first login to the given host, then access that host's version
@@ -68,12 +74,38 @@ def open(host, user='admin', password='', proto='https',
         http_fallback -- If proto is https and https fails, fallback to http
         keepalive     -- Attempt to reconnect on session loss
         logger        -- Where to send logs (default: sys.stdout)
+        workers       -- If non-zero, XML gateways get an AsyncXGSession
+                         able to run this many requests concurrently
+        shared        -- Share one connection between every shared open()
+                         of the same host, user and proto in this process
+                         (see below)
+        tracer        -- vxg.Tracer recording each XML gateway request
+        metrics       -- vxg.Metrics counting each XML gateway request
+        discovery     -- vxg.DiscoveryCache to skip probing the host
+                         with, if it has been opened recently
 
     Returns:
         An authenticated REST connection to the appliance.  If there are any
         connection problems, then None is returned.
 
+    Shared connections are reference counted: each open() returns its own
+    handle, and closing a handle only logs out once every other handle to
+    the connection is closed too.  A connection is only shared by opens
+    with the same password and settings (other than discovery); one with
+    a different password, tracer, metrics, workers and so on gets a
+    private connection instead.
+
     """
+    if shared:
+        return registry.default.open(
+            (host, user, proto.lower()), password,
+            lambda: open(host, user, password, proto, version, debug,
+                         http_fallback, keepalive, logger, workers,
+                         tracer=tracer, metrics=metrics,
+                         discovery=discovery),
+            (version, debug, http_fallback, keepalive, logger, workers,
+             tracer, metrics))
+
     # Build up protocols to attempt
     protocols_to_try = []
     if proto.lower() == 'https':
@@ -91,52 +123,99 @@ def open(host, user='admin', password='', proto='https',
     else:
         raise ValueError('logger needs callable "write" and "flush" methods')
 
-    # Discover the Violin appliance supplied
-    for current_protocol in protocols_to_try:
-        try:
-            stream = urllib2.urlopen('{0}://{1}'.format(
-                                     current_protocol, host))
-        except urllib2.URLError as e:
-            if debug:
-                log_fd.write('{0}: {1}'.format(current_protocol, e))
-                log_fd.flush()
-        else:
+    # Go straight to logging in if the host was discovered recently.  The
+    # host is only probed again if it no longer answers as discovered: a
+    # rejected login would be rejected over any protocol, so it is raised.
+    if discovery is not None:
+        entry = discovery.get(host)
+        if entry is not None and entry['proto'] in protocols_to_try:
             try:
-                html = stream.read()
-            except Exception as e:
+                return _OPENERS[entry['kind']](
+                    host, user, password, entry['proto'], version, debug,
+                    keepalive, log_fd, workers, tracer, metrics,
+                    entry['version_info'])
+            except (error.NetworkError, error.ParseError,
+                    error.UnsupportedProtocol, urllib2.URLError) as e:
                 if debug:
-                    log_fd.write('{0} (read): {1}'.format(
-                                 current_protocol, e))
+                    log_fd.write('{0}: cached discovery failed, '
+                                 'probing again: {1}\n'.format(host, e))
                     log_fd.flush()
-                try:
-                    stream.close()
-                except Exception:
-                    pass
-            else:
-                opener = None
-                if 'viewport' in html:
-                    opener = _open_json_gateway
-                elif 'template' in html:
-                    opener = _open_xml_gateway
-                elif 'Violin Concerto Console' in html:
-                    opener = _open_vmos7_json_gateway
-                stream.close()
-                if opener:
-                    try:
-                        return opener(host, user, password, current_protocol,
-                                      version, debug, keepalive, log_fd)
-                    except IndexError as e:
-                        log_fd.write('Failed to get authenticated session ' +
-                                     'and/or retrieve the ' +
-                                     'version ({0}): {1}'.format(
-                                     e.__class__.__name__, e))
-                        log_fd.flush()
-                        return None
+            discovery.forget(host)
+
+    # Discover the Violin appliance supplied, fetching its landing page
+    # over every protocol at once (but preferring them in order)
+    for current_protocol, kind, err in _probe_all(host, protocols_to_try):
+        if err is not None:
+            if debug:
+                log_fd.write('{0}: {1}'.format(current_protocol, err))
+                log_fd.flush()
+            continue
+        if kind is None:
+            continue
+        try:
+            conn = _OPENERS[kind](host, user, password, current_protocol,
+                                  version, debug, keepalive, log_fd,
+                                  workers, tracer, metrics)
+        except IndexError as e:
+            log_fd.write('Failed to get authenticated session ' +
+                         'and/or retrieve the ' +
+                         'version ({0}): {1}'.format(
+                         e.__class__.__name__, e))
+            log_fd.flush()
+            return None
+        if discovery is not None:
+            discovery.put(host, current_protocol, kind, conn.version_info)
+        return conn
 
     # Nothing worked
     return None
 
 
+def _probe_all(host, protocols):
+    """Fetches the landing page of host over each protocol concurrently.
+
+    Yields (protocol, kind, error) in the order of "protocols", where
+    kind is the device kind the page identifies (or None) and error is
+    why the page could not be fetched (or None).  Later protocols are
+    only waited for if the earlier ones are no use.
+
+    """
+    if len(protocols) == 1:
+        yield (protocols[0],) + _probe(host, protocols[0])
+        return
+
+    pool = futures.ThreadPool(len(protocols))
+    pending = [pool.submit(_probe, host, x) for x in protocols]
+    pool.shutdown(wait=False)
+    for current_protocol, future in zip(protocols, pending):
+        yield (current_protocol,) + future.result()
+
+
+def _probe(host, proto):
+    """Returns (kind, error) for the landing page of host over proto."""
+    try:
+        stream = urllib2.urlopen('{0}://{1}'.format(proto, host))
+    except urllib2.URLError as e:
+        return (None, e)
+    try:
+        html = stream.read()
+    except Exception as e:
+        return (None, '(read): {0}'.format(e))
+    finally:
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    if 'viewport' in html:
+        return ('json', None)
+    elif 'template' in html:
+        return ('xml', None)
+    elif 'Violin Concerto Console' in html:
+        return ('vmos7', None)
+    return (None, None)
+
+
 def _get_session_and_version(cls_type, host, user, password, debug,
                              proto, keepalive, log_fd):
     """Internal function to get a session and its version.
@@ -150,19 +229,25 @@ def _get_session_and_version(cls_type, host, user, password, debug,
 
 
 def _open_vmos7_json_gateway(host, user, password, proto,
-                             version, debug, keepalive, log_fd):
+                             version, debug, keepalive, log_fd, workers,
+                             tracer, metrics, version_info=None):
     """JSON REST connection for Violin vMOS7 device types.
 
     """
-    session, version_info = _get_session_and_version(Vmos7JsonSession, host,
-                                                     user, password, debug,
-                                                     proto, keepalive, log_fd)
+    if version_info is None:
+        session, version_info = _get_session_and_version(
+            Vmos7JsonSession, host, user, password, debug, proto,
+            keepalive, log_fd)
+    else:
+        session = Vmos7JsonSession(host, user, password, debug, proto,
+                                   True, keepalive, log_fd)
 
-    return __getDeviceFor(version_info, session, vmos7, debug)
+    return __getDeviceFor(version_info, session, 'vmos7', debug)
 
 
 def _open_json_gateway(host, user, password, proto,
-                       version, debug, keepalive, log_fd):
+                       version, debug, keepalive, log_fd, workers, tracer,
+                       metrics, version_info=None):
     """JSON REST connection for Symphony.
 
     """
@@ -170,32 +255,87 @@ def _open_json_gateway(host, user, password, proto,
 
 
 def _open_xml_gateway(host, user, password, proto,
-                      version, debug, keepalive, log_fd):
+                      version, debug, keepalive, log_fd, workers, tracer,
+                      metrics, version_info=None):
     """Get the traditional tallmaple REST connection.
 
+    If version_info is given (from a DiscoveryCache), the version query
+    is skipped.
+
     """
-    session, version_info = _get_session_and_version(XGSession, host, user,
-                                                     password, debug, proto,
-                                                     keepalive, log_fd)
+    if workers:
+        session = AsyncXGSession(host, user, password, debug, proto, True,
+                                 keepalive, log_fd, workers=workers,
+                                 tracer=tracer, metrics=metrics)
+    else:
+        session = XGSession(host, user, password, debug, proto, True,
+                            keepalive, log_fd, tracer=tracer,
+                            metrics=metrics)
+    if version_info is None:
+        version_info = session._get_version_info()
 
     if version_info['type'] in ('A',):
         # ACM
-        return __getDeviceFor(version_info, session, varray, debug)
+        return __getDeviceFor(version_info, session, 'varray', debug)
     elif version_info['type'] in ('G', 'V'):
         # MG
-        return __getDeviceFor(version_info, session, vshare, debug)
+        return __getDeviceFor(version_info, session, 'vshare', debug)
 
     msg = 'Unknown version host_type: {0}'
     raise Exception(msg.format(version_info['type']))
 
 
-def __getDeviceFor(version_info, session, moduleToSearch, debug):
+def __getDeviceFor(version_info, session, family, debug):
     """Returns a device object.
 
     If there's a problem, an Exception is raised.
 
     """
     version_as_tuple = __to_version_tuple(version_info['version'])
+
+    # Find the newest object for the discovered version
+    for x, cls in _get_device_classes(family):
+        if version_as_tuple >= x:
+            return cls(session, version_info)
+    else:
+        session.close()
+        raise Exception('No matching connection class for {0}'.format(
+                        version_info))
+
+
+def _get_device_classes(family):
+    """Returns the device classes of a family ('varray', 'vmos7' or
+    'vshare') as a list of (version tuple, class), newest first.
+
+    The family's module, and the managers it uses, are only imported
+    the first time one of its devices is opened.
+
+    """
+    classes = _DEVICE_CLASSES.get(family)
+    if classes is None:
+        _DEVICE_CLASSES_LOCK.acquire()
+        try:
+            classes = _DEVICE_CLASSES.get(family)
+            if classes is None:
+                if family not in _FAMILIES:
+                    raise ValueError('Unknown device family {0}'.format(
+                                     family))
+                module = __import__('{0}.{1}.{1}'.format(__name__, family),
+                                    fromlist=[family])
+                classes = __getDeviceClasses(module)
+                _DEVICE_CLASSES[family] = classes
+        finally:
+            _DEVICE_CLASSES_LOCK.release()
+    return classes
+
+
+def __getDeviceClasses(moduleToSearch):
+    """Returns the device classes of a module as a list of
+    (version tuple, class), newest first.
+
+    """
+    import inspect
+
     supported_versions = {}
 
     for name, obj in inspect.getmembers(moduleToSearch):
@@ -212,14 +352,7 @@ def __getDeviceFor(version_info, session, moduleToSearch, debug):
                                 'encountered in ' +
                                 'class %s.' % (name,))
 
-    # Find the newest object for the discovered version
-    for x in reversed(sorted(supported_versions.keys())):
-        if version_as_tuple >= x:
-            return supported_versions[x](session, version_info)
-    else:
-        session.close()
-        raise Exception('No matching connection class for {0}'.format(
-                        version_info))
+    return sorted(supported_versions.items(), reverse=True)
 
 
 def __to_version_tuple(version):
@@ -227,3 +360,16 @@ def __to_version_tuple(version):
 
     """
     return tuple(int(x) for x in version.split('.'))
+
+
+# Opener for each kind of device a landing page can identify
+_OPENERS = {'json': _open_json_gateway,
+            'xml': _open_xml_gateway,
+            'vmos7': _open_vmos7_json_gateway}
+
+# Device families; each is the package and module vxg.<name>.<name>
+_FAMILIES = ('varray', 'vmos7', 'vshare')
+
+# The device classes of each family opened so far, built on first use
+_DEVICE_CLASSES = {}
+_DEVICE_CLASSES_LOCK = threading.Lock()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import fnmatch
+import threading
+import time
+
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.node import XGNodeDict
+
+# Maximum number of query results kept by default
+DEFAULT_MAXSIZE = 128
+
+# Seconds a cached result may be served for, unless a rule says otherwise
+DEFAULT_TTL = 30
+
+# Default per-pattern TTLs: state nodes change without a config change
+# (and so without a db revision bump), so only keep them briefly
+DEFAULT_TTL_RULES = [('*/state/*', 2)]
+
+
+class XGQueryCache(object):
+    """LRU cache of XG query results.
+
+    Results are keyed by the queried node patterns and the query options,
+    and are invalidated when:
+
+        - the cache is cleared (XGSession does so on every action or set)
+        - a response shows a new db revision (see note_revision())
+        - they are older than the TTL for their patterns
+
+    TTLs are chosen with "ttl_rules", a list of (glob, seconds) tuples
+    checked in order against each queried pattern.  The first rule
+    matching a pattern sets its TTL, and a query's TTL is the lowest TTL
+    of any of its patterns.  A TTL of 0 means the query is never cached.
+
+    Cached nodes are copied on the way in and out, so callers are free to
+    modify what they are handed.
+
+    To avoid caching a result that a concurrent action has made stale,
+    callers read "generation" before sending a query and pass it to
+    put(); the result is dropped if the cache was invalidated meanwhile.
+
+    """
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL,
+                 ttl_rules=None):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        if ttl_rules is None:
+            ttl_rules = DEFAULT_TTL_RULES
+        self.ttl_rules = [(x, float(y)) for x, y in ttl_rules]
+        self.db_rev = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ('<XGQueryCache size:%d/%d hits:%d misses:%d>'
+                % (len(self._entries), self.maxsize, self.hits, self.misses))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, node_names, nostate, noconfig, flat, values_only, strip):
+        """Build the cache key for a query."""
+        return (tuple(node_names), bool(nostate), bool(noconfig),
+                bool(flat), bool(values_only), strip)
+
+    def get_ttl(self, node_names):
+        """Returns the TTL in seconds for a query of these patterns."""
+        ttl = self.ttl
+        for name in node_names:
+            for pattern, rule_ttl in self.ttl_rules:
+                if fnmatch.fnmatchcase(name, pattern):
+                    ttl = min(ttl, rule_ttl)
+                    break
+        return ttl
+
+    def get(self, key):
+        """Returns a copy of the cached result for key, or None."""
+        now = time.time()
+
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+            # Mark as most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+        finally:
+            self._lock.release()
+
+        return _copy_nodes(entry[1])
+
+    def put(self, key, nodes, db_rev=None, generation=None):
+        """Cache a query result.
+
+        Arguments:
+            key        -- Key from key()
+            nodes      -- The result (XGNodeDict or list of XGNodes)
+            db_rev     -- The db revision the result was read at
+            generation -- The generation read before the query was sent
+
+        """
+        ttl = self.get_ttl(key[0])
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        nodes = _copy_nodes(nodes)
+
+        self._lock.acquire()
+        try:
+            if generation is not None and generation != self.generation:
+                # Invalidated while the query was in flight
+                return
+            if db_rev:
+                if self.db_rev is not None:
+                    if db_rev < self.db_rev:
+                        return
+                    elif db_rev > self.db_rev:
+                        self._clear()
+                self.db_rev = db_rev
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, nodes)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def note_revision(self, db_rev):
+        """Clear the cache if db_rev is newer than the revision last seen.
+
+        Status responses carry a db_rev of 0 and are ignored, as are
+        revisions older than the last seen (a slow response to a query
+        sent before the last change).
+
+        """
+        if not db_rev:
+            return
+        self._lock.acquire()
+        try:
+            if self.db_rev is None or db_rev > self.db_rev:
+                if self.db_rev is not None:
+                    self._clear()
+                self.db_rev = db_rev
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Drop every cached result."""
+        self._lock.acquire()
+        try:
+            self._clear()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Returns a dict of the cache counters."""
+        return {'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations}
+
+    def _clear(self):
+        self.generation += 1
+        if self._entries:
+            self._entries.clear()
+            self.invalidations += 1
+
+
+def _copy_node(node):
+    ret = XGNode.copy(node)
+    ret.nodes = [_copy_node(x) for x in node.nodes]
+    return ret
+
+
+def _copy_nodes(nodes):
+    if isinstance(nodes, XGNodeDict):
+        values_only = nodes.values_only
+        return XGNodeDict([_copy_node(nodes.get_node(x)) for x in nodes],
+                          values_only)
+    return [_copy_node(x) for x in nodes]
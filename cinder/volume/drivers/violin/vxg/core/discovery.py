@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Seconds a discovered host is trusted for before it is probed again
+DEFAULT_TTL = 3600
+
+
+class DiscoveryCache(object):
+    """On-disk record of what each gateway host was found to be.
+
+    vxg.open() normally fetches a host's landing page over each protocol
+    to find out what kind of device it is, then asks it for its version.
+    With a DiscoveryCache it records the protocol, device kind and
+    version info of every host it opens, and for "ttl" seconds after
+    goes straight to logging in with what was recorded.
+
+    The cache is a small JSON file, so it is shared with other processes
+    and survives restarts.  It is only an optimization: a missing,
+    unreadable or unwritable file behaves like an empty cache.
+
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<DiscoveryCache %s ttl:%s>' % (self.path, self.ttl)
+
+    def get(self, host):
+        """Returns the entry for host, or None if unknown or expired.
+
+        Entries are dicts of "proto", "kind" ('xml', 'json' or 'vmos7'),
+        "version_info" and the "time" they were recorded.
+
+        """
+        entry = self._load().get(host)
+        if entry is None:
+            return None
+        try:
+            if time.time() - entry['time'] >= self.ttl:
+                return None
+            entry['proto'], entry['kind'], entry['version_info']
+        except (KeyError, TypeError):
+            return None
+        return entry
+
+    def put(self, host, proto, kind, version_info):
+        """Record what host was found to be."""
+        self._update(host, {'proto': proto, 'kind': kind,
+                            'version_info': version_info,
+                            'time': time.time()})
+
+    def forget(self, host):
+        """Drop the entry for host, if any."""
+        self._update(host, None)
+
+    def _update(self, host, entry):
+        self._lock.acquire()
+        try:
+            entries = self._load()
+            if entry is None:
+                if entries.pop(host, None) is None:
+                    return
+            else:
+                entries[host] = entry
+            self._save(entries)
+        finally:
+            self._lock.release()
+
+    def _load(self):
+        try:
+            fp = open(self.path)
+        except IOError:
+            return {}
+        try:
+            entries = json.load(fp)
+        except ValueError:
+            return {}
+        finally:
+            fp.close()
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def _save(self, entries):
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(dirname)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+        try:
+            fd, tmp = tempfile.mkstemp(prefix='.vxg-discovery', dir=dirname)
+        except (IOError, OSError):
+            return
+        try:
+            try:
+                os.write(fd, json.dumps(entries, sort_keys=True, indent=1))
+            finally:
+                os.close(fd)
+            os.rename(tmp, self.path)
+            tmp = None
+        except (IOError, OSError):
+            pass
+        finally:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
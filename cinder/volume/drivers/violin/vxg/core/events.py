@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGEvent
+
+# Sent by the gateway whenever its configuration database changes
+DBCHANGE_EVENT = '/mgmtd/notify/dbchange'
+
+# Event requests that subscribe to events, and wait for the next ones
+SUBSCRIBE_EVENT = '/xg/events/subscribe'
+WAIT_EVENT = '/xg/events/wait'
+
+# Seconds each wait request is held open by the gateway for
+DEFAULT_TIMEOUT = 30
+
+# Seconds before subscribing again after the gateway drops a subscription
+DEFAULT_RETRY_AFTER = 5
+
+# Least number of seconds between wait requests that return no events, in
+# case the gateway answers them at once rather than holding them open
+DEFAULT_MIN_INTERVAL = 1
+
+
+class XGEventListener(object):
+    """Receives event notifications from an XML gateway.
+
+    start() subscribes the session to the events (dbchange by default),
+    then a daemon thread keeps a wait request open on the gateway.  Each
+    response to it lists the nodes named by the events since the last
+    one, and wakes up everyone watching those nodes:
+
+        waker = listener.watch('/vshare/config/export')
+        ... make the change ...
+        waker.wait(5)
+        listener.unwatch('/vshare/config/export', waker)
+
+    A watch on a node is woken by events for it and for every node under
+    it.  A waker is only a hint that something changed, to be checked
+    with a query, and events can be missed (before a watch is set up, or
+    while the subscription is being renewed), so waiting callers should
+    still poll now and then.  "active" is False whenever the listener is
+    not subscribed.
+
+    """
+    def __init__(self, session, events=(DBCHANGE_EVENT,),
+                 timeout=DEFAULT_TIMEOUT, retry_after=DEFAULT_RETRY_AFTER,
+                 min_interval=DEFAULT_MIN_INTERVAL):
+        self.session = session
+        self.events = tuple(events)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.min_interval = min_interval
+        self.active = False
+        self.received = 0
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return '<XGEventListener host:%s active:%s received:%d>' % (
+            self.session.host, self.active, self.received)
+
+    def start(self):
+        """Subscribes to the events and starts listening for them.
+
+        Returns:
+            True if the gateway accepted the subscription.  Otherwise
+            nothing is started, and watchers are never woken.
+
+        """
+        if self._thread is not None:
+            return self.active
+        if not self._subscribe():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen,
+                                        name='vxg-events-%s' %
+                                        (self.session.host,))
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def close(self):
+        """Stops listening.
+
+        The thread exits once its current wait request returns, which
+        is not waited for.
+
+        """
+        self._stop.set()
+        self._thread = None
+        self.active = False
+
+    def watch(self, path, waker=None):
+        """Returns a threading.Event set by events for path (or any node
+        under it).
+
+        Arguments:
+            path  -- Node name to watch
+            waker -- Event to set, so that one can watch several paths or
+                     gateways at once (default: a new one)
+
+        """
+        if waker is None:
+            waker = threading.Event()
+        self._lock.acquire()
+        try:
+            self._watches.setdefault(path.rstrip('/'), []).append(waker)
+        finally:
+            self._lock.release()
+        return waker
+
+    def unwatch(self, path, waker):
+        """Removes a watch set up by watch()."""
+        path = path.rstrip('/')
+        self._lock.acquire()
+        try:
+            wakers = self._watches.get(path, [])
+            if waker in wakers:
+                wakers.remove(waker)
+            if not wakers:
+                self._watches.pop(path, None)
+        finally:
+            self._lock.release()
+
+    def notify(self, names):
+        """Wakes the watchers of each of the node names, and of the nodes
+        above them.
+        """
+        woken = []
+        self._lock.acquire()
+        try:
+            for name in names:
+                path = name.rstrip('/')
+                while path:
+                    woken.extend(self._watches.get(path, ()))
+                    path = path.rpartition('/')[0]
+        finally:
+            self._lock.release()
+        for waker in woken:
+            waker.set()
+
+    def _subscribe(self):
+        req = XGEvent(SUBSCRIBE_EVENT,
+                      [XGNode('event_name', 'string', x)
+                       for x in self.events])
+        try:
+            resp = self.session.send_request(req)
+        except Exception as e:
+            self.session.log('Event subscription failed: {0}'.format(e))
+            return False
+        if resp.r_code != 0:
+            self.session.log('Event subscription refused: {0}'.format(
+                             resp.r_msg))
+            return False
+        self.active = True
+        return True
+
+    def _listen(self):
+        req = XGEvent(WAIT_EVENT,
+                      [XGNode('timeout', 'uint32', self.timeout)],
+                      flat=True)
+        while not self._stop.is_set():
+            resp = None
+            start = time.time()
+            if self.active:
+                try:
+                    resp = self.session.send_request(req)
+                except Exception as e:
+                    self.session.log('Event wait failed: {0}'.format(e))
+            if self._stop.is_set():
+                break
+            if resp is not None and resp.r_code == 0:
+                names = resp.nodes.keys()
+                self.received += len(names)
+                self.notify(names)
+                if not names:
+                    # Don't flood a gateway that returns empty waits
+                    # straight away
+                    remaining = start + self.min_interval - time.time()
+                    if remaining > 0:
+                        self._stop.wait(remaining)
+                continue
+
+            # The subscription is gone (a lost session, or a restarted
+            # gateway): events may have been missed until it is renewed
+            self.active = False
+            self._stop.wait(self.retry_after)
+            if not self._stop.is_set():
+                self._subscribe()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import Queue
+import threading
+
+# Worker threads started per thread pool by default
+DEFAULT_WORKERS = 4
+
+
+class TimeoutError(Exception):
+    """The result of a Future was not ready in time."""
+    pass
+
+
+class Future(object):
+    """The pending result of a call running on a ThreadPool."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        if not self.done():
+            state = 'pending'
+        elif self._exception is not None:
+            state = 'raised %s' % (self._exception.__class__.__name__,)
+        else:
+            state = 'finished'
+        return '<Future %s>' % (state,)
+
+    def done(self):
+        """Returns True if the call has finished (or raised)."""
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Waits for the call to finish and returns its result.
+
+        If the call raised an exception, that exception is raised here.
+
+        Arguments:
+            timeout -- Seconds to wait, None to wait forever
+
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Waits for the call to finish and returns the exception it
+        raised, or None if it returned normally."""
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Calls fn(future) once the call has finished.
+
+        If the call has already finished, fn is called immediately.
+
+        """
+        self._lock.acquire()
+        try:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._lock.release()
+        fn(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        self._lock.acquire()
+        try:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._lock.release()
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                pass
+
+    def _wait(self, timeout):
+        if not self._done.wait(timeout) and not self.done():
+            raise TimeoutError('Result not ready after %s seconds'
+                               % (timeout,))
+
+
+class ThreadPool(object):
+    """A fixed-size pool of worker threads that run submitted calls.
+
+    Workers are started on the first submit() and exit on shutdown().  As
+    they are plain threading threads, they become green threads when the
+    caller runs monkey-patched under eventlet.
+
+    """
+    def __init__(self, workers=DEFAULT_WORKERS):
+        if int(workers) < 1:
+            raise ValueError('workers must be at least 1')
+        self.workers = int(workers)
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<ThreadPool workers:%d pending:%d>' % (self.workers,
+                                                       self._queue.qsize())
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) and return its Future."""
+        future = Future()
+
+        self._lock.acquire()
+        try:
+            if self._shutdown:
+                raise RuntimeError('submit() after shutdown()')
+            self._queue.put((future, fn, args, kwargs))
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker,
+                                     name='vxg-worker-%d'
+                                     % (len(self._threads),))
+                t.daemon = True
+                self._threads.append(t)
+                t.start()
+        finally:
+            self._lock.release()
+
+        return future
+
+    def map(self, fn, *iterables):
+        """Like map(), but runs each call on the pool.
+
+        All calls are submitted before any result is waited on.
+
+        """
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        return [f.result() for f in futures]
+
+    def shutdown(self, wait=True):
+        """Stop the workers once the queued calls have run.
+
+        Arguments:
+            wait -- Block until the workers have exited
+
+        """
+        self._lock.acquire()
+        try:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            threads = list(self._threads)
+        finally:
+            self._lock.release()
+
+        for t in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+def wait_all(futures, timeout=None):
+    """Waits for every future and returns their results in order.
+
+    Every future is waited on even if an earlier one raised, so no call is
+    left running unobserved; the first exception is then raised.
+
+    """
+    results = []
+    error = None
+    for f in futures:
+        e = f.exception(timeout)
+        if e is not None:
+            if error is None:
+                error = e
+            results.append(None)
+        else:
+            results.append(f.result())
+    if error is not None:
+        raise error
+    return results
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets; a last bucket
+# catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0, 30.0)
+
+# Seconds between writes of the exposition file
+DEFAULT_INTERVAL = 60
+
+
+class Metrics(object):
+    """Request counters and latency histograms for XG sessions.
+
+    Requests are counted per gateway host and per operation: the action
+    name for actions, and the request type ('query', 'set', ...) for
+    everything else.  For each, the metrics keep
+
+        - a latency histogram (see LATENCY_BUCKETS) and total
+        - the number of requests, keepalive retries and failures
+        - total request and response bytes
+        - a count of each return code (or exception name)
+
+    Every (host, operation) pair has its own lock, held for a handful of
+    additions per request, so concurrent requests only contend when they
+    are for the same operation on the same gateway.
+
+    snapshot() returns the current values as a dict.  write() saves them
+    to a file as JSON, or in the Prometheus text format, and start()
+    does so periodically in the background.
+
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.started = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+
+    def __repr__(self):
+        return '<Metrics series:%d>' % (len(self._series),)
+
+    def observe(self, host, request, latency, code, bytes_out,
+                bytes_in=None):
+        """Count one request.
+
+        Arguments:
+            host      -- Gateway the request was sent to
+            request   -- The XGRequest
+            latency   -- Seconds the request took
+            code      -- Return code, or the name of the exception raised
+            bytes_out -- Request size
+            bytes_in  -- Response size, if one was received
+
+        """
+        series = self._get_series(host, _operation(request))
+        bucket = bisect.bisect_left(self.buckets, latency)
+        failed = not isinstance(code, (int, long)) or code != 0
+        series.lock.acquire()
+        try:
+            series.count += 1
+            series.latency_sum += latency
+            series.latency[bucket] += 1
+            series.bytes_out += bytes_out
+            if bytes_in is not None:
+                series.bytes_in += bytes_in
+            if failed:
+                series.failures += 1
+            series.codes[code] = series.codes.get(code, 0) + 1
+        finally:
+            series.lock.release()
+
+    def retried(self, host, request):
+        """Count a request being sent again after a keepalive login."""
+        series = self._get_series(host, _operation(request))
+        series.lock.acquire()
+        try:
+            series.retries += 1
+        finally:
+            series.lock.release()
+
+    def snapshot(self):
+        """Returns the metrics as a dict.
+
+        The dict holds "time", "started" and "series", a list with a
+        dict per (host, operation) of the values above.  Each "latency"
+        is a list of [upper bound, cumulative count] pairs, the last of
+        which has a bound of None (infinity).
+
+        """
+        self._lock.acquire()
+        try:
+            items = sorted(self._series.items())
+        finally:
+            self._lock.release()
+
+        bounds = list(self.buckets) + [None]
+        out = []
+        for (host, operation), series in items:
+            series.lock.acquire()
+            try:
+                latency = list(series.latency)
+                values = {'host': host,
+                          'operation': operation,
+                          'count': series.count,
+                          'failures': series.failures,
+                          'retries': series.retries,
+                          'latency_sum': series.latency_sum,
+                          'bytes_out': series.bytes_out,
+                          'bytes_in': series.bytes_in,
+                          'codes': dict((str(k), v)
+                                        for k, v in series.codes.items())}
+            finally:
+                series.lock.release()
+            total = 0
+            values['latency'] = []
+            for bound, count in zip(bounds, latency):
+                total += count
+                values['latency'].append([bound, total])
+            out.append(values)
+
+        return {'time': time.time(), 'started': self.started,
+                'series': out}
+
+    def write(self, path, format='json'):
+        """Save a snapshot to path, replacing it atomically.
+
+        Arguments:
+            path   -- File to write
+            format -- 'json', or 'text' for the Prometheus text format
+
+        """
+        snap = self.snapshot()
+        if format == 'json':
+            data = json.dumps(snap, sort_keys=True, indent=1)
+        elif format == 'text':
+            data = _as_text(snap)
+        else:
+            raise ValueError('Unknown metrics format {0}'.format(format))
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix='.vxg-metrics', dir=dirname)
+        try:
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.chmod(tmp, 0o644)
+            os.rename(tmp, path)
+            tmp = None
+        finally:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def start(self, path, interval=DEFAULT_INTERVAL, format=None):
+        """Write to path every "interval" seconds in the background.
+
+        The format defaults to 'text' for paths ending in ".prom" and
+        'json' otherwise.  The writer runs on a daemon thread until
+        close() is called, and writes once more then.
+
+        """
+        if self._writer is not None:
+            return
+        if format is None:
+            format = 'text' if path.endswith('.prom') else 'json'
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop,
+                                        args=(path, interval, format),
+                                        name='vxg-metrics-writer')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def close(self):
+        """Stops the background writer, if running, once it has written
+        the counters since its last write.
+        """
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            self._stop.set()
+            writer.join()
+
+    def _write_loop(self, path, interval, format):
+        stopping = False
+        while not stopping:
+            self._stop.wait(interval)
+            stopping = self._stop.is_set()
+            try:
+                self.write(path, format)
+            except Exception:
+                # Try again next time; the file is left as it was
+                pass
+
+    def _get_series(self, host, operation):
+        key = (host, operation)
+        series = self._series.get(key)
+        if series is None:
+            self._lock.acquire()
+            try:
+                series = self._series.get(key)
+                if series is None:
+                    series = _Series(len(self.buckets) + 1)
+                    self._series[key] = series
+            finally:
+                self._lock.release()
+        return series
+
+
+class _Series(object):
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.failures = 0
+        self.retries = 0
+        self.latency = [0] * buckets
+        self.latency_sum = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.codes = {}
+
+
+def _operation(request):
+    if request.action is not None:
+        return request.action
+    return request.type
+
+
+def _as_text(snap):
+    """Formats a snapshot in the Prometheus text exposition format."""
+    out = []
+
+    def header(name, kind, help):
+        out.append('# HELP vxg_{0} {1}'.format(name, help))
+        out.append('# TYPE vxg_{0} {1}'.format(name, kind))
+
+    def sample(name, labels, value):
+        out.append('vxg_{0}{{{1}}} {2}'.format(
+            name, ','.join('{0}="{1}"'.format(k, _label(v))
+                           for k, v in labels), value))
+
+    series = [(x, [('host', x['host']), ('operation', x['operation'])])
+              for x in snap['series']]
+
+    for name, field, help in (
+            ('requests_total', 'count', 'Requests sent'),
+            ('failures_total', 'failures', 'Requests without return code 0'),
+            ('retries_total', 'retries', 'Requests resent after a login'),
+            ('bytes_out_total', 'bytes_out', 'Request bytes sent'),
+            ('bytes_in_total', 'bytes_in', 'Response bytes received')):
+        header(name, 'counter', help)
+        for x, labels in series:
+            sample(name, labels, x[field])
+
+    header('return_codes_total', 'counter', 'Responses by return code')
+    for x, labels in series:
+        for code, count in sorted(x['codes'].items()):
+            sample('return_codes_total', labels + [('code', code)], count)
+
+    header('latency_seconds', 'histogram', 'Request latency')
+    for x, labels in series:
+        for bound, count in x['latency']:
+            le = '+Inf' if bound is None else repr(bound)
+            sample('latency_seconds_bucket', labels + [('le', le)], count)
+        sample('latency_seconds_sum', labels, x['latency_sum'])
+        sample('latency_seconds_count', labels, x['count'])
+
+    return '\n'.join(out) + '\n'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
@@ -28,6 +28,21 @@ int_types = ["uint8", "int8", "uint16", "int16",
              "uint32", "int32", "uint64", "int64"]
 float_types = ['float32', 'float64']
 
+_int_types = frozenset(int_types)
+_float_types = frozenset(float_types)
+
+# Types whose values are converted from the text sent by the gateway
+_CONVERTED_TYPES = _int_types | _float_types | frozenset(
+    ['bool', 'date', 'time_sec', 'duration_sec'])
+
+# Placeholder for a value that has not been converted yet
+_PENDING = object()
+
+# Shared defaults for nodes without children or attributes, as XGNode has
+# always shared its default lists.  Don't modify them in place.
+_NO_NODES = []
+_NO_ATTRS = []
+
 
 def _parse_attrs_el(attribs_el):
 
@@ -54,6 +69,24 @@ def _parse_attrs_el(attribs_el):
     return ret_attrs
 
 
+def _escape(text):
+    """Escape text for use as XML character data.
+
+    Non-ASCII characters in unicode text are written as character
+    references, as ElementTree does when serializing to ASCII.
+
+    """
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if isinstance(text, unicode):
+        text = text.encode('ascii', 'xmlcharrefreplace')
+    return text
+
+
 class XGNodeAttr(object):
     """Tall Maple Node Attributes."""
 
@@ -67,16 +100,93 @@ class XGNodeAttr(object):
                 % (self.id, self.type, self.value))
 
 
+def _coerce_value(the_type, value):
+    """Convert a node value to the python type for its TMS type."""
+    if the_type == "bool":
+        if isinstance(value, bool):
+            return value
+        elif str(value).lower() == 'true':
+            return True
+        elif str(value).lower() == 'false':
+            return False
+        else:
+            raise TypeError('Unknown boolean value {0}.'.format(value))
+    elif the_type in _int_types:
+        try:
+            return int(value)
+        except ValueError:
+            raise TypeError('Non integer value %s ' % (value,) +
+                            'provided for type %s.' % (the_type,))
+    elif the_type in _float_types:
+        try:
+            return float(value)
+        except ValueError:
+            raise TypeError('Non float value %s ' % (value,) +
+                            'provided for type %s.' % (the_type,))
+    elif the_type == 'date':
+        if hasattr(value, 'strftime') and callable(value.strftime):
+            return value.strftime('%Y/%m/%d')
+        else:
+            return str(value)
+    elif the_type == 'time_sec':
+        if hasattr(value, 'strftime') and callable(value.strftime):
+            return value.strftime('%H:%M:%S')
+        else:
+            return str(value)
+    elif the_type == 'duration_sec':
+        try:
+            # Handle ints and strings that are actually an int
+            return int(value)
+        except ValueError:
+            # Handle 1w2d3h4m5s type strings
+            remainder = value.lower()
+            timedelta_params = {}
+            for key in ['weeks', 'days', 'hours', 'minutes', 'seconds']:
+                field = key[0]
+                elms = remainder.split(key[0])
+                if len(elms) == 1:
+                    pass
+                elif len(elms) == 2:
+                    timedelta_params[key] = int(elms[0])
+                    remainder = elms[1]
+                else:
+                    raise ValueError('Improperly formatted duration: ' +
+                                     value)
+            if remainder:
+                raise ValueError('Improperly formatted duration: ' +
+                                 value)
+            delta = datetime.timedelta(**timedelta_params)
+            return delta.seconds + delta.days * 86400
+    else:
+        return value
+
+
+def _intern(text):
+    """Intern node names and types, which repeat across responses."""
+    if text.__class__ is str:
+        return intern(text)
+    return text
+
+
 class XGNode(object):
-    """Representation of Tall Maple Node."""
+    """Representation of Tall Maple Node.
+
+    Nodes built from a response (see from_response()) keep the value as
+    the text the gateway sent, and only convert it to the node's type
+    when "value" is first read.
+
+    """
+    __slots__ = ('name', 'type', 'nodes', 'node_id', 'attrs', 'flags',
+                 'subop', '_value', '_raw')
 
     def __init__(self, name='', type='string', value='', node_id='',
-                 nodes=[], flags=None, subop=None, attrs=[]):
+                 nodes=_NO_NODES, flags=None, subop=None, attrs=_NO_ATTRS):
         self.type = type
         self.nodes = nodes     # Child nodes of this node (in tree form)
         self.node_id = node_id
         # TODO(gfreeman): If attrs is list, process into dict by attr id
         self.attrs = attrs
+        self._raw = None
 
         name_flags = []
         name_subop = None
@@ -90,63 +200,7 @@ class XGNode(object):
             name_subop = 'iterate'
         self.name = name.rstrip('/*')
 
-        if type == "bool":
-            if isinstance(value, bool):
-                self.value = value
-            elif str(value).lower() == 'true':
-                self.value = True
-            elif str(value).lower() == 'false':
-                self.value = False
-            else:
-                raise TypeError('Unknown boolean value {0}.'.format(value))
-        elif type in int_types:
-            try:
-                self.value = int(value)
-            except ValueError:
-                raise TypeError('Non integer value %s ' % (value,) +
-                                'provided for type %s.' % (type,))
-        elif type in float_types:
-            try:
-                self.value = float(value)
-            except ValueError:
-                raise TypeError('Non float value %s ' % (value,) +
-                                'provided for type %s.' % (type,))
-        elif type == 'date':
-            if hasattr(value, 'strftime') and callable(value.strftime):
-                self.value = value.strftime('%Y/%m/%d')
-            else:
-                self.value = str(value)
-        elif type == 'time_sec':
-            if hasattr(value, 'strftime') and callable(value.strftime):
-                self.value = value.strftime('%H:%M:%S')
-            else:
-                self.value = str(value)
-        elif type == 'duration_sec':
-            try:
-                # Handle ints and strings that are actually an int
-                self.value = int(value)
-            except ValueError:
-                # Handle 1w2d3h4m5s type strings
-                remainder = value.lower()
-                timedelta_params = {}
-                for key in ['weeks', 'days', 'hours', 'minutes', 'seconds']:
-                    field = key[0]
-                    elms = remainder.split(key[0])
-                    if len(elms) == 1:
-                        pass
-                    elif len(elms) == 2:
-                        timedelta_params[key] = int(elms[0])
-                        remainder = elms[1]
-                    else:
-                        raise ValueError('Improperly formatted duration: ' +
-                                         value)
-                if remainder:
-                    raise ValueError('Improperly formatted duration: ' +
-                                     value)
-                delta = datetime.timedelta(**timedelta_params)
-                self.value = delta.seconds + delta.days * 86400
-        else:
-            self.value = value
+        self._value = _coerce_value(type, value)
 
         self.flags = flags
         if len(name_flags) > 0:
@@ -167,6 +221,49 @@ class XGNode(object):
             else:
                 self.subop = name_subop
 
+    @property
+    def value(self):
+        """The node value, converted to the python type for its type."""
+        value = self._value
+        if value is _PENDING:
+            value = self._value = _coerce_value(self.type, self._raw)
+            self._raw = None
+        return value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self._raw = None
+
+    @classmethod
+    def from_response(cls, name, type, value, node_id='', nodes=_NO_NODES,
+                      attrs=_NO_ATTRS):
+        """Create a node from the text of a response.
+
+        Unlike the constructor, this does not convert the value until it
+        is read, and interns the name and type.  A bad value therefore
+        raises TypeError when "value" is read rather than here.
+
+        """
+        if name[-1:] in ('/', '*'):
+            # Needs the constructor's name flag handling
+            return cls(name, type, value, node_id, nodes, attrs=attrs)
+        node = cls.__new__(cls)
+        node.name = _intern(name)
+        node.type = _intern(type)
+        node.nodes = nodes
+        node.node_id = node_id
+        node.attrs = attrs
+        node.flags = None
+        node.subop = None
+        if type in _CONVERTED_TYPES:
+            node._value = _PENDING
+            node._raw = value
+        else:
+            node._value = value
+            node._raw = None
+        return node
+
     def as_element_tree(self, theType):
         node = ET.Element('node')
         if self.subop is not None:
@@ -189,6 +286,33 @@ class XGNode(object):
                 handler.text = str(self.value)
         return node
 
+    def as_xml(self, theType):
+        """Return this node as a compact XML string.
+
+        This is the serialized form of as_element_tree(theType).
+
+        """
+        out = ['<node>']
+        if self.subop is not None:
+            out.extend(('<subop>', _escape(self.subop), '</subop>'))
+        if self.flags is not None and len(self.flags) > 0:
+            out.append('<flags>')
+            for f in self.flags:
+                out.extend(('<flag>', _escape(f), '</flag>'))
+            out.append('</flags>')
+        out.extend(('<name>', _escape(self.name), '</name>'))
+        if theType != 'query':
+            if self.type == 'bool':
+                value = str(self.value).lower()
+            elif isinstance(self.value, basestring):
+                value = self.value
+            else:
+                value = str(self.value)
+            out.extend(('<type>', _escape(self.type), '</type>',
+                        '<value>', _escape(value), '</value>'))
+        out.append('</node>')
+        return ''.join(out)
+
     def __repr__(self):
         return ('<XGNode name:%s ' % (self.name,) +
                 'type:%s ' % (self.type,) +
@@ -215,7 +339,7 @@ class XGNode(object):
         node_value = None
         node_type = "unknown"
         node_list = []
-        node_attrs = []
+        node_attrs = _NO_ATTRS
         node_dict = {}
 
         if node_el.tag != "node":
@@ -276,9 +400,9 @@ class XGNode(object):
 
             # Return a dict containing XGNodes keyed to node name.
             # Nodes without names will not be returned.
-            node = XGNode(name=node_name, type=node_type,
-                          value=node_value, node_id=node_id,
-                          nodes=[], attrs=node_attrs)
+            node_name = _intern(node_name)
+            node = cls.from_response(node_name, node_type, node_value,
+                                     node_id, attrs=node_attrs)
 
             node_dict[node_name] = node
 
@@ -288,9 +412,8 @@ class XGNode(object):
             # Return a single node object that contains any subnodes as
             # objects in the parent node's nodes element.
 
-            return XGNode(name=node_name, type=node_type,
-                          value=node_value, node_id=node_id,
-                          nodes=node_list, attrs=node_attrs)
+            return cls.from_response(node_name, node_type, node_value,
+                                     node_id, node_list, node_attrs)
 
     @classmethod
     def as_node_list(cls, name, the_type, value):
@@ -330,6 +453,12 @@ class XGNode(object):
         if not isinstance(src, XGNode):
             raise ValueError('Expecting XGNode, got {0}'.format(
                              src.__class__.__name__))
+        if src._value is _PENDING:
+            # Don't convert the value just to copy it
+            node = cls.__new__(cls)
+            for field in XGNode.__slots__:
+                setattr(node, field, getattr(src, field))
+            return node
         return cls(src.name, src.type, src.value, src.node_id,
                    src.nodes, src.flags, src.subop, src.attrs)
 
@@ -471,6 +600,19 @@ class XGNodeDict(object):
         # Implements: len(xgd)
         return len(self.__data)
 
+    @property
+    def values_only(self):
+        """True if lookups return node values rather than XGNodes."""
+        return self.__values_only
+
+    def get_node(self, key):
+        """Returns the XGNode for the given key, whatever "values_only" is.
+
+        Raises KeyError if the key does not exist.
+
+        """
+        return self.__data[key]
+
     def add_node(self, node):
         """Adds an XGNode to this XGNodeDict.
 
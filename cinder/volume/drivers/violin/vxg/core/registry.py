@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+
+class SessionRegistry(object):
+    """Reference counted registry of open connections.
+
+    Connections are keyed by (host, user, proto).  The first open() of a
+    key creates the connection, later ones share it, and it is closed
+    once every handle to it has been closed (or garbage collected).
+
+    A connection is only shared with callers giving the same password
+    and settings (such as the tracer, metrics and number of workers the
+    connection is opened with); anyone else gets a private connection of
+    their own, which is not registered.
+
+    Connections for different keys are opened concurrently; callers
+    opening the same key wait for the first to finish.
+
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<SessionRegistry entries:%d>' % (len(self._entries),)
+
+    def open(self, key, password, factory, settings=None):
+        """Returns a handle to the connection for key.
+
+        Arguments:
+            key      -- (host, user, proto) tuple
+            password -- Password the connection is (to be) opened with
+            factory  -- Called with no arguments to open the connection,
+                        returning None on failure
+            settings -- Anything else the connection is opened with,
+                        compared with ==
+
+        Returns:
+            A SharedConnection, an unshared connection if the password or
+            settings do not match, or None if the connection could not be
+            opened.
+
+        """
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(password, settings)
+                self._entries[key] = entry
+            elif entry.password != password or entry.settings != settings:
+                entry = None
+            else:
+                # Hold the entry open while waiting for it to be created
+                entry.refs += 1
+        finally:
+            self._lock.release()
+
+        if entry is None:
+            return factory()
+
+        entry.lock.acquire()
+        try:
+            if entry.conn is None:
+                try:
+                    entry.conn = factory()
+                except Exception:
+                    self._release(key, entry)
+                    raise
+                if entry.conn is None:
+                    self._release(key, entry)
+                    return None
+            conn = entry.conn
+        finally:
+            entry.lock.release()
+
+        return SharedConnection(self, key, entry, conn)
+
+    def stats(self):
+        """Returns a dict of key to reference count."""
+        self._lock.acquire()
+        try:
+            return dict((key, entry.refs)
+                        for key, entry in self._entries.items())
+        finally:
+            self._lock.release()
+
+    def _release(self, key, entry):
+        self._lock.acquire()
+        try:
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            conn, entry.conn = entry.conn, None
+        finally:
+            self._lock.release()
+
+        if conn is not None:
+            conn.close()
+
+
+class _Entry(object):
+    def __init__(self, password, settings):
+        self.password = password
+        self.settings = settings
+        self.refs = 1
+        self.conn = None
+        self.lock = threading.Lock()
+
+
+class SharedConnection(object):
+    """One user's handle to a connection in a SessionRegistry.
+
+    Everything but close() is passed through to the connection.  close()
+    only drops this handle's reference; the connection itself is closed
+    when the last handle is.
+
+    """
+    def __init__(self, registry, key, entry, conn):
+        self._registry = registry
+        self._key = key
+        self._entry = entry
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise AttributeError('{0} (connection handle closed)'.format(
+                                 name))
+        return getattr(conn, name)
+
+    def __repr__(self):
+        return '<SharedConnection %r>' % (self._conn,)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release this handle."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._registry._release(self._key, self._entry)
+
+
+# Registry used by vxg.open(shared=True)
+default = SessionRegistry()
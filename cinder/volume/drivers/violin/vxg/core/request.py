@@ -22,6 +22,12 @@ from xml.dom import minidom
 import xml.etree.ElementTree as ET
 
 from cinder.volume.drivers.violin.vxg.core.error import *
+from cinder.volume.drivers.violin.vxg.core.node import _escape
+from cinder.volume.drivers.violin.vxg.core.node import float_types
+from cinder.volume.drivers.violin.vxg.core.node import int_types
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
 
 
 class XGRequest(object):
@@ -62,17 +68,40 @@ class XGRequest(object):
         return ('<XGRequest type:%s action:%s nodes:%r>'
                 % (self.type, self.action, self.nodes))
 
-    def to_xml(self, pretty_print=True):
+    def to_xml(self, pretty_print=False):
         """Return an XML document describing this XGRequest.
 
         Arguments:
             pretty_print    -- Get a properly formatted XML doc as opposed
-                               to a single-line string with XML tags (bool)
+                               to a compact one with no whitespace between
+                               tags (bool)
 
         Returns:
             This request object as an XML string.
 
         """
+        if pretty_print:
+            return self._pretty_print(self._to_element_tree())
+
+        # Write the compact form directly rather than through an element
+        # tree, as this is done for every request sent.
+        out = [XML_DECLARATION, '<xg-request><', self.type, '-request>']
+        if self.action is not None:
+            out.extend(('<action-name>', _escape(self.action),
+                        '</action-name>'))
+        if self.event is not None:
+            out.extend(('<event-name>', _escape(self.event),
+                        '</event-name>'))
+        if len(self.nodes) > 0:
+            out.append('<nodes>')
+            for n in self.nodes:
+                out.append(n.as_xml(self.type))
+            out.append('</nodes>')
+        out.extend(('</', self.type, '-request></xg-request>'))
+        return ''.join(out)
+
+    def _to_element_tree(self):
+        """Return this XGRequest as an xml.etree.Element."""
         root = ET.Element('xg-request')
         req = ET.SubElement(root, '%s-request' % (self.type,))
         if self.action is not None:
@@ -85,11 +114,7 @@ class XGRequest(object):
             nodes = ET.SubElement(req, 'nodes')
             for n in self.nodes:
                 nodes.append(n.as_element_tree(self.type))
-
-        if pretty_print:
-            return self._pretty_print(root)
-        else:
-            return ET.tostring(root)
+        return root
 
     def _pretty_print(self, node):
         """Return a properly formatted XML document with newlines and
@@ -178,8 +203,9 @@ class XGEvent(XGRequest):
     """Class for XML Gateway events.
 
     """
-    def __init__(self, *args, **kwargs):
-        raise Exception("Not yet implemented.")
+    def __init__(self, event, nodes=[], flat=False, values_only=False):
+        super(XGEvent, self).__init__('event', nodes, event=event,
+                                      flat=flat, values_only=values_only)
 
 
 class XGSet(XGRequest):
@@ -191,6 +217,248 @@ class XGSet(XGRequest):
                                     flat=flat, values_only=values_only)
 
 
+class XGActionTemplate(object):
+    """A pre-compiled action request.
+
+    The XML for the fixed parts of the action (the action name, and the
+    name and type of every node) is rendered once, when the template is
+    created.  bind() then only has to convert and escape the values that
+    change from call to call.  Templates are immutable and are meant to
+    be created once, as class attributes of the managers using them.
+
+    Fields are given as tuples, in the order they are sent:
+
+        (name, type)        -- A value passed to bind() as "name"
+        (name, type, value) -- A fixed value, rendered once
+
+    A name in the form "names/{0}" is a list field, bound as "names" to
+    a string or a list of strings, as with XGNode.as_node_list().
+
+    Fields listed in "optional" are left out of the request when bound to
+    None (or not bound at all).  List fields bound to None are left out
+    too, as they are by XGNode.as_node_list().
+
+    Example:
+        create = XGActionTemplate('/vshare/actions/iscsi/target/create',
+                                  [('target', 'string'),
+                                   ('create', 'bool')])
+        req = create.bind(target='foo', create=True)
+
+    """
+    def __init__(self, action, fields, optional=()):
+        self.action = action
+        self._head = ''.join((XML_DECLARATION,
+                              '<xg-request><action-request><action-name>',
+                              _escape(action), '</action-name>'))
+        self._fields = []
+        self._keys = set()
+        optional = set(optional)
+
+        fixed = []
+        for f in fields:
+            if len(f) == 3:
+                fixed.append(XGNode(f[0], f[1], f[2]))
+                continue
+            name, the_type = f
+            if '{0}' in name:
+                key = name.split('/')[0]
+                render = _ListField(name, the_type)
+            else:
+                key = name
+                render = _Field(name, the_type)
+            if key in self._keys:
+                raise TypeError('Duplicate field %s' % (key,))
+            if fixed:
+                self._fields.append((None, _FixedNodes(fixed), False))
+                fixed = []
+            self._fields.append((key, render,
+                                 key in optional or render.is_list))
+            self._keys.add(key)
+        if fixed:
+            self._fields.append((None, _FixedNodes(fixed), False))
+
+        unknown = optional - self._keys
+        if unknown:
+            raise TypeError('Unknown optional fields: %s'
+                            % (', '.join(sorted(unknown)),))
+
+    def __repr__(self):
+        return '<XGActionTemplate action:%s fields:%s>' % (
+            self.action, ','.join(x[0] for x in self._fields if x[0]))
+
+    def bind(self, **values):
+        """Fill in the variable fields.
+
+        Arguments:
+            values -- The field values, by field name
+
+        Returns:
+            An XGAction that can be sent like any other.
+
+        """
+        unknown = set(values) - self._keys
+        if unknown:
+            raise TypeError('Unknown fields for %s: %s'
+                            % (self.action, ', '.join(sorted(unknown))))
+
+        out = [self._head, '<nodes>']
+        for key, render, optional in self._fields:
+            if key is None:
+                out.append(render.xml)
+                continue
+            value = values.get(key)
+            if value is None:
+                if optional:
+                    continue
+                raise TypeError('Missing value for field %s of %s'
+                                % (key, self.action))
+            out.append(render(value))
+        out.append('</nodes></action-request></xg-request>')
+        return XGBoundAction(self, values, ''.join(out))
+
+    def nodes(self, values):
+        """Returns the XGNodes bind(**values) would send."""
+        ret = []
+        for key, render, optional in self._fields:
+            if key is None:
+                ret.extend(render.nodes)
+                continue
+            value = values.get(key)
+            if value is None:
+                continue
+            ret.extend(render.as_nodes(value))
+        return ret
+
+
+class XGBoundAction(XGAction):
+    """An action request created by XGActionTemplate.bind().
+
+    The compact XML was written when the template was bound.  The node
+    list is only built on demand, for debug logging and the like.
+
+    """
+    def __init__(self, template, values, xml):
+        super(XGBoundAction, self).__init__(template.action, None)
+        self.template = template
+        self.values = values
+        self._xml = xml
+
+    @property
+    def nodes(self):
+        if self._nodes is None:
+            self._nodes = self.template.nodes(self.values)
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, value):
+        self._nodes = value
+
+    def to_xml(self, pretty_print=False):
+        if pretty_print:
+            return super(XGBoundAction, self).to_xml(pretty_print)
+        return self._xml
+
+
+class _FixedNodes(object):
+    """A run of fixed value nodes of an XGActionTemplate."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.xml = ''.join(x.as_xml('action') for x in nodes)
+
+
+class _Field(object):
+    """Renders one variable node of an XGActionTemplate."""
+
+    is_list = False
+
+    def __init__(self, name, the_type):
+        self.name = name
+        self.type = the_type
+        self._head = ''.join(('<node><name>', _escape(name), '</name>',
+                              '<type>', _escape(the_type), '</type><value>'))
+        self._convert = _converter(the_type)
+
+    def __call__(self, value):
+        return ''.join((self._head, self._value(value), '</value></node>'))
+
+    def _value(self, value):
+        if self._convert is None:
+            # Leave the less common types to XGNode
+            node = XGNode(self.name, self.type, value)
+            return _escape(str(node.value))
+        return self._convert(value)
+
+    def as_nodes(self, value):
+        return [XGNode(self.name, self.type, value)]
+
+
+class _ListField(_Field):
+    """Renders a "name/{0}" list of nodes of an XGActionTemplate."""
+
+    is_list = True
+
+    def __call__(self, value):
+        if isinstance(value, basestring):
+            value = [value]
+        elif not isinstance(value, list):
+            raise ValueError('Field "{0}" must be a string or list'.format(
+                             self.name.split('/')[0]))
+        out = []
+        for one_value in value:
+            out.extend(('<node><name>', _escape(self.name.format(one_value)),
+                        '</name><type>', _escape(self.type),
+                        '</type><value>', self._value(one_value),
+                        '</value></node>'))
+        return ''.join(out)
+
+    def as_nodes(self, value):
+        return XGNode.as_node_list(self.name, self.type, value)
+
+
+def _convert_string(value):
+    if not isinstance(value, basestring):
+        value = str(value)
+    return _escape(value)
+
+
+def _convert_bool(value):
+    if value is True or value is False:
+        return 'true' if value else 'false'
+    value = str(value).lower()
+    if value not in ('true', 'false'):
+        raise TypeError('Unknown boolean value {0}.'.format(value))
+    return value
+
+
+def _convert_int(value):
+    try:
+        return str(int(value))
+    except ValueError:
+        raise TypeError('Non integer value %s provided.' % (value,))
+
+
+def _convert_float(value):
+    try:
+        return str(float(value))
+    except ValueError:
+        raise TypeError('Non float value %s provided.' % (value,))
+
+
+def _converter(the_type):
+    """Returns the function writing a value of this type, as XGNode
+    would, or None if XGNode should be used."""
+    if the_type == 'bool':
+        return _convert_bool
+    elif the_type in int_types:
+        return _convert_int
+    elif the_type in float_types:
+        return _convert_float
+    elif the_type in ('date', 'time_sec', 'duration_sec'):
+        return None
+    return _convert_string
+
+
 class BasicJsonRequest(urllib2.Request):
     """A basic JSON request.
 
@@ -17,12 +17,26 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import httplib
+import socket
 import xml.etree.ElementTree as ET
 
+from cinder.volume.drivers.violin.vxg.core.node import _intern
+from cinder.volume.drivers.violin.vxg.core.node import _NO_ATTRS
 from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.node import XGNodeAttr
 from cinder.volume.drivers.violin.vxg.core.node import XGNodeDict
 from cinder.volume.drivers.violin.vxg.core.error import *
 
+# The C parser calls back into the decoder faster, where there is one
+try:
+    import xml.etree.cElementTree as cET
+    _XMLParser = cET.XMLParser
+    _XML_PARSE_ERRORS = (ET.ParseError, cET.ParseError)
+except ImportError:
+    _XMLParser = ET.XMLParser
+    _XML_PARSE_ERRORS = (ET.ParseError,)
+
 
 class XGResponse(object):
     """Response from XML gateway."""
@@ -53,6 +67,20 @@ class XGResponse(object):
         Returns:
             XGResponse object
 
+        """
+        decoder = _ResponseDecoder(request, request.flat, strip)
+        decoder.feed(xml_str)
+        decoder.close()
+        return decoder.response()
+
+    @classmethod
+    def _fromstring_etree(cls, request, xml_str, strip=None):
+        """Element tree based version of fromstring().
+
+        This was the parser before fromstring() was changed to decode the
+        response in a single pass.  It is kept to check the two against
+        each other.
+
         """
 
         root_el = ET.fromstring(xml_str)
@@ -82,7 +110,6 @@ class XGResponse(object):
 
             # Parse response
 
-            # TODO(gfreeman):  Refactor to not use find() ... loop through once
             ret_status_el = xg_resp_el.find("return-status")
             if ret_status_el is None:
                 raise ParseError("Missing return-status field.")
@@ -150,3 +177,374 @@ class XGResponse(object):
     def as_action_result(self):
         """Return a REST Action's response's code and message."""
         return {'code': self.r_code, 'message': self.r_msg}
+
+
+class XGResponseStream(object):
+    """Incrementally decodes the nodes of an XG response.
+
+    The response is read from a file-like object (such as the HTTP
+    response) "chunk_size" bytes at a time and fed to the same decoder
+    fromstring() uses, so no element tree is built at all.  Iterating
+    yields each named node as a flat XGNode as soon as its element
+    closes; only the nodes decoded from the chunk just read are held in
+    memory.
+
+    The return code, message and db revision are filled in as they are
+    seen, so are only reliable once iteration has finished.  "count" is
+    the number of nodes yielded so far.
+
+    """
+    chunk_size = 16384
+
+    def __init__(self, request, fp, strip=None):
+        self.request = request
+        self.fp = fp
+        self.count = 0
+        self.bytes_read = 0
+        self._ready = []
+        self._decoder = _ResponseDecoder(request, True, strip,
+                                         self._emit)
+
+    def __repr__(self):
+        return '<XGResponseStream type:%s count:%d>' % (self.type,
+                                                        self.count)
+
+    @property
+    def type(self):
+        return self._decoder.type
+
+    @property
+    def r_code(self):
+        return self._decoder.r_code
+
+    @property
+    def r_msg(self):
+        return self._decoder.r_msg or ""
+
+    @property
+    def db_rev(self):
+        return self._decoder.db_rev
+
+    def __iter__(self):
+        try:
+            while True:
+                try:
+                    chunk = self.fp.read(self.chunk_size)
+                except (httplib.HTTPException, socket.error) as e:
+                    raise NetworkError('{0}: {1}'.format(
+                                       e.__class__.__name__, e))
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                self._decoder.feed(chunk)
+                for node in self._drain():
+                    yield node
+            self._decoder.close()
+            for node in self._drain():
+                yield node
+        finally:
+            self.close()
+
+    def close(self):
+        """Release the underlying file-like object."""
+        fp, self.fp = self.fp, None
+        if fp is not None:
+            fp.close()
+
+    def _emit(self, name, node):
+        self._ready.append(node)
+
+    def _drain(self):
+        ready, self._ready = self._ready, []
+        self.count += len(ready)
+        return ready
+
+
+# Decoder states, one per element being parsed
+(_SKIP, _ROOT, _STATUS, _STATUS_MSG, _STATUS_CODE, _RESPONSE,
+ _RETURN_STATUS, _RETURN_CODE, _RETURN_MSG, _DB_REV, _NODES, _NODE,
+ _BINDING, _NODE_ID, _NODE_NAME, _NODE_TYPE, _NODE_VALUE, _ATTRIBS,
+ _ATTRIB, _ATTRIB_FIELD) = range(20)
+
+# Elements whose text is kept, and the node field (or attrib field) each
+# one sets
+_NODE_FIELDS = {_NODE_ID: 0, _NODE_NAME: 1, _NODE_TYPE: 2, _NODE_VALUE: 3}
+_TEXT_STATES = frozenset([_STATUS_MSG, _STATUS_CODE, _RETURN_CODE,
+                          _RETURN_MSG, _DB_REV, _ATTRIB_FIELD] +
+                         list(_NODE_FIELDS))
+
+_NODE_CHILDREN = {'node-id': _NODE_ID, 'name': _NODE_NAME,
+                  'type': _NODE_TYPE, 'value': _NODE_VALUE,
+                  'node': _NODE, 'binding': _BINDING, 'attribs': _ATTRIBS}
+_BINDING_CHILDREN = {'name': _NODE_NAME, 'type': _NODE_TYPE,
+                     'value': _NODE_VALUE, 'attribs': _ATTRIBS}
+_RESPONSE_CHILDREN = {'return-status': _RETURN_STATUS,
+                      'db-revision-id': _DB_REV, 'nodes': _NODES}
+_ATTRIB_FIELDS = ('attribute-id', 'type', 'value')
+
+
+class _ResponseDecoder(object):
+    """Decodes an xg-response in a single pass over the parser events.
+
+    Each start tag moves the decoder into a new state, chosen from the
+    state of the enclosing element, and each end tag acts on the state
+    it closes: fields are stored, and a node is built as soon as its
+    element closes.  No element tree is built, and nothing is looked up
+    twice.
+
+    In flat mode each named node is handed to emit(name, node) when it is
+    complete (children before their parent, as parse_el() orders them);
+    by default they are collected for response().  In tree mode nodes are
+    attached to their parent, and the top level nodes are collected.
+
+    The grammar and error handling follow _fromstring_etree(), except
+    that malformed XML raises ParseError.
+
+    """
+    def __init__(self, request, flat, strip=None, emit=None):
+        self.request = request
+        self.flat = flat
+        if strip is not None and strip[-1] != '/':
+            strip += '/'
+        self.strip = strip
+        self.type = None
+        self.r_code = None
+        self.r_msg = None
+        self.db_rev = 0
+
+        self._response_tag = "%s-response" % (request.type,)
+        self._seen = set()
+        self._states = []
+        self._text = None
+        self._text_done = False
+        self._error = None
+        self._frames = []
+        self._attrs = None
+        self._attr = None
+        if emit is None:
+            self._nodes_d = {}
+            emit = self._nodes_d.__setitem__
+        self._emit = emit
+        self._nodes_l = []
+
+        self._parser = _XMLParser(target=_ParserTarget(self))
+
+    def feed(self, data):
+        try:
+            self._parser.feed(data)
+        except _XML_PARSE_ERRORS as e:
+            raise ParseError(str(e))
+        self._check_error()
+
+    def close(self):
+        """Finish parsing, and check the response was complete."""
+        try:
+            self._parser.close()
+        except _XML_PARSE_ERRORS as e:
+            raise ParseError(str(e))
+        self._check_error()
+        if self.type is None:
+            raise ParseError("Not xg-response")
+        if self.type == "status":
+            if self.r_msg == "Not authenticated":
+                raise AuthenticationError(self.r_msg)
+            if self.r_code is None:
+                raise ParseError("Missing status-code field.")
+        else:
+            if _RETURN_STATUS not in self._seen:
+                raise ParseError("Missing return-status field.")
+            if self.r_code is None:
+                raise ParseError("Missing return-code field.")
+            if _RETURN_MSG not in self._seen:
+                self.r_msg = ""
+
+    def _check_error(self):
+        # Not every parser passes on what a callback raises, and events
+        # are ignored after the first error, so raise it from here too
+        if self._error is not None:
+            raise self._error
+
+    def response(self):
+        """Returns the XGResponse, once close() has been called."""
+        if self.type == "status":
+            return XGResponse("status", self.r_code, self.r_msg)
+        if self.flat:
+            nodes = XGNodeDict(self._nodes_d, self.request.values_only)
+        else:
+            nodes = self._nodes_l
+        return XGResponse(self.type, self.r_code, self.r_msg,
+                          self.db_rev, nodes)
+
+    # Parser target callbacks
+
+    def _start(self, tag, attrib):
+        if self._error is not None:
+            return
+        try:
+            states = self._states
+            if not states:
+                if tag != "xg-response":
+                    raise ParseError("Not xg-response")
+                states.append(_ROOT)
+                return
+
+            state = states[-1]
+            if state == _NODE:
+                new = _NODE_CHILDREN.get(tag)
+                if new is None:
+                    raise ParseError("Unexpected subelement " +
+                                     "'%s' found while parsing node element."
+                                     % (tag,))
+                if new == _NODE:
+                    self._frames.append(self._new_frame())
+            elif state == _NODES:
+                if tag != "node":
+                    raise ParseError("Unexpected subelement '%s'" % (tag,))
+                new = _NODE
+                self._frames.append(self._new_frame())
+            elif state == _BINDING:
+                new = _BINDING_CHILDREN.get(tag)
+                if new is None:
+                    raise ParseError("Unexpected sub-element " +
+                                     "'%s' in binding element." % (tag,))
+            elif state == _ATTRIBS:
+                new = _ATTRIB
+                self._attr = {}
+            elif state == _ATTRIB:
+                new = _ATTRIB_FIELD if tag in _ATTRIB_FIELDS else _SKIP
+            elif state == _RESPONSE:
+                # As with find(), only the first of each is used
+                new = _RESPONSE_CHILDREN.get(tag, _SKIP)
+                if new in self._seen:
+                    new = _SKIP
+                self._seen.add(new)
+            elif state == _RETURN_STATUS:
+                if tag == "return-code":
+                    new = _RETURN_CODE
+                elif tag == "return-msg":
+                    new = _RETURN_MSG
+                else:
+                    new = _SKIP
+                if new in self._seen:
+                    new = _SKIP
+                self._seen.add(new)
+            elif state == _STATUS:
+                if tag == "status-msg":
+                    new = _STATUS_MSG
+                elif tag == "status-code":
+                    new = _STATUS_CODE
+                else:
+                    raise ParseError("Unknown status field.")
+            elif state == _ROOT:
+                if self.type is not None:
+                    # Only the first response element counts
+                    new = _SKIP
+                elif tag == "xg-status":
+                    self.type = "status"
+                    new = _STATUS
+                elif tag == self._response_tag:
+                    self.type = self.request.type
+                    new = _RESPONSE
+                else:
+                    raise ParseError("Response type mismatch.")
+            else:
+                # Inside an element holding text, or one being skipped; as
+                # with an element's text, only the text before this counts
+                if self._text is not None:
+                    self._text_done = True
+                new = _SKIP
+
+            if new in _TEXT_STATES:
+                self._text = []
+                self._text_done = False
+            elif new == _ATTRIBS:
+                self._attrs = {}
+            states.append(new)
+        except Exception as e:
+            self._error = e
+            raise
+
+    def _data(self, data):
+        if self._text is not None and not self._text_done:
+            self._text.append(data)
+
+    def _end(self, tag):
+        if self._error is not None:
+            return
+        try:
+            state = self._states.pop()
+            if state in _TEXT_STATES:
+                text = "".join(self._text) if self._text else None
+                self._text = None
+            elif state == _SKIP:
+                return
+            else:
+                text = None
+
+            if state == _NODE:
+                self._end_node(self._frames.pop())
+            elif state in _NODE_FIELDS:
+                self._frames[-1][_NODE_FIELDS[state]] = text
+            elif state == _ATTRIB_FIELD:
+                self._attr.setdefault(tag, text)
+            elif state == _ATTRIB:
+                attr = self._attr
+                self._attr = None
+                try:
+                    self._attrs[attr["attribute-id"]] = XGNodeAttr(
+                        attr["attribute-id"], attr["type"], attr["value"])
+                except KeyError:
+                    raise ParseError("Missing element in <attrib>.")
+            elif state == _ATTRIBS:
+                self._frames[-1][4] = self._attrs
+                self._attrs = None
+            elif state == _RETURN_CODE or state == _STATUS_CODE:
+                self.r_code = int(text)
+            elif state == _RETURN_MSG or state == _STATUS_MSG:
+                self.r_msg = text
+            elif state == _DB_REV:
+                if text is not None:
+                    if not text.isdigit():
+                        raise ParseError("Non-numeric db-revision-id")
+                    self.db_rev = int(text)
+        except Exception as e:
+            self._error = e
+            raise
+
+    def _new_frame(self):
+        # node-id, name, type, value, attrs and, in tree mode, children
+        return ["", "", "unknown", None, _NO_ATTRS,
+                None if self.flat else []]
+
+    def _end_node(self, frame):
+        node_id, name, the_type, value, attrs, children = frame
+        if name is None:
+            name = ""
+        if self.strip is not None and name.startswith(self.strip):
+            name = name[len(self.strip):]
+
+        if self.flat:
+            # Nodes without names are not returned
+            if name != "":
+                name = _intern(name)
+                self._emit(name, XGNode.from_response(name, the_type, value,
+                                                      node_id, attrs=attrs))
+        else:
+            node = XGNode.from_response(name, the_type, value, node_id,
+                                        children, attrs)
+            if self._frames:
+                self._frames[-1][5].append(node)
+            else:
+                self._nodes_l.append(node)
+
+
+class _ParserTarget(object):
+    """Hands XMLParser events to a decoder's callbacks."""
+
+    def __init__(self, decoder):
+        self.start = decoder._start
+        self.data = decoder._data
+        self.end = decoder._end
+
+    def close(self):
+        return None
@@ -64,6 +64,11 @@ class RestObject(object):
         '''If the connection is believed open or not.'''
         return self.basic.closed
 
+    @property
+    def version_info(self):
+        '''The version info dict the object was created for.'''
+        return self._version_info
+
     def __repr__(self):
         values = ['<{0}'.format(self.__class__.__name__),
                   'host:{0}'.format(self.basic.host),
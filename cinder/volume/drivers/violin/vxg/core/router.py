@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+# Weight given to each new sample in the moving averages
+SMOOTHING = 0.2
+
+# Seconds a failed gateway is passed over before it is tried again
+RETRY_AFTER = 30
+
+# Node queried by the background health probe
+PROBE_NODE = '/system/hostname'
+
+
+class GatewayRouter(object):
+    """Sends queries to the fastest healthy gateway.
+
+    The router wraps the XGSessions of a set of gateways that serve the
+    same data, such as an array's VIP and its two management gateways.
+    It keeps a moving average of each gateway's round trip time and error
+    rate, measured on the queries it routes and on an optional background
+    probe, and sends each query to the gateway with the lowest round trip
+    time (scaled up by its error rate).  A gateway whose last request
+    failed is passed over for "retry_after" seconds, or until a probe
+    succeeds.  If a query fails, it is retried on the next gateway in
+    line before giving up.
+
+    Only queries are routed.  The non-primary gateways may lag behind
+    the primary for a moment after a change, so use the router for reads
+    that can tolerate that (stats, gateway state), and send actions,
+    sets and reads that must see their own writes to "primary" directly.
+
+    Routed queries and probes bypass the sessions' query caches: a cache
+    hit would make a gateway look fast without it having been asked.
+
+    """
+    def __init__(self, gateways, probe_node=PROBE_NODE,
+                 retry_after=RETRY_AFTER):
+        """Arguments:
+            gateways    -- List of (name, XGSession) tuples, the first of
+                           which is the primary
+            probe_node  -- Node queried to check a gateway's health
+            retry_after -- Seconds a failed gateway is skipped for
+
+        """
+        if not gateways:
+            raise ValueError('No gateways to route to')
+        self._gateways = [_Gateway(name, session, index)
+                          for index, (name, session) in enumerate(gateways)]
+        self.probe_node = probe_node
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober = None
+
+    def __repr__(self):
+        return '<GatewayRouter %s>' % (
+            ' '.join(x.name for x in self._gateways),)
+
+    @property
+    def primary(self):
+        """The primary gateway's session, for actions and sets."""
+        return self._gateways[0].session
+
+    def get_node_values(self, *args, **kwargs):
+        """XGSession.get_node_values() on the best gateway."""
+        kwargs['cached'] = False
+        return self._route('get_node_values', args, kwargs)
+
+    def get_node_values_multi(self, *args, **kwargs):
+        """XGSession.get_node_values_multi() on the best gateway."""
+        return self._route('get_node_values_multi', args, kwargs)
+
+    def get_nodes(self, *args, **kwargs):
+        """XGSession.get_nodes() on the best gateway."""
+        kwargs['cached'] = False
+        return self._route('get_nodes', args, kwargs)
+
+    def get_nodes_multi(self, *args, **kwargs):
+        """XGSession.get_nodes_multi() on the best gateway."""
+        return self._route('get_nodes_multi', args, kwargs)
+
+    def ranked(self):
+        """Returns the gateway names in the order queries try them."""
+        return [x.name for x in self._ranked()]
+
+    def stats(self):
+        """Returns a dict of gateway name to a dict of its health.
+
+        Each gateway's dict holds "rtt" (seconds, None until measured),
+        "error_rate" (0 to 1), "healthy" and the "requests" and "errors"
+        counted so far.
+
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            return dict((x.name, {'rtt': x.rtt,
+                                  'error_rate': x.error_rate,
+                                  'healthy': x.healthy(now),
+                                  'requests': x.requests,
+                                  'errors': x.errors})
+                        for x in self._gateways)
+        finally:
+            self._lock.release()
+
+    def probe(self):
+        """Queries every gateway once to refresh its health."""
+        for gw in self._gateways:
+            try:
+                self._timed(gw, gw.session.get_node_values,
+                            (self.probe_node,), {'cached': False})
+            except Exception:
+                pass
+
+    def start(self, interval):
+        """Probes every gateway each "interval" seconds in the background.
+
+        The probe runs on a daemon thread until close() is called.
+
+        """
+        if self._prober is not None or interval <= 0:
+            return
+        self._stop.clear()
+        self._prober = threading.Thread(target=self._probe_loop,
+                                        args=(interval,),
+                                        name='vxg-gateway-probe')
+        self._prober.daemon = True
+        self._prober.start()
+
+    def close(self):
+        """Stops the background probe, if running."""
+        prober, self._prober = self._prober, None
+        if prober is not None:
+            self._stop.set()
+            prober.join()
+
+    def _probe_loop(self, interval):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(interval)
+
+    def _ranked(self):
+        """Healthy gateways fastest first, then the failing ones."""
+        now = time.time()
+        self._lock.acquire()
+        try:
+            return sorted(self._gateways,
+                          key=lambda x: (not x.healthy(now), x.sort_rtt(),
+                                         x.index))
+        finally:
+            self._lock.release()
+
+    def _route(self, method, args, kwargs):
+        last_error = None
+        for gw in self._ranked():
+            try:
+                return self._timed(gw, getattr(gw.session, method),
+                                   args, kwargs)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _timed(self, gw, func, args, kwargs):
+        start = time.time()
+        try:
+            ret = func(*args, **kwargs)
+        except Exception:
+            self._record(gw, None)
+            raise
+        self._record(gw, time.time() - start)
+        return ret
+
+    def _record(self, gw, rtt):
+        """Folds one request's outcome into the gateway's averages.
+
+        Arguments:
+            rtt -- Round trip time in seconds, or None if it failed
+
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            gw.requests += 1
+            if rtt is None:
+                gw.errors += 1
+                gw.error_rate += SMOOTHING * (1 - gw.error_rate)
+                gw.retry_at = now + self.retry_after
+            else:
+                gw.error_rate -= SMOOTHING * gw.error_rate
+                gw.retry_at = 0
+                if gw.rtt is None:
+                    gw.rtt = rtt
+                else:
+                    gw.rtt += SMOOTHING * (rtt - gw.rtt)
+        finally:
+            self._lock.release()
+
+
+class _Gateway(object):
+    def __init__(self, name, session, index):
+        self.name = name
+        self.session = session
+        self.index = index
+        self.rtt = None
+        self.error_rate = 0.0
+        self.retry_at = 0
+        self.requests = 0
+        self.errors = 0
+
+    def healthy(self, now):
+        return now >= self.retry_at
+
+    def sort_rtt(self):
+        # Unmeasured gateways go after measured ones, in the given order
+        if self.rtt is None:
+            return float('inf')
+        # The expected time to an answer, counting retries elsewhere
+        return self.rtt / max(1 - self.error_rate, 0.05)
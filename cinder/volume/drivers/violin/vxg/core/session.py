@@ -17,15 +17,47 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import cookielib
 import json
+import re
 import sys
+import threading
+import time
 import urllib
 import urllib2
 
 import cinder.volume.drivers.violin.vxg.core.request
 from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.node import XGNodeDict
 from cinder.volume.drivers.violin.vxg.core.error import *
 from cinder.volume.drivers.violin.vxg.core.response import XGResponse
+from cinder.volume.drivers.violin.vxg.core.response import XGResponseStream
+from cinder.volume.drivers.violin.vxg.core import cache
+from cinder.volume.drivers.violin.vxg.core import events
+from cinder.volume.drivers.violin.vxg.core import futures
+from cinder.volume.drivers.violin.vxg.core import trace
+from cinder.volume.drivers.violin.vxg.core import transport
+
+
+def _node_pattern_re(pattern):
+    """Compile a node name pattern into a regex matching node names.
+
+    A trailing "/*", "/**" or "/***" matches the same nodes the gateway
+    returns for that iteration; a "*" elsewhere matches one name element.
+
+    """
+    # One name element, allowing for escaped slashes
+    elem = r'(?:[^/\\]|\\.)+'
+    if pattern.endswith('/***'):
+        base, tail = pattern[:-4], r'(?:/.*)?'
+    elif pattern.endswith('/**'):
+        base, tail = pattern[:-3], r'/.+'
+    elif pattern.endswith('/*'):
+        base, tail = pattern[:-2], '/' + elem
+    else:
+        base, tail = pattern, ''
+    base = elem.join(re.escape(x) for x in base.split('*'))
+    return re.compile(base + tail + '$')
 
 
 class BasicSession(object):
@@ -36,7 +68,9 @@ class BasicSession(object):
 
     """
     def __init__(self, host, user, password, debug,
-                 proto, keepalive, log_fd):
+                 proto, keepalive, log_fd,
+                 pool_size=transport.DEFAULT_POOL_SIZE,
+                 pool_idle_timeout=transport.DEFAULT_IDLE_TIMEOUT):
         self.host = str(host)
         self.user = str(user)
         self.password = str(password)
@@ -45,6 +79,18 @@ class BasicSession(object):
         self.keepalive = bool(keepalive)
         self._closed = True
 
+        # Serializes keepalive logins, see _relogin()
+        self._login_lock = threading.Lock()
+        self._logins = 0
+
+        # Why the last login failed: an AuthenticationError if the host
+        # turned it down, a NetworkError if it could not be reached
+        self._login_error = None
+
+        # Persistent connections to the host, shared by every request
+        # made through this session's handle
+        self.pool = transport.ConnectionPool(pool_size, pool_idle_timeout)
+
         # Verify the protocol
         if proto not in ('https', 'http'):
             raise ValueError('Protocol {0} not supported'.format(proto))
@@ -92,6 +138,50 @@ class BasicSession(object):
         self.log_fd.write('{0}\n'.format(msg))
         self.log_fd.flush()
 
+    def _relogin(self, logins):
+        """Login again after a request failed authentication.
+
+        Requests sent concurrently on the session all fail once it has
+        been logged out, but only one of them logs in again: the rest find
+        "_logins" has moved on from the value they read before sending,
+        and just retry on the new login.
+
+        Arguments:
+            logins -- The value of "_logins" read before the request
+
+        Returns:
+            True if the request should be retried.
+
+        """
+        self._login_lock.acquire()
+        try:
+            if self._logins != logins:
+                return True
+            self.log('Attempting keepalive reconnect')
+            if self.login():
+                self._logins += 1
+                return True
+            return False
+        finally:
+            self._login_lock.release()
+
+    def pool_stats(self):
+        '''Connection pool hit/miss counters as a dict.'''
+        return self.pool.stats()
+
+    def _build_handle(self, cookiejar=None):
+        """Build a urllib2 opener that sends requests over the pool.
+
+        All pooled connections share the one cookie jar, so an
+        authentication cookie obtained on any connection is sent on
+        every other.
+
+        """
+        if cookiejar is None:
+            cookiejar = cookielib.CookieJar()
+        return urllib2.build_opener(urllib2.HTTPCookieProcessor(cookiejar),
+                                    transport.KeepAliveHandler(self.pool))
+
 
 class XGSession(BasicSession):
     """XML Gateway session object
@@ -106,28 +196,44 @@ class XGSession(BasicSession):
 
     def __init__(self, host, user='admin', password='',
                  debug=False, proto='https', autologin=True,
-                 keepalive=False, log_fd=None):
+                 keepalive=False, log_fd=None,
+                 pool_size=transport.DEFAULT_POOL_SIZE,
+                 pool_idle_timeout=transport.DEFAULT_IDLE_TIMEOUT,
+                 tracer=None, metrics=None):
         """Create new XGSession instance.
 
         Arguments:
-            host      -- Name or IP address of host to connect to.
-            user      -- Username to login with.
-            password  -- Password for user
-            debug     -- Enable/disable debugging to stdout (bool)
-            proto     -- Either 'http' or 'https'
-            autologin -- Should auto-login or not (bool)
-            keepalive -- Attempt auto-reconnects on autologout
-            log_fd    -- Where to send log messages to
+            host              -- Name or IP address of host to connect to.
+            user              -- Username to login with.
+            password          -- Password for user
+            debug             -- Trace every request, payloads and all,
+                                 to log_fd (unless tracer is given)
+            proto             -- Either 'http' or 'https'
+            autologin         -- Should auto-login or not (bool)
+            keepalive         -- Attempt auto-reconnects on autologout
+            log_fd            -- Where to send log messages to
+            pool_size         -- Idle keep-alive connections kept to host
+            pool_idle_timeout -- Seconds before an idle connection is closed
+            tracer            -- trace.Tracer to record requests with
+            metrics           -- metrics.Metrics to count requests in
 
         """
 
         super(XGSession, self).__init__(host, user, password, debug,
-                                        proto, keepalive, log_fd)
+                                        proto, keepalive, log_fd,
+                                        pool_size, pool_idle_timeout)
+        if tracer is None and self.debug:
+            tracer = trace.Tracer(self.log_fd, sample_rate=1.0)
+        self.tracer = tracer
+        self.metrics = metrics
+        self.query_cache = None
+        self._listener = None
+        self._listener_lock = threading.Lock()
         self.request_url = '{0}://{1}/admin/launch?script=xg'.format(
                            self.proto, self.host)
-        self._handle = urllib2.build_opener(urllib2.HTTPCookieProcessor())
+        self._handle = self._build_handle()
         if autologin and not self.open():
-            raise Exception('Failed autologin')
+            raise self._login_error
 
     def open(self):
         """Login to the host and save authentication cookie.
@@ -159,12 +265,17 @@ class XGSession(BasicSession):
                     self.log('Successfully logged in using {0}'.format(
                              self.proto))
                     self._closed = False
+                    self._login_error = None
                     return True
             else:
                 self.log('Failed to login using {0}'.format(self.proto))
-                self.log(resp, True)
+                self.log(resp)
+                self._login_error = AuthenticationError(
+                    'Failed autologin using {0}'.format(self.proto))
         except (urllib2.HTTPError, urllib2.URLError) as e:
             self.log('{0} {1}: {2}'.format(e.__class__.__name__, self.host, e))
+            self._login_error = NetworkError(
+                'Failed autologin: {0}: {1}'.format(e.__class__.__name__, e))
 
         return False
 
@@ -173,6 +284,9 @@ class XGSession(BasicSession):
 
         """
 
+        if self._listener is not None:
+            self._listener.close()
+
         if self.closed:
             return
 
@@ -188,6 +302,26 @@ class XGSession(BasicSession):
         except (urllib2.HTTPError, urllib2.URLError) as e:
             self.log('{0}: {1}'.format(e.__class__.__name__, e))
 
+        self.pool.clear()
+
+    def event_listener(self):
+        """Returns the session's events.XGEventListener for dbchange
+        events, subscribing and starting it on first use.
+
+        Every caller shares the one listener.  Check its "active" flag
+        before relying on it: it is False if the gateway refused the
+        subscription.
+
+        """
+        self._listener_lock.acquire()
+        try:
+            if self._listener is None:
+                self._listener = events.XGEventListener(self)
+                self._listener.start()
+            return self._listener
+        finally:
+            self._listener_lock.release()
+
     def _get_version_info(self):
         '''Get a dict of version info.'''
         node = '/system/version/release'
@@ -208,28 +342,64 @@ class XGSession(BasicSession):
         """
 
         data = request.to_xml()
+        logins = self._logins
 
-        if self.debug:
-            self.log('sending:\n{0}'.format(data))
         try:
+            if self.tracer is not None or self.metrics is not None:
+                return self._send_recorded(request, data, strip)
             resp = self._handle.open(self.request_url, data)
-            resp_str = resp.read()
-            if self.debug:
-                self.log('received:\n{0}'.format(resp_str))
-
-            return XGResponse.fromstring(request, resp_str, strip)
+            return XGResponse.fromstring(request, resp.read(), strip)
         except AuthenticationError as e:
             self._closed = True
-            if self.keepalive and retry:
-                self.log('Attempting keepalive reconnect')
-                if self.login():
-                    return self.send_request(request, strip, False)
+            if self.keepalive and retry and self._relogin(logins):
+                if self.metrics is not None:
+                    self.metrics.retried(self.host, request)
+                return self.send_request(request, strip, False)
             raise e
         except (urllib2.HTTPError, urllib2.URLError) as e:
             msg = '{0}: {1}'.format(e.__class__.__name__, e)
             self.log(msg)
             raise NetworkError(msg)
 
+    def _send_recorded(self, request, data, strip):
+        """send_request() round trip, passed on to _record()."""
+        start = time.time()
+        resp_str = None
+        code = None
+        try:
+            resp = self._handle.open(self.request_url, data)
+            resp_str = resp.read()
+            ret = XGResponse.fromstring(request, resp_str, strip)
+            code = ret.r_code
+            return ret
+        except Exception as e:
+            code = e.__class__.__name__
+            raise
+        finally:
+            self._record(request, data, start, code, resp_str)
+
+    def _record(self, request, data, start, code, response=None,
+                bytes_in=None):
+        """Hand a finished request to the tracer and metrics, if any.
+
+        Arguments:
+            request  -- The XGRequest
+            data     -- The request XML as sent
+            start    -- time.time() the request was sent at
+            code     -- Return code, or the exception class name
+            response -- The response XML, if all of it was read
+            bytes_in -- Response size, if different from len(response)
+
+        """
+        if self.tracer is not None:
+            self.tracer.trace(self.host, request, data, start, code,
+                              response, bytes_in)
+        if self.metrics is not None:
+            if bytes_in is None and response is not None:
+                bytes_in = len(response)
+            self.metrics.observe(self.host, request, time.time() - start,
+                                 code, len(data), bytes_in)
+
     def save_config(self):
         """Save the configuration on the remote system. Equivalent to
         a "conf t" "wr mem".
@@ -241,7 +411,42 @@ class XGSession(BasicSession):
 
         return self.perform_action('/mgmtd/db/save')
 
-    def get_nodes(self, node_names, nostate=False, noconfig=False):
+    def enable_query_cache(self, maxsize=cache.DEFAULT_MAXSIZE,
+                           ttl=cache.DEFAULT_TTL, ttl_rules=None):
+        """Cache the results of get_nodes() and get_node_values().
+
+        Cached results are dropped on any perform_action() or
+        perform_set() made through this session, when a response shows
+        the gateway's db revision has moved on, and once their TTL is up.
+        Changes made through other sessions are only noticed through the
+        db revision or the TTL, so keep TTLs short for nodes that other
+        clients modify.
+
+        Arguments:
+            maxsize   -- Number of query results to keep (LRU)
+            ttl       -- Default seconds a result is served from cache
+            ttl_rules -- List of (glob, seconds) tuples overriding ttl
+                         for matching node patterns (first match wins)
+
+        Returns:
+            The XGQueryCache in use.
+
+        """
+        self.query_cache = cache.XGQueryCache(maxsize, ttl, ttl_rules)
+        return self.query_cache
+
+    def disable_query_cache(self):
+        """Stop caching query results."""
+        self.query_cache = None
+
+    def cache_stats(self):
+        """Query cache counters as a dict (empty if disabled)."""
+        if self.query_cache is None:
+            return {}
+        return self.query_cache.stats()
+
+    def get_nodes(self, node_names, nostate=False, noconfig=False,
+                  cached=True):
         """Retrieve a "flat" list of XGNode objects based on
         node_names.  If you wish to perform some iteration over a
         representational hierarchy, use get_node_tree() instead.
@@ -255,6 +460,8 @@ class XGSession(BasicSession):
                            below) that will be queried.
             nostate     -- Set to True to not return state nodes.
             noconfig    -- Set to True to not return config nodes.
+            cached      -- Set to False to always ask the gateway, even
+                           when the query cache holds the result.
 
         Returns:
             list()      -- A flat (non-hierarchical) dict-like object with
@@ -272,10 +479,11 @@ class XGSession(BasicSession):
 
         """
 
-        return self._get_nodes(node_names, nostate, noconfig, flat=True)
+        return self._get_nodes(node_names, nostate, noconfig, flat=True,
+                               cached=cached)
 
     def _get_nodes(self, node_names, nostate=False, noconfig=False,
-                   flat=False, values_only=False, strip=None):
+                   flat=False, values_only=False, strip=None, cached=True):
 
         query_flags = []
         if nostate:
@@ -287,20 +495,34 @@ class XGSession(BasicSession):
         if isinstance(node_names, basestring):
             node_names = [node_names]
 
+        query_cache = self.query_cache
+        if query_cache is not None:
+            key = query_cache.key(node_names, nostate, noconfig,
+                                  flat, values_only, strip)
+            generation = query_cache.generation
+            if cached:
+                nodes = query_cache.get(key)
+                if nodes is not None:
+                    return nodes
+
         nodes = []
         for n in node_names:
-            nodes.append(XGNode(n, flags=query_flags))
+            nodes.append(XGNode(n, flags=list(query_flags)))
 
         req = cinder.volume.drivers.violin.vxg.core.request.XGQuery(nodes, flat, values_only)
         resp = self.send_request(req, strip)
 
+        if (query_cache is not None and resp.type == req.type and
+                resp.r_code == 0):
+            query_cache.put(key, resp.nodes, resp.db_rev, generation)
+
         # TODO(gfreeman): If we have send_request return empty nodes
         #       dict rather than None for error we can eliminate this
         #       conditional.
         return resp.nodes
 
     def get_node_values(self, node_names, nostate=False, noconfig=False,
-                        strip=None):
+                        strip=None, cached=True):
         """Retrieve values of one or more nodes, returning as a flat
         dict.  If you wish to perform some iteration over a
         representational hierarchy, use get_node_tree_values()
@@ -317,6 +539,8 @@ class XGSession(BasicSession):
             nostate     -- Set to True to not return state nodes.
             noconfig    -- Set to True to not return config nodes.
             strip       -- String to remove from the beginning of each key
+            cached      -- Set to False to always ask the gateway, even
+                           when the query cache holds the result.
 
         Returns:
             dict()      -- A flat (non-hierarchical) dict-like object with
@@ -327,7 +551,214 @@ class XGSession(BasicSession):
 
         return self._get_nodes(node_names, nostate=nostate,
                                noconfig=noconfig, flat=True,
-                               values_only=True, strip=strip)
+                               values_only=True, strip=strip,
+                               cached=cached)
+
+    def iter_nodes(self, node_names, nostate=False, noconfig=False,
+                   strip=None):
+        """Stream the nodes returned by a query, one XGNode at a time.
+
+        Unlike get_nodes(), the response is decoded while it is being
+        received, and each node is handed out as soon as it has been
+        read.  This keeps memory flat for large subtree ("/**") queries,
+        at the cost of the response not being cached.
+
+        Arguments:
+            node_names  -- String or list of node names or patterns
+            nostate     -- Set to True to not return state nodes.
+            noconfig    -- Set to True to not return config nodes.
+            strip       -- String to remove from the beginning of each name
+
+        Returns:
+            A generator of flat XGNode objects.
+
+        """
+        query_flags = []
+        if nostate:
+            query_flags.append("no-state")
+        if noconfig:
+            query_flags.append("no-config")
+
+        if isinstance(node_names, basestring):
+            node_names = [node_names]
+
+        nodes = [XGNode(n, flags=list(query_flags)) for n in node_names]
+        req = cinder.volume.drivers.violin.vxg.core.request.XGQuery(
+            nodes, True, False)
+
+        data = req.to_xml()
+        retry = True
+        while True:
+            logins = self._logins
+            start = time.time()
+            code = None
+            try:
+                stream = self._send_stream_request(req, data, strip)
+            except NetworkError as e:
+                self._record(req, data, start, e.__class__.__name__)
+                raise e
+            try:
+                for node in stream:
+                    yield node
+                code = stream.r_code
+            except AuthenticationError as e:
+                code = e.__class__.__name__
+                self._closed = True
+                # Only retry if nothing has been handed out yet
+                if (self.keepalive and retry and not stream.count and
+                        self._relogin(logins)):
+                    if self.metrics is not None:
+                        self.metrics.retried(self.host, req)
+                    retry = False
+                    continue
+                raise e
+            except Exception as e:
+                code = e.__class__.__name__
+                raise
+            finally:
+                stream.close()
+                self._record(req, data, start, code,
+                             bytes_in=stream.bytes_read)
+
+            if self.query_cache is not None:
+                self.query_cache.note_revision(stream.db_rev)
+            return
+
+    def iter_node_values(self, node_names, nostate=False, noconfig=False,
+                         strip=None):
+        """Stream the results of a query as (name, type, value) tuples.
+
+        See iter_nodes() for the arguments.
+
+        """
+        for node in self.iter_nodes(node_names, nostate, noconfig, strip):
+            yield (node.name, node.type, node.value)
+
+    def _send_stream_request(self, request, data, strip=None):
+        """Sends an XGRequest (already serialized as "data") and returns
+        an XGResponseStream for the response, which is read as the stream
+        is iterated."""
+        try:
+            resp = self._handle.open(self.request_url, data)
+        except (urllib2.HTTPError, urllib2.URLError) as e:
+            msg = '{0}: {1}'.format(e.__class__.__name__, e)
+            self.log(msg)
+            raise NetworkError(msg)
+
+        return XGResponseStream(request, resp, strip)
+
+    def get_nodes_multi(self, queries, nostate=False, noconfig=False):
+        """Run several independent get_nodes() queries in one request.
+
+        See get_node_values_multi() for the format of "queries".
+
+        Returns:
+            list()      -- One XGNodeDict of XGNode objects per query, in
+                           the same order as "queries".
+
+        """
+        return self._get_nodes_multi(queries, nostate, noconfig)
+
+    def get_node_values_multi(self, queries, nostate=False, noconfig=False,
+                              strip=None):
+        """Run several independent get_node_values() queries in one request.
+
+        Every node pattern from every query is sent to the gateway as a
+        single xg-request, and the nodes in the response are then handed
+        back to each query whose patterns they match.  This lets callers
+        that would otherwise issue a chain of small queries pay for one
+        round trip instead.
+
+        Arguments:
+            queries     -- List of queries.  Each query is either the
+                           node_names argument of get_node_values() (a
+                           string or list of node names or patterns), or
+                           a dict with a "nodes" key holding node_names
+                           and, optionally, "nostate", "noconfig" and
+                           "strip" keys overriding the arguments below.
+            nostate     -- Default nostate for queries that don't set it.
+            noconfig    -- Default noconfig for queries that don't set it.
+            strip       -- Default strip for queries that don't set it.
+
+        Returns:
+            list()      -- One flat dict-like object (as returned by
+                           get_node_values()) per query, in the same order
+                           as "queries".
+
+        A node matching the patterns of more than one query is returned to
+        each of them.  As the flags are set per node pattern, overlapping
+        patterns with different nostate/noconfig settings will see the
+        union of what both flag settings return.
+
+        """
+        return self._get_nodes_multi(queries, nostate, noconfig,
+                                     values_only=True, strip=strip)
+
+    def _get_nodes_multi(self, queries, nostate=False, noconfig=False,
+                         values_only=False, strip=None):
+
+        # Normalize each query into (patterns, nostate, noconfig, strip)
+        specs = []
+        for q in queries:
+            if isinstance(q, dict):
+                names = q['nodes']
+                specs.append((names,
+                              q.get('nostate', nostate),
+                              q.get('noconfig', noconfig),
+                              q.get('strip', strip)))
+            else:
+                specs.append((q, nostate, noconfig, strip))
+
+        # Build one node element per distinct (pattern, flags) pair
+        nodes = []
+        seen = set()
+        matchers = []
+        for names, q_nostate, q_noconfig, q_strip in specs:
+            if isinstance(names, basestring):
+                names = [names]
+            query_flags = []
+            if q_nostate:
+                query_flags.append("no-state")
+            if q_noconfig:
+                query_flags.append("no-config")
+            for n in names:
+                if (n, tuple(query_flags)) not in seen:
+                    seen.add((n, tuple(query_flags)))
+                    nodes.append(XGNode(n, flags=list(query_flags)))
+            matchers.append([_node_pattern_re(n) for n in names])
+
+        results = [[] for x in specs]
+        if nodes:
+            req = cinder.volume.drivers.violin.vxg.core.request.XGQuery(
+                nodes, True, False)
+            resp = self.send_request(req)
+            if self.query_cache is not None:
+                self.query_cache.note_revision(resp.db_rev)
+
+            # Hand each node back to every query that asked for it.  A
+            # status response carries an empty node list, not a dict.
+            for node in (resp.nodes.values() if resp.nodes else []):
+                taken = False
+                for i in xrange(len(specs)):
+                    if not any(m.match(node.name) for m in matchers[i]):
+                        continue
+                    if taken:
+                        results[i].append(XGNode.copy(node))
+                    else:
+                        results[i].append(node)
+                        taken = True
+
+        ret = []
+        for i in xrange(len(specs)):
+            q_strip = specs[i][3]
+            if q_strip is not None:
+                if q_strip[-1] != '/':
+                    q_strip += '/'
+                for node in results[i]:
+                    if node.name.startswith(q_strip):
+                        node.name = node.name[len(q_strip):]
+            ret.append(XGNodeDict(results[i], values_only))
+        return ret
 
     def perform_action(self, name, nodes=[]):
         """Performs the action specified and returns the result.
@@ -353,7 +784,30 @@ class XGSession(BasicSession):
 
         # Perform the action given
         req = cinder.volume.drivers.violin.vxg.core.request.XGAction(name, nodes)
-        resp = self.send_request(req)
+        resp = None
+        try:
+            resp = self.send_request(req)
+        finally:
+            self._invalidate_query_cache(resp)
+        return resp.as_action_result()
+
+    def perform_template(self, template, **values):
+        """Performs an action from a pre-compiled template.
+
+        Arguments:
+            template -- An XGActionTemplate
+            values   -- The values of the template's fields
+
+        Returns:
+            A dict of the return code and message.
+
+        """
+        req = template.bind(**values)
+        resp = None
+        try:
+            resp = self.send_request(req)
+        finally:
+            self._invalidate_query_cache(resp)
         return resp.as_action_result()
 
     def perform_set(self, nodes=[]):
@@ -382,7 +836,11 @@ class XGSession(BasicSession):
                     raise ValueError('Invalid node: {0}'.format(x.__class__))
 
         req = cinder.volume.drivers.violin.vxg.core.request.XGSet(set_nodes)
-        resp = self.send_request(req)
+        resp = None
+        try:
+            resp = self.send_request(req)
+        finally:
+            self._invalidate_query_cache(resp)
         try:
             # Works for XGNodeDict input, clear the tracked modifications
             nodes.clear_updates()
@@ -390,6 +848,13 @@ class XGSession(BasicSession):
             pass
         return resp.as_action_result()
 
+    def _invalidate_query_cache(self, resp=None):
+        # Even a failed request may have changed something on the gateway
+        if self.query_cache is not None:
+            self.query_cache.clear()
+            if resp is not None:
+                self.query_cache.note_revision(resp.db_rev)
+
     def get_node_tree(self, node_names, nostate=False, noconfig=False):
         raise Exception("Not yet implemented.")
 
@@ -403,6 +868,79 @@ class XGSession(BasicSession):
         raise Exception("Not yet implemented.")
 
 
+class AsyncXGSession(XGSession):
+    """An XGSession that can also run requests in the background.
+
+    Requests are run on a pool of worker threads, each of which sends the
+    same XML as the synchronous calls over the session's keep-alive
+    connection pool.  The *_async() methods return a futures.Future whose
+    result() is what the synchronous method would have returned (or
+    raises what it would have raised).
+
+    """
+    def __init__(self, host, user='admin', password='',
+                 debug=False, proto='https', autologin=True,
+                 keepalive=False, log_fd=None,
+                 pool_size=transport.DEFAULT_POOL_SIZE,
+                 pool_idle_timeout=transport.DEFAULT_IDLE_TIMEOUT,
+                 workers=futures.DEFAULT_WORKERS, tracer=None,
+                 metrics=None):
+        """Create new AsyncXGSession instance.
+
+        Takes the same arguments as XGSession, plus:
+            workers           -- Number of requests that can run at once
+
+        """
+        # Keep a connection per worker so they don't queue on the socket
+        pool_size = max(pool_size, workers)
+        self._executor = futures.ThreadPool(workers)
+        super(AsyncXGSession, self).__init__(host, user, password, debug,
+                                             proto, autologin, keepalive,
+                                             log_fd, pool_size,
+                                             pool_idle_timeout, tracer,
+                                             metrics)
+
+    def close(self):
+        """Finish any queued requests, then logout."""
+        # Workers are started again on demand should the session be
+        # reopened.
+        executor = self._executor
+        self._executor = futures.ThreadPool(executor.workers)
+        executor.shutdown()
+        super(AsyncXGSession, self).close()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on a worker, returning its Future.
+
+        This lets callers batch any session call (or a function making
+        several of them) alongside other background requests.
+
+        """
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def perform_action_async(self, name, nodes=[]):
+        """Background perform_action().  Returns a Future."""
+        return self.submit(self.perform_action, name, nodes)
+
+    def perform_template_async(self, template, **values):
+        """Background perform_template().  Returns a Future."""
+        return self.submit(self.perform_template, template, **values)
+
+    def perform_set_async(self, nodes=[]):
+        """Background perform_set().  Returns a Future."""
+        return self.submit(self.perform_set, nodes)
+
+    def get_nodes_async(self, node_names, nostate=False, noconfig=False):
+        """Background get_nodes().  Returns a Future."""
+        return self.submit(self.get_nodes, node_names, nostate, noconfig)
+
+    def get_node_values_async(self, node_names, nostate=False,
+                              noconfig=False, strip=None):
+        """Background get_node_values().  Returns a Future."""
+        return self.submit(self.get_node_values, node_names, nostate,
+                           noconfig, strip)
+
+
 class JsonSession(BasicSession):
     """JSON REST session object
 
@@ -417,22 +955,27 @@ class JsonSession(BasicSession):
 
     def __init__(self, host, user='admin', password='',
                  debug=False, proto='http', autologin=True,
-                 keepalive=False, log_fd=None):
+                 keepalive=False, log_fd=None,
+                 pool_size=transport.DEFAULT_POOL_SIZE,
+                 pool_idle_timeout=transport.DEFAULT_IDLE_TIMEOUT):
         """Create a new JSON session instance.
 
         Arguments:
-            host      -- Hostname or IP address
-            user      -- Username
-            password  -- Password
-            debug     -- Enable/disable debugging (bool)
-            proto     -- Either 'http' or 'https'
-            autologin -- Should auto-login or not (bool)
-            keepalive -- Attempt auto-reconnects on autologout
-            log_fd    -- Where to send log messages (default: stdout)
+            host              -- Hostname or IP address
+            user              -- Username
+            password          -- Password
+            debug             -- Enable/disable debugging (bool)
+            proto             -- Either 'http' or 'https'
+            autologin         -- Should auto-login or not (bool)
+            keepalive         -- Attempt auto-reconnects on autologout
+            log_fd            -- Where to send log messages (default: stdout)
+            pool_size         -- Idle keep-alive connections kept to host
+            pool_idle_timeout -- Seconds before an idle connection is closed
 
         """
         super(JsonSession, self).__init__(host, user, password, debug,
-                                          proto, keepalive, log_fd)
+                                          proto, keepalive, log_fd,
+                                          pool_size, pool_idle_timeout)
 
         self._auth_error = self._AUTH_ERROR_MESSAGES[0]
         self.login_info = None
@@ -440,10 +983,11 @@ class JsonSession(BasicSession):
         self._reset_handle()
 
         if autologin and not self.login():
-            raise Exception('Failed to login')
+            raise self._login_error
 
     def _reset_handle(self):
-        self._handle = urllib2.build_opener(urllib2.HTTPCookieProcessor())
+        # Fresh cookie jar, but keep the pooled connections
+        self._handle = self._build_handle()
 
     def open(self):
         """Login to the host and save the authentication cookie.
@@ -460,6 +1004,8 @@ class JsonSession(BasicSession):
             resp = self._handle.open(my_request).read()
         except (urllib2.HTTPError, urllib2.URLError) as e:
             self.log('{0}: {1}'.format(e.__class__.__name__, e))
+            self._login_error = NetworkError(
+                'Failed to login: {0}: {1}'.format(e.__class__.__name__, e))
             return False
         self.log('Login response: {0}'.format(resp))
 
@@ -475,10 +1021,13 @@ class JsonSession(BasicSession):
             self._check_response_for_errors(resp)
         except Exception as e:
             self.log(str(e))
+            self._login_error = AuthenticationError(
+                'Failed to login: {0}'.format(e))
             return False
 
         # Successful login, otherwise
         self._closed = False
+        self._login_error = None
         self._process_login_response(resp)
         self._auth_error = self._AUTH_ERROR_MESSAGES[1]
         self.login_info = resp
@@ -487,6 +1036,7 @@ class JsonSession(BasicSession):
     def close(self):
         """Close the connection to the given Symphony appliance."""
         self._close()
+        self.pool.clear()
         self._closed = True
         self._auth_error = self._AUTH_ERROR_MESSAGES[0]
         self.login_info = None
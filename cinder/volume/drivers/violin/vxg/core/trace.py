@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import random
+import threading
+import time
+
+# Records buffered before the oldest are dropped
+DEFAULT_CAPACITY = 4096
+
+# Bytes of each request and response payload kept when one is sampled
+DEFAULT_MAX_PAYLOAD = 4096
+
+# Seconds between background writes
+DEFAULT_INTERVAL = 1.0
+
+# Node names listed in a record's target before it is cut short
+_MAX_TARGET_NODES = 3
+
+
+class TraceRecord(object):
+    """One request sent to a gateway.
+
+    Attributes:
+        start     -- time.time() the request was sent at
+        host      -- Gateway the request was sent to
+        type      -- Request type ('query', 'action', 'set', ...)
+        target    -- Action name, or the first few node names
+        bytes_out -- Request size
+        bytes_in  -- Response size (None if none was received)
+        latency   -- Seconds until the response was parsed
+        code      -- Return code, or the name of the exception raised
+        request   -- Captured request payload, if sampled
+        response  -- Captured response payload, if sampled
+
+    """
+    __slots__ = ('start', 'host', 'type', 'target', 'bytes_out',
+                 'bytes_in', 'latency', 'code', 'request', 'response')
+
+    def __init__(self, start, host, type, target, bytes_out, bytes_in,
+                 latency, code, request=None, response=None):
+        self.start = start
+        self.host = host
+        self.type = type
+        self.target = target
+        self.bytes_out = bytes_out
+        self.bytes_in = bytes_in
+        self.latency = latency
+        self.code = code
+        self.request = request
+        self.response = response
+
+    def __repr__(self):
+        return '<TraceRecord %s>' % (self,)
+
+    def __str__(self):
+        line = ('xg host={0} type={1} target={2} out={3} in={4} '
+                'ms={5:.1f} code={6}').format(
+                    self.host, self.type, self.target, self.bytes_out,
+                    '-' if self.bytes_in is None else self.bytes_in,
+                    self.latency * 1000, self.code)
+        if self.request is not None:
+            line += '\n  request: {0}'.format(self.request)
+        if self.response is not None:
+            line += '\n  response: {0}'.format(self.response)
+        return line
+
+    def as_dict(self):
+        return dict((x, getattr(self, x)) for x in self.__slots__)
+
+
+class Tracer(object):
+    """Records a TraceRecord per gateway request, written out later.
+
+    Recording a request only appends to an in-memory buffer; a
+    background thread, started with the first record, drains the buffer
+    to the sink every "interval" seconds.  If the sink falls behind, the
+    oldest records are dropped (and counted in "dropped") rather than
+    slowing requests down.
+
+    Request and response payloads are only kept for a random
+    "sample_rate" fraction of requests, and are cut to "max_payload"
+    bytes.
+
+    """
+    def __init__(self, sink, sample_rate=0.0,
+                 max_payload=DEFAULT_MAX_PAYLOAD,
+                 capacity=DEFAULT_CAPACITY, interval=DEFAULT_INTERVAL):
+        """Arguments:
+            sink        -- File-like object to write records to (one
+                           per line), or a callable taking each record
+            sample_rate -- Fraction of requests to keep payloads for
+            max_payload -- Payload bytes kept per sampled request
+            capacity    -- Records buffered before dropping the oldest
+            interval    -- Seconds between background writes
+
+        """
+        if hasattr(sink, 'write'):
+            self._write = self._write_file
+        elif callable(sink):
+            self._write = self._write_callable
+        else:
+            raise ValueError('sink needs a callable "write" method or '
+                             'to be callable')
+        self.sink = sink
+        self.sample_rate = float(sample_rate)
+        self.max_payload = max_payload
+        self.interval = interval
+        self.recorded = 0
+        self.dropped = 0
+        self._buffer = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+
+    def __repr__(self):
+        return '<Tracer recorded:%d dropped:%d pending:%d>' % (
+            self.recorded, self.dropped, len(self._buffer))
+
+    def trace(self, host, request, data, start, code, response=None,
+              bytes_in=None):
+        """Record a request.
+
+        Arguments:
+            host     -- Gateway the request was sent to
+            request  -- The XGRequest
+            data     -- The request XML as sent
+            start    -- time.time() the request was sent at
+            code     -- Return code, or the exception class name
+            response -- The response XML, if all of it was read
+            bytes_in -- Response size, if different from len(response)
+
+        """
+        latency = time.time() - start
+        if bytes_in is None and response is not None:
+            bytes_in = len(response)
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            captured = (self._capture(data), self._capture(response))
+        else:
+            captured = (None, None)
+
+        record = TraceRecord(start, host, request.type, _target(request),
+                             len(data), bytes_in, latency, code, *captured)
+        buf = self._buffer
+        if len(buf) == buf.maxlen:
+            self.dropped += 1
+        buf.append(record)
+        self.recorded += 1
+
+        if self._writer is None:
+            self._start()
+
+    def flush(self):
+        """Write out every buffered record now."""
+        buf = self._buffer
+        records = []
+        try:
+            while True:
+                records.append(buf.popleft())
+        except IndexError:
+            pass
+        if records:
+            self._write(records)
+
+    def close(self):
+        """Stop the background writer and write out what is left."""
+        self._lock.acquire()
+        try:
+            writer, self._writer = self._writer, None
+        finally:
+            self._lock.release()
+        if writer is not None:
+            self._stop.set()
+            writer.join()
+        self.flush()
+
+    def _capture(self, payload):
+        if payload is None or len(payload) <= self.max_payload:
+            return payload
+        return '{0}... ({1} bytes)'.format(payload[:self.max_payload],
+                                           len(payload))
+
+    def _start(self):
+        self._lock.acquire()
+        try:
+            if self._writer is not None:
+                return
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._write_loop,
+                                            name='vxg-trace-writer')
+            self._writer.daemon = True
+            self._writer.start()
+        finally:
+            self._lock.release()
+
+    def _write_loop(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                # A broken sink must not take the writer down with it
+                pass
+
+    def _write_file(self, records):
+        self.sink.write(''.join('{0}\n'.format(x) for x in records))
+        if hasattr(self.sink, 'flush'):
+            self.sink.flush()
+
+    def _write_callable(self, records):
+        for record in records:
+            self.sink(str(record))
+
+
+def _target(request):
+    """A short description of what a request is for."""
+    if request.action is not None:
+        return request.action
+    names = [x.name for x in request.nodes[:_MAX_TARGET_NODES]]
+    if len(request.nodes) > _MAX_TARGET_NODES:
+        names.append('+{0}'.format(len(request.nodes) - _MAX_TARGET_NODES))
+    return ','.join(names)
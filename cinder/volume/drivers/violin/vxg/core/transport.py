@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import httplib
+import socket
+import threading
+import time
+import urllib2
+
+# Number of idle connections kept per (scheme, host)
+DEFAULT_POOL_SIZE = 4
+
+# Seconds an idle connection may sit in the pool before being discarded
+DEFAULT_IDLE_TIMEOUT = 60
+
+
+class _NotSent(Exception):
+    """A request failed before any of it can have reached the server."""
+    def __init__(self, error):
+        Exception.__init__(self, error)
+        self.error = error
+
+
+def _closed_before_response(e):
+    """Returns True if e is getresponse() finding the connection closed
+    without a byte of the response having been received.
+    """
+    if not isinstance(e, httplib.BadStatusLine):
+        return False
+    # httplib reports an empty status line as its repr, and newer
+    # versions with a message instead
+    return (e.line in ('', repr('')) or
+            e.line.startswith('No status line received'))
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of persistent HTTP/1.1 connections.
+
+    Idle connections are kept per (scheme, host) up to "maxsize" and are
+    handed out most-recently-used first.  Connections that have been idle
+    for longer than "idle_timeout" seconds are closed instead of reused,
+    as the gateway will most likely have dropped them already.
+
+    """
+    def __init__(self, maxsize=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, ssl_context=None):
+        self.maxsize = int(maxsize)
+        self.idle_timeout = float(idle_timeout)
+        self.ssl_context = ssl_context
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ('<ConnectionPool maxsize:%d hits:%d misses:%d evictions:%d>'
+                % (self.maxsize, self.hits, self.misses, self.evictions))
+
+    def get(self, scheme, host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """Check out a connection to the given host.
+
+        Returns:
+            A (connection, reused) tuple.
+
+        """
+        key = (scheme, host)
+        conn = None
+        stale = []
+
+        self._lock.acquire()
+        try:
+            idle = self._idle.get(key)
+            if idle:
+                stale = self._prune(idle, time.time())
+                if idle:
+                    conn = idle.pop()[0]
+            if conn is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        finally:
+            self._lock.release()
+
+        for x in stale:
+            x.close()
+
+        if conn is not None:
+            return (conn, True)
+        return (self._new_conn(scheme, host, timeout), False)
+
+    def put(self, scheme, host, conn):
+        """Return a connection to the pool once its response is consumed."""
+        key = (scheme, host)
+
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            stale = self._prune(idle, time.time())
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+                conn = None
+            else:
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+        for x in stale:
+            x.close()
+        if conn is not None:
+            conn.close()
+
+    def clear(self, scheme=None, host=None):
+        """Close idle connections, optionally only those for one host."""
+        closing = []
+
+        self._lock.acquire()
+        try:
+            for key in self._idle.keys():
+                if scheme is not None and key[0] != scheme:
+                    continue
+                if host is not None and key[1] != host:
+                    continue
+                closing.extend(x[0] for x in self._idle.pop(key))
+        finally:
+            self._lock.release()
+
+        for x in closing:
+            x.close()
+
+    def stats(self):
+        """Returns a dict of the pool hit, miss and eviction counters."""
+        self._lock.acquire()
+        try:
+            idle = sum(len(x) for x in self._idle.values())
+        finally:
+            self._lock.release()
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'idle': idle}
+
+    def _prune(self, idle, now):
+        """Remove expired connections from the idle list (lock held).
+
+        The idle list is ordered oldest first, so expired entries are
+        always at the front.
+
+        """
+        stale = []
+        while idle and now - idle[0][1] > self.idle_timeout:
+            stale.append(idle.pop(0)[0])
+            self.evictions += 1
+        return stale
+
+    def _new_conn(self, scheme, host, timeout):
+        if scheme == 'https':
+            if self.ssl_context is not None:
+                return httplib.HTTPSConnection(host, timeout=timeout,
+                                               context=self.ssl_context)
+            return httplib.HTTPSConnection(host, timeout=timeout)
+        return httplib.HTTPConnection(host, timeout=timeout)
+
+
+class _PooledResponseFile(object):
+    """File-like wrapper that hands the connection back when drained.
+
+    The underlying connection is returned to the pool as soon as the
+    response body has been fully read.  If the response is closed early,
+    or the server asked for the connection to be closed, the connection is
+    discarded instead.
+
+    """
+    def __init__(self, resp, release):
+        self._resp = resp
+        self._release = release
+
+    def read(self, amt=None):
+        if self._resp is None:
+            return ''
+        data = self._resp.read(amt)
+        if amt is None or not data:
+            self._done(True)
+        return data
+
+    def readline(self, limit=-1):
+        # HTTPResponse has no readline of its own, so buffer through read()
+        line = []
+        while limit < 0 or len(line) < limit:
+            c = self.read(1)
+            if not c:
+                break
+            line.append(c)
+            if c == '\n':
+                break
+        return ''.join(line)
+
+    def readlines(self, sizehint=0):
+        lines = []
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            lines.append(line)
+        return lines
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        self._done(False)
+
+    def _done(self, drained):
+        resp, self._resp = self._resp, None
+        if resp is None:
+            return
+        reusable = drained and resp.isclosed() and not resp.will_close
+        resp.close()
+        self._release(reusable)
+
+
+class KeepAliveHandler(urllib2.HTTPHandler, urllib2.HTTPSHandler):
+    """urllib2 handler that sends requests over pooled connections.
+
+    This replaces the stock HTTP/HTTPS handlers (which open a new
+    connection per request and send "Connection: close") in an opener.
+    Cookie processing, error handling and redirects stay with the rest of
+    the opener, so cookies and authentication are shared across every
+    connection in the pool.
+
+    """
+    handler_order = urllib2.HTTPHandler.handler_order
+
+    def __init__(self, pool):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool
+
+    def http_open(self, req):
+        return self._pooled_open('http', req)
+
+    def https_open(self, req):
+        return self._pooled_open('https', req)
+
+    http_request = urllib2.AbstractHTTPHandler.do_request_
+    https_request = urllib2.AbstractHTTPHandler.do_request_
+
+    def _pooled_open(self, scheme, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        conn, reused = self.pool.get(scheme, host, req.timeout)
+        try:
+            try:
+                resp = self._send(conn, req, headers)
+            except _NotSent:
+                if not reused:
+                    raise
+                # The gateway dropped an idle connection; the rest of the
+                # idle connections to it are probably gone too, so start
+                # afresh.  The request never reached it, so it is safe to
+                # send again, unlike one that failed later on: an action
+                # may already have been carried out
+                conn.close()
+                self.pool.clear(scheme, host)
+                conn, reused = self.pool.get(scheme, host, req.timeout)
+                resp = self._send(conn, req, headers)
+        except _NotSent as e:
+            conn.close()
+            raise urllib2.URLError(e.error)
+        except (httplib.HTTPException, socket.error) as e:
+            conn.close()
+            raise urllib2.URLError(e)
+        except Exception:
+            conn.close()
+            raise
+
+        def release(reusable):
+            if reusable:
+                self.pool.put(scheme, host, conn)
+            else:
+                conn.close()
+
+        fp = _PooledResponseFile(resp, release)
+        ret = urllib2.addinfourl(fp, resp.msg, req.get_full_url())
+        ret.code = resp.status
+        ret.msg = resp.reason
+        return ret
+
+    def _send(self, conn, req, headers):
+        """Sends a request and reads the response status and headers.
+
+        Raises _NotSent if the request failed to be sent, or the server
+        had closed the connection before it arrived.  A timeout is never
+        taken as such, as the server may just be slow to answer.
+        """
+        try:
+            conn.request(req.get_method(), req.get_selector(),
+                         req.data, headers)
+        except socket.timeout:
+            raise
+        except (httplib.HTTPException, socket.error) as e:
+            raise _NotSent(e)
+        try:
+            return conn.getresponse()
+        except httplib.BadStatusLine as e:
+            if _closed_before_response(e):
+                raise _NotSent(e)
+            raise
@@ -18,6 +18,7 @@
 #    under the License.
 
 from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGActionTemplate
 from cinder.volume.drivers.violin.vxg.core.error import *
 
 """
@@ -34,6 +35,11 @@ class ISCSIManager_1(ISCSIManager):
 
 
 class ISCSIManager(object):
+    _iscsi_target_create_template = XGActionTemplate(
+        '/vshare/actions/iscsi/target/create',
+        [('target', 'string'),
+         ('create', 'bool')])
+
     def __init__(self, basic):
         self._basic = basic
 
@@ -153,12 +159,8 @@ class ISCSIManager(object):
             delete_iscsi_target
 
         """
-        nodes = []
-        nodes.append(XGNode('target', 'string', target))
-        nodes.append(XGNode('create', 'bool', create))
-
-        return self._basic.perform_action('/vshare/actions' +
-                                          '/iscsi/target/create', nodes)
+        return self._basic.perform_template(
+            self._iscsi_target_create_template, target=target, create=create)
 
     def _iscsi_target_bind(self, target, ip, add):
         """Internal work function for:
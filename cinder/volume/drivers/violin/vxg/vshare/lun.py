@@ -18,6 +18,7 @@
 #    under the License.
 
 from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGActionTemplate
 from cinder.volume.drivers.violin.vxg.core.error import *
 
 """
@@ -150,6 +151,15 @@ class LUNManager(object):
 
 
 class LUNManager_1(LUNManager):
+    _lun_export_template = XGActionTemplate(
+        '/vshare/actions/lun/export',
+        [('container', 'string'),
+         ('names/{0}', 'string'),
+         ('initiators/{0}', 'string'),
+         ('ports/{0}', 'string'),
+         ('lun_id', 'int16'),
+         ('unexport', 'bool')])
+
     def __init__(self, basic):
         super(LUNManager_1, self).__init__(basic)
 
@@ -196,20 +206,16 @@ class LUNManager_1(LUNManager):
             unexport_lun
 
         """
-        nodes = []
-        nodes.append(XGNode('container', 'string', container))
-        nodes.extend(XGNode.as_node_list('names/{0}', 'string', names))
-        nodes.extend(XGNode.as_node_list('initiators/{0}', 'string',
-                                         initiators))
-        nodes.extend(XGNode.as_node_list('ports/{0}', 'string', ports))
         if lun_id == 'auto':
-            nodes.append(XGNode('lun_id', 'int16', -1))
-        else:
-            nodes.append(XGNode('lun_id', 'int16', lun_id))
-        nodes.append(XGNode('unexport', 'bool', unexport))
+            lun_id = -1
 
-        return self._basic.perform_action('/vshare/actions' +
-                                          '/lun/export', nodes)
+        return self._basic.perform_template(self._lun_export_template,
+                                            container=container,
+                                            names=names,
+                                            initiators=initiators,
+                                            ports=ports,
+                                            lun_id=lun_id,
+                                            unexport=unexport)
 
 
 class LUNManager_2(LUNManager_1):
@@ -263,6 +269,23 @@ class LUNManager_2(LUNManager_1):
 
 
 class LUNManager_3(LUNManager_2):
+    _create_lun_template = XGActionTemplate(
+        '/vshare/actions/lun/create',
+        [('container', 'string'),
+         ('name', 'string'),
+         ('size', 'string'),
+         ('quantity', 'uint64'),
+         ('nozero', 'string'),
+         ('thin', 'string'),
+         ('readonly', 'string'),
+         ('action', 'string', 'c'),
+         ('startnum', 'uint64'),
+         ('blksize', 'uint32'),
+         ('naca', 'bool'),
+         ('alua', 'bool'),
+         ('preferredport', 'uint8')],
+        optional=['blksize', 'naca', 'alua', 'preferredport'])
+
     def __init__(self, basic):
         super(LUNManager_3, self).__init__(basic)
 
@@ -447,27 +470,19 @@ class LUNManager_3(LUNManager_2):
             Action result as a dict.
 
         """
-        nodes = []
-        nodes.append(XGNode('container', 'string', container))
-        nodes.append(XGNode('name', 'string', name))
-        nodes.append(XGNode('size', 'string', size))
-        nodes.append(XGNode('quantity', 'uint64', quantity))
-        nodes.append(XGNode('nozero', 'string', nozero))
-        nodes.append(XGNode('thin', 'string', thin))
-        nodes.append(XGNode('readonly', 'string', readonly))
-        nodes.append(XGNode('action', 'string', 'c'))
-        nodes.append(XGNode('startnum', 'uint64', startnum))
-        if blksize is not None:
-            nodes.append(XGNode('blksize', 'uint32', blksize))
-        if naca is not None:
-            nodes.append(XGNode('naca', 'bool', naca))
-        if alua is not None:
-            nodes.append(XGNode('alua', 'bool', alua))
-        if preferredport is not None:
-            nodes.append(XGNode('preferredport', 'uint8', preferredport))
-
-        return self._basic.perform_action('/vshare/actions' +
-                                          '/lun/create', nodes)
+        return self._basic.perform_template(self._create_lun_template,
+                                            container=container,
+                                            name=name,
+                                            size=size,
+                                            quantity=quantity,
+                                            nozero=nozero,
+                                            thin=thin,
+                                            readonly=readonly,
+                                            startnum=startnum,
+                                            blksize=blksize,
+                                            naca=naca,
+                                            alua=alua,
+                                            preferredport=preferredport)
 
     def resize_lun(self, container, name, size):
         """
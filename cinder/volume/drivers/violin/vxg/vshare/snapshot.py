@@ -18,6 +18,7 @@
 #    under the License.
 
 from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGActionTemplate
 from cinder.volume.drivers.violin.vxg.core.error import *
 
 """
@@ -34,6 +35,17 @@ class SnapshotManager_3(SnapshotManager_2):
 
 
 class SnapshotManager(object):
+    _snapshot_create_template = XGActionTemplate(
+        '/vshare/actions/vdm/snapshot/create',
+        [('container', 'string'),
+         ('lun', 'string'),
+         ('name', 'string'),
+         ('action', 'string'),
+         ('description', 'string'),
+         ('readwrite', 'bool'),
+         ('snap_protect', 'bool')],
+        optional=['description', 'readwrite', 'snap_protect'])
+
     def __init__(self, basic):
         self._basic = basic
 
@@ -264,20 +276,14 @@ class SnapshotManager(object):
             delete_lun_snapshot
 
         """
-        nodes = []
-        nodes.append(XGNode('container', 'string', container))
-        nodes.append(XGNode('lun', 'string', lun))
-        nodes.append(XGNode('name', 'string', name))
-        nodes.append(XGNode('action', 'string', action))
-        if description is not None:
-            nodes.append(XGNode('description', 'string', description))
-        if readwrite is not None:
-            nodes.append(XGNode('readwrite', 'bool', readwrite))
-        if snap_protect is not None:
-            nodes.append(XGNode('snap_protect', 'bool', snap_protect))
-
-        return self._basic.perform_action('/vshare/actions/vdm' +
-                                          '/snapshot/create', nodes)
+        return self._basic.perform_template(self._snapshot_create_template,
+                                            container=container,
+                                            lun=lun,
+                                            name=name,
+                                            action=action,
+                                            description=description,
+                                            readwrite=readwrite,
+                                            snap_protect=snap_protect)
 
     def set_lun_snapshot(self, container, lun, name, new_name=None,
                          description=None, readwrite=None, snap_protect=None,
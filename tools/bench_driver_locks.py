@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Concurrency benchmark for the driver's lun locks.
+
+Runs concurrent export requests for distinct volumes against a fake
+gateway that takes a few milliseconds per action, while one more volume
+is stuck retrying a busy lun for most of the run.  Compares one lock
+for every lun (the old "vmem-export" style lock) against the per volume
+locks of v6000_locks.KeyedLockManager.
+
+Usage: bench_driver_locks.py [threads] [requests per thread]
+"""
+
+import sys
+import threading
+import time
+
+from cinder.volume.drivers.violin import v6000_locks
+
+# Seconds the fake gateway takes for each action
+ACTION_TIME = 0.005
+
+# Seconds the stuck volume keeps its lock for, retrying
+STUCK_TIME = 0.5
+
+
+class GlobalLock(object):
+    """One lock for every key, as utils.synchronized('vmem-export')."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def held(self, keys):
+        return self
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+def run(locks, threads, requests):
+    """Returns the elapsed seconds and the sorted request latencies."""
+    latencies = []
+    latency_lock = threading.Lock()
+
+    def stuck():
+        with locks.held(v6000_locks.volume_keys({'id': 'stuck'})):
+            time.sleep(STUCK_TIME)
+
+    def worker(n):
+        for i in range(requests):
+            volume = {'id': 'volume-%d-%d' % (n, i)}
+            start = time.time()
+            with locks.held(v6000_locks.volume_keys(volume)):
+                time.sleep(ACTION_TIME)
+            latency = time.time() - start
+            latency_lock.acquire()
+            try:
+                latencies.append(latency)
+            finally:
+                latency_lock.release()
+
+    workers = [threading.Thread(target=worker, args=(n,))
+               for n in range(threads)]
+    begin = time.time()
+    blocker = threading.Thread(target=stuck)
+    blocker.start()
+    time.sleep(0.01)
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.time() - begin
+    blocker.join()
+    return elapsed, sorted(latencies)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print('%d threads x %d requests, %.1f msec actions, one lun stuck '
+          'for %.1f sec:' % (threads, requests, ACTION_TIME * 1000,
+                             STUCK_TIME))
+    keyed = v6000_locks.KeyedLockManager()
+    for label, locks in [('global lock', GlobalLock()),
+                         ('per volume locks', keyed)]:
+        elapsed, latencies = run(locks, threads, requests)
+        count = len(latencies)
+        print('    %-18s %8.1f requests/sec  p50 %7.1f msec  '
+              'p99 %7.1f msec'
+              % (label, count / elapsed,
+                 latencies[count // 2] * 1000,
+                 latencies[min(count - 1, int(count * 0.99))] * 1000))
+    print('    keyed lock stats: %s' % (keyed.stats(),))
+
+
+if __name__ == '__main__':
+    main()
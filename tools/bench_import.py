@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cold start benchmark for importing vxg.
+
+Imports the package in a fresh interpreter, the way the V6000 drivers do
+on startup, and reports the wall time of the import and the number of
+modules it loaded, both in total and from vxg itself.  Each run is
+repeated and the best time kept, as the first runs warm the page cache.
+
+Only "import vxg" is timed, so the same script can be pointed at an
+older tree with PYTHONPATH to compare.
+
+Usage: bench_import.py [runs]
+"""
+
+import subprocess
+import sys
+
+PACKAGE = 'cinder.volume.drivers.violin.vxg'
+
+# Run in the child: prints seconds, new modules, new vxg modules
+CHILD = '''
+import sys
+import time
+before = set(sys.modules)
+start = time.time()
+from cinder.volume.drivers.violin import vxg
+elapsed = time.time() - start
+new = [x for x in set(sys.modules) - before if sys.modules[x] is not None]
+print('%%f %%d %%d' %% (elapsed, len(new),
+                      len([x for x in new if x.startswith('%s')])))
+''' % (PACKAGE,)
+
+
+def run_once():
+    proc = subprocess.Popen([sys.executable, '-c', CHILD],
+                            stdout=subprocess.PIPE)
+    out = proc.communicate()[0]
+    if proc.returncode != 0:
+        raise SystemExit('import failed')
+    elapsed, modules, own = out.split()
+    return float(elapsed), int(modules), int(own)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = [run_once() for i in range(runs)]
+    times = sorted(x[0] for x in results)
+
+    print('import %s, %d cold runs' % (PACKAGE, runs))
+    print('    best           %10.1f ms' % (times[0] * 1000,))
+    print('    median         %10.1f ms' % (times[len(times) // 2] * 1000,))
+    print('    modules        %10d' % (results[0][1],))
+    print('    vxg modules    %10d' % (results[0][2],))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Microbenchmark for lun ID allocation.
+
+Compares v6000_lunid.LunIdAllocator against the list scan LunIdList used
+to do, with the range filled to a given occupancy: each cycle frees a
+random lun ID in use and allocates the next free one, as a detach
+followed by an attach of another volume would.
+
+Usage: bench_lun_id_allocator.py [cycles]
+"""
+
+import random
+import sys
+import time
+
+from cinder.volume.drivers.violin import v6000_lunid
+
+
+class LinearLunIds(object):
+    """The list based allocation LunIdList used to do."""
+
+    def __init__(self, first, last):
+        self.lun_id_list = [0] * (last + 1)
+        self.lun_id_list[0] = 1
+        self.free_index = first
+
+    def allocate(self):
+        next_id = self.free_index
+        self.lun_id_list[next_id] = 1
+        self.update_free_index()
+        return next_id
+
+    def free(self, lun_id):
+        self.lun_id_list[lun_id] = 0
+        self.update_free_index()
+
+    def update_free_index(self):
+        count = 0
+        max_size = len(self.lun_id_list)
+        i = self.free_index
+        while self.lun_id_list[i] == 1 and count < max_size:
+            count += 1
+            i += 1
+            if i >= max_size:
+                i = 1
+        self.free_index = i
+
+
+def run(ids, first, last, occupancy, cycles):
+    """Returns the usec per free and allocate cycle."""
+    used = [ids.allocate() for i in range(int((last - first + 1) *
+                                              occupancy))]
+    rand = random.Random(42)
+    start = time.time()
+    for i in range(cycles):
+        n = rand.randrange(len(used))
+        ids.free(used[n])
+        used[n] = ids.allocate()
+    return (time.time() - start) / cycles * 1e6
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    first = v6000_lunid.DEFAULT_FIRST_ID
+    last = v6000_lunid.DEFAULT_LAST_ID
+    size = last - first + 1
+
+    print('lun IDs %d-%d, %d free and allocate cycles:'
+          % (first, last, cycles))
+    for occupancy in (0.5, 0.99, (size - 1.0) / size):
+        print('  %d of %d in use:' % (int(size * occupancy), size))
+        base = None
+        for label, ids in [
+                ('list scan', LinearLunIds(first, last)),
+                ('LunIdAllocator', v6000_lunid.LunIdAllocator(first, last))]:
+            usec = run(ids, first, last, occupancy, cycles)
+            if base is None:
+                base = usec
+            print('    %-16s %9.2f usec/cycle  %7.1fx'
+                  % (label, usec, base / usec))
+
+
+if __name__ == '__main__':
+    main()
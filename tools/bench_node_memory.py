@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Memory and allocation benchmark for parsed XGNodes.
+
+Builds a synthetic query response with one node per LUN attribute, parses
+it twice (as a flat XGNodeDict, the way get_nodes() does, which keeps two
+responses alive as a cache or a poll loop would) and reports:
+
+    - the size of the node objects and everything they reference
+      (sys.getsizeof, each object counted once)
+    - the number of gc-tracked objects the parse left allocated
+    - the parse time, and the time to then read every value
+
+Only public interfaces are used, so the same script can be pointed at an
+older tree with PYTHONPATH to compare.
+
+Usage: bench_node_memory.py [nodes]
+"""
+
+import gc
+import sys
+import time
+
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.response import XGResponse
+
+# (leaf, type, value) of the nodes reported for each LUN
+LUN_FIELDS = [
+    ('size', 'uint64', '10737418240'),
+    ('thin', 'bool', 'false'),
+    ('readonly', 'bool', 'false'),
+    ('blksize', 'uint32', '512'),
+    ('devid', 'string', '6a3e3b23'),
+    ('status', 'string', 'ok'),
+    ('uptime', 'duration_sec', '3d4h'),
+    ('threshold', 'float64', '0.85'),
+    ('lun_id', 'int16', '-1'),
+    ('port_A', 'bool', 'true'),
+]
+
+
+def make_response(count):
+    """A flat query response of about "count" nodes."""
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<xg-response><query-response><return-status>'
+           '<return-code>0</return-code><return-msg></return-msg>'
+           '</return-status><db-revision-id>42</db-revision-id><nodes>']
+    for i in xrange(count // len(LUN_FIELDS)):
+        prefix = ('/vshare/state/local/container/PROD08/lun/'
+                  'volume-%08d-4ec1-8a4e-5a3d2c1b0f9e/' % (i,))
+        for leaf, the_type, value in LUN_FIELDS:
+            out.append('<node><name>%s%s</name><type>%s</type>'
+                       '<value>%s</value></node>'
+                       % (prefix, leaf, the_type, value))
+    out.append('</nodes></query-response></xg-response>')
+    return ''.join(out)
+
+
+def footprint(nodes):
+    """Bytes used by the nodes and the objects they reference."""
+    seen = set()
+    total = 0
+    pending = list(nodes)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or obj is None:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, XGNode):
+            fields = []
+            for cls in type(obj).__mro__:
+                fields.extend(getattr(cls, '__slots__', ()))
+            for field in fields:
+                try:
+                    pending.append(object.__getattribute__(obj, field))
+                except AttributeError:
+                    pass
+            if hasattr(obj, '__dict__'):
+                pending.append(obj.__dict__)
+        elif isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            pending.extend(obj)
+    return total
+
+
+def parse(data):
+    req = XGQuery([XGNode('/vshare/state/local/container/PROD08/lun/**')],
+                  flat=True)
+    return XGResponse.fromstring(req, data).nodes
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    data = make_response(count)
+
+    gc.collect()
+    before = len(gc.get_objects())
+    start = time.time()
+    responses = [parse(data), parse(data)]
+    parse_time = (time.time() - start) / len(responses)
+    gc.collect()
+    allocated = len(gc.get_objects()) - before
+
+    nodes = []
+    for resp in responses:
+        nodes.extend(resp.values())
+    size = footprint(nodes)
+
+    start = time.time()
+    for node in nodes:
+        node.value
+    read_time = time.time() - start
+
+    print('%d nodes in %d responses of %d bytes' % (len(nodes),
+                                                    len(responses),
+                                                    len(data)))
+    print('    footprint      %10.1f MiB  (%d bytes/node)'
+          % (size / 1048576.0, size // len(nodes)))
+    print('    gc objects     %10d      (%.1f/node)'
+          % (allocated, float(allocated) / len(nodes)))
+    print('    parse          %10.3f s    per response' % (parse_time,))
+    print('    read values    %10.3f s    all responses' % (read_time,))
+
+
+if __name__ == '__main__':
+    main()
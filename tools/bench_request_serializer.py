@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Microbenchmark for XGRequest.to_xml().
+
+Compares the direct compact serializer (the default) against the
+element tree based paths: the minidom pretty-print round trip that used
+to be the default, and a plain ElementTree.tostring() of the same tree.
+
+Usage: bench_request_serializer.py [iterations]
+"""
+
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGAction
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+
+
+def make_requests():
+    """A lun create action, a lun export action and a multi-node query."""
+    create = XGAction('/vshare/actions/lun/create', [
+        XGNode('container', 'string', 'PROD08'),
+        XGNode('lun_name', 'string', 'volume-3d31af29-6d7d-443f-b451'),
+        XGNode('size', 'uint64', 1024 * 1024 * 1024),
+        XGNode('quantity', 'uint64', 1),
+        XGNode('nozero', 'bool', False),
+        XGNode('thin', 'bool', False),
+        XGNode('readonly', 'bool', False),
+        XGNode('startnum', 'uint64', 1),
+        XGNode('blksize', 'uint32', 512),
+        XGNode('naca', 'bool', False),
+        XGNode('alua', 'bool', False),
+        XGNode('preferredport', 'uint8', 0),
+        XGNode('description', 'string', 'bench <&> "quoted"'),
+    ])
+    export = XGAction('/vshare/actions/lun/export', [
+        XGNode('container', 'string', 'PROD08'),
+        XGNode('names/volume-1', 'string', 'volume-1'),
+        XGNode('initiators/igroup-1', 'string', 'igroup-1'),
+        XGNode('ports/all', 'string', 'all'),
+        XGNode('lun_id', 'int16', 12),
+        XGNode('unexport', 'bool', False),
+    ])
+    query = XGQuery([XGNode('/vshare/state/local/container/PROD08/lun/*'),
+                     XGNode('/vshare/config/export/container/PROD08/**'),
+                     XGNode('/cluster/state/master_id')])
+    return [('create', create), ('export', export), ('query', query)]
+
+
+def canonical(xml_str):
+    """Reduce an XML document to a comparable nested tuple."""
+    def walk(el):
+        return (el.tag, (el.text or '').strip(),
+                tuple(walk(x) for x in el))
+    return walk(ET.fromstring(xml_str))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for name, req in make_requests():
+        compact = req.to_xml()
+        pretty = req.to_xml(pretty_print=True)
+        tree = ET.tostring(req._to_element_tree())
+        if not canonical(compact) == canonical(pretty) == canonical(tree):
+            raise SystemExit('%s: serializers disagree:\n%s\n%s'
+                             % (name, compact, pretty))
+
+        paths = [
+            ('compact (default)', lambda: req.to_xml()),
+            ('element tree', lambda: ET.tostring(req._to_element_tree())),
+            ('minidom pretty', lambda: req.to_xml(pretty_print=True)),
+        ]
+        print('%s request (%d nodes, %d bytes compact, %d bytes pretty):'
+              % (name, len(req.nodes), len(compact), len(pretty)))
+        base = None
+        for label, func in paths:
+            elapsed = min(timeit.repeat(func, number=iterations, repeat=3))
+            usec = elapsed / iterations * 1e6
+            if base is None:
+                base = usec
+            print('    %-20s %9.1f usec/request  %6.1fx'
+                  % (label, usec, usec / base))
+
+
+if __name__ == '__main__':
+    main()
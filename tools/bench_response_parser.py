@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Violin Memory, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Throughput benchmark for XGResponse.fromstring().
+
+Compares the single pass decoder against the element tree parser it
+replaced (XGResponse._fromstring_etree) on synthetic query responses, in
+flat and tree mode, and checks both return the same nodes.
+
+Usage: bench_response_parser.py [nodes]
+"""
+
+import sys
+import time
+
+from cinder.volume.drivers.violin.vxg.core.node import XGNode
+from cinder.volume.drivers.violin.vxg.core.request import XGQuery
+from cinder.volume.drivers.violin.vxg.core.response import XGResponse
+
+# (leaf, type, value) of the child nodes reported for each LUN
+LUN_FIELDS = [
+    ('size', 'uint64', '10737418240'),
+    ('thin', 'bool', 'false'),
+    ('blksize', 'uint32', '512'),
+    ('devid', 'string', '6a3e3b23'),
+    ('uptime', 'duration_sec', '3d4h'),
+]
+
+
+def make_response(count):
+    """A query response of about "count" nodes, a subtree per LUN."""
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<xg-response><query-response><return-status>'
+           '<return-code>0</return-code><return-msg></return-msg>'
+           '</return-status><db-revision-id>42</db-revision-id><nodes>']
+    for i in xrange(count // (len(LUN_FIELDS) + 1)):
+        name = ('/vshare/state/local/container/PROD08/lun/'
+                'volume-%08d-4ec1-8a4e-5a3d2c1b0f9e' % (i,))
+        out.append('<node><name>%s</name><type>string</type>'
+                   '<value>%s</value>' % (name, name[-44:]))
+        for leaf, the_type, value in LUN_FIELDS:
+            out.append('<node><name>%s/%s</name><type>%s</type>'
+                       '<value>%s</value></node>'
+                       % (name, leaf, the_type, value))
+        out.append('</node>')
+    out.append('</nodes></query-response></xg-response>')
+    return ''.join(out)
+
+
+def canonical(nodes):
+    if isinstance(nodes, list):
+        return [(x.name, x.type, x.value, canonical(x.nodes)) for x in nodes]
+    return sorted((k, nodes[k].type, nodes[k].value) for k in nodes)
+
+
+def timed(func, repeat=3):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        ret = func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ret
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = make_response(count)
+    mib = len(data) / 1048576.0
+
+    for flat in (True, False):
+        req = XGQuery([XGNode('/vshare/state/local/container/PROD08/**')],
+                      flat=flat)
+        old_time, old = timed(lambda: XGResponse._fromstring_etree(req,
+                                                                   data))
+        new_time, new = timed(lambda: XGResponse.fromstring(req, data))
+        if canonical(old.nodes) != canonical(new.nodes):
+            raise SystemExit('flat=%s: parsers disagree' % (flat,))
+
+        print('%s response, %d nodes, %.1f MiB:'
+              % ('flat' if flat else 'tree', count, mib))
+        for label, elapsed in (('element tree', old_time),
+                               ('single pass', new_time)):
+            print('    %-14s %7.3f s  %7.1f MiB/s  %9d nodes/s'
+                  % (label, elapsed, mib / elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()